@@ -0,0 +1,7 @@
+'''
+Offline benchmarks of the article finder
+
+    python -m benchmarks.run            - per-stage timings and memory, compared to the saved baseline
+    python -m benchmarks.import_time    - cold start of `import find_article`
+    python -m benchmarks.fetch          - fetching and finding URLs, blocking against the asyncio pipeline
+'''
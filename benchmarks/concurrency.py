@@ -0,0 +1,123 @@
+'''
+Stress check of a single Extractor shared by many threads - the pages of benchmarks/corpus/ and synthetic pages
+are found one at a time by ArticleFinder, then many times over, in a shuffled order, by a pool of threads
+sharing one Extractor (with and without a shared ResultCache), and every result must be the same.
+
+Usage:
+    python -m benchmarks.concurrency [--threads 8] [--rounds 4] [--pages 12] [--engines bs4,lxml]
+
+The templates and the near-duplicate index are left out, as their results depend on the order of the pages.
+Prints the throughput of the serial run and of the threads. Fails (exit code 1) when a result differs.
+'''
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import random
+import sys
+import time
+
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from find_article import ArticleFinder, Extractor
+from meta_modules.cache import ResultCache
+from meta_modules.constants import ENGINES
+
+from benchmarks.run import load_corpus
+from benchmarks.synthetic import generate_article
+
+
+# Size of the synthetic pages, in symbols - they take turns
+SYNTHETIC_SIZES = (5000, 40000, 160000)
+
+
+
+def load_pages(synthetic_pages):
+    '''
+    Returns a list of the HTML of the corpus pages and of `synthetic_pages` synthetic ones
+    '''
+
+    pages = list(load_corpus().values())
+
+    for seed in range(synthetic_pages):
+        pages.append(generate_article(size=SYNTHETIC_SIZES[seed % len(SYNTHETIC_SIZES)], seed=seed))
+
+    return pages
+
+
+
+def serial_run(pages, engine):
+    '''
+    Returns (the results of `pages` found one at a time by ArticleFinder, seconds taken)
+    '''
+
+    start = time.perf_counter()
+    results = [ArticleFinder(html=html, engine=engine).find() for html in pages]
+
+    return results, time.perf_counter() - start
+
+
+
+def threaded_run(extractor, pages, threads, rounds, seed=0):
+    '''
+    Returns (a list of (page index, result) of every page found `rounds` times by `threads` threads
+    sharing `extractor`, in a shuffled order, seconds taken)
+    '''
+
+    jobs = [index for _ in range(rounds) for index in range(len(pages))]
+    random.Random(seed).shuffle(jobs)
+
+    def extract(index):
+        return extractor.extract(pages[index])
+
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(threads) as executor:
+        results = list(executor.map(extract, jobs))
+
+    return list(zip(jobs, results)), time.perf_counter() - start
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=4)
+    parser.add_argument('--pages', type=int, default=12, help='synthetic pages, on top of the corpus')
+    parser.add_argument('--engines', default=','.join(ENGINES))
+    args = parser.parse_args(argv)
+
+    pages = load_pages(args.pages)
+    failed = False
+
+    # The free-threaded builds have sys._is_gil_enabled()
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f"{len(pages)} pages, {args.threads} threads, {args.rounds} rounds, GIL {'on' if gil else 'off'}")
+    print(f"{'engine':<8} {'cache':<6} {'serial docs/s':>14} {'threads docs/s':>15} {'speedup':>8} {'mismatches':>11}")
+
+    for engine in args.engines.split(','):
+        expected, serial_seconds = serial_run(pages, engine)
+        serial_rate = len(pages) / serial_seconds
+
+        for cache in (None, ResultCache()):
+            extractor = Extractor(engine=engine, cache=cache)
+            results, seconds = threaded_run(extractor, pages, args.threads, args.rounds)
+            mismatches = [index for index, result in results if result != expected[index]]
+            rate = len(results) / seconds
+
+            print(f"{engine:<8} {'yes' if cache is not None else 'no':<6} {serial_rate:>14.1f} {rate:>15.1f} "
+                  f"{rate / serial_rate:>7.2f}x {len(mismatches):>11}")
+
+            if mismatches:
+                print(f"FAIL: the results of pages {sorted(set(mismatches))} differ from the serial ones")
+                failed = True
+
+    return 1 if failed else 0
+
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,203 @@
+'''
+Check of the near-duplicate pages (see meta_modules/fingerprint.py) on the pages of a single site template -
+short, distinct articles in the same header, navigation, sidebar and footer, which have most of the text
+of a page, and re-published copies of the articles, with other ads and another sidebar.
+
+The template is checked as it is, and with its <header>, <nav>, <aside>, <form> and <footer> tags turned into <div>
+tags - then none of it is left out of the sketches of the pages, and the copies have the same sidebar.
+
+Usage:
+    python -m benchmarks.dedup [--articles 20] [--engines bs4,lxml]
+
+Fails (exit code 1) when:
+- the result of a page is reused for another article - its title, date or body differ from the ones
+found without the index
+- a re-published copy of an article is not found as a near-duplicate page
+'''
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from find_article import ArticleFinder
+from meta_modules.constants import ENGINE, ENGINES
+from meta_modules.fingerprint import DedupIndex
+
+from benchmarks.synthetic import paragraph, sentence
+
+
+# Seed of the template, the same for every page
+TEMPLATE_SEED = 0
+
+# Paragraphs and words in each paragraph of an article - a short one, most of the page is the template
+ARTICLE_PARAGRAPHS = 2
+ARTICLE_WORDS = 35
+
+# The tags of the template that the sketch of a page leaves out
+re_boilerplate_tag = re.compile(r'<(/?)(?:header|nav|aside|form|footer)\b')
+
+
+
+def links(rnd, count, words, prefix):
+    '''
+    Returns `count` <li> tags with a link of `words` random words each
+    '''
+
+    return ''.join(f'<li><a href="/{prefix}/{rnd.randint(1, 10 ** 6)}">{sentence(rnd, words)}</a></li>'
+                   for _ in range(count))
+
+
+
+def template(seed=TEMPLATE_SEED):
+    '''
+    Returns (header and navigation, footer) of the site, the same on all of its pages
+    '''
+
+    rnd = random.Random(seed)
+
+    sections = ''.join(f'<ul class="mega-menu-column">{links(rnd, 15, 4, "section")}</ul>' for _ in range(16))
+    header = (f'<header id="masthead"><a class="logo" href="/">City Herald</a><p class="tagline">{sentence(rnd, 12)}</p>'
+              f'<ul class="top-bar">{links(rnd, 8, 2, "page")}</ul></header>'
+              f'<nav id="site-navigation"><ul class="menu">{links(rnd, 40, 2, "news")}</ul>{sections}</nav>')
+
+    footer = (f'<footer id="colophon"><ul class="footer-links">{links(rnd, 80, 3, "about")}</ul>'
+              f'<p class="about">{sentence(rnd, 60)} {sentence(rnd, 60)}</p>'
+              '<p class="copyright">&copy; 2021 City Herald. All rights reserved.</p></footer>')
+
+    return header, footer
+
+
+
+def sidebar(seed):
+    '''
+    Returns the sidebar of a page - the most read and the picked articles, which change from day to day
+    '''
+
+    rnd = random.Random(seed)
+
+    return (f'<aside class="sidebar"><section><h3>Most read</h3><ul>{links(rnd, 20, 10, "news")}</ul></section>'
+            f'<section><h3>Editor\'s picks</h3><ul>{links(rnd, 10, 10, "news")}</ul></section>'
+            '<form class="newsletter"><input type="email" placeholder="Email"><button>Sign up</button></form></aside>')
+
+
+
+def article_page(article_seed, sidebar_seed=0, ads_seed=0):
+    '''
+    Returns the HTML of the page of the article of `article_seed`, with the sidebar of `sidebar_seed`
+    and the ads of `ads_seed`
+    '''
+
+    rnd = random.Random(f"article-{article_seed}")
+    header, footer = template()
+
+    title = sentence(rnd, 8).rstrip('.')
+    date = f"2021-03-{1 + article_seed % 28:02d}T10:00:00+00:00"
+    paragraphs = ''.join(paragraph(rnd, ARTICLE_WORDS) for _ in range(ARTICLE_PARAGRAPHS))
+
+    return ('<!DOCTYPE html><html><head><meta charset="utf-8">'
+            f'<title>{title} - City Herald</title><meta property="og:title" content="{title}">'
+            f'<meta property="article:published_time" content="{date}">'
+            f'<script>loadAds({ads_seed});</script></head><body><div id="page">{header}'
+            f'<div id="content"><article><h1 class="entry-title">{title}</h1>'
+            f'<div class="entry-content">{paragraphs}</div></article>{sidebar(sidebar_seed)}</div>'
+            f'{footer}</div></body></html>')
+
+
+
+def div_template(html):
+    '''
+    Returns `html` with the <header>, <nav>, <aside>, <form> and <footer> tags turned into <div> tags
+    '''
+
+    return re_boilerplate_tag.sub(r'<\1div', html)
+
+
+
+def check(articles, engine=ENGINE, divs=False):
+    '''
+    Finds the articles of the pages of `articles` distinct articles, crawled on the same day (with the same sidebar),
+    and then of their re-published copies, with a single DedupIndex; with `divs`, of the template of <div> tags.
+    Returns (list of the errors, seconds of the articles, seconds of the copies).
+    '''
+
+    def page(*args, **kwargs):
+        html = article_page(*args, **kwargs)
+
+        return div_template(html) if divs else html
+
+    dedup = DedupIndex()
+    errors = []
+
+    start = time.perf_counter()
+
+    for seed in range(articles):
+        html = page(seed)
+        url = f"https://example.com/news/{seed}"
+
+        expected = ArticleFinder(html=html, engine=engine).find()
+        result = ArticleFinder(html=html, url=url, engine=engine, dedup=dedup).find()
+
+        if result['dedup']['duplicate'] == 'page':
+            errors.append(f"{url}: the result of {result['dedup']['of']} is reused "
+                          f"(similarity {result['dedup']['similarity']:.2f})")
+
+        for key in ('title', 'date', 'body'):
+
+            if result[key] != expected[key]:
+                errors.append(f"{url}: {key} {result[key]!r}, expected {expected[key]!r}")
+
+    articles_time = time.perf_counter() - start
+    start = time.perf_counter()
+
+    for seed in range(articles):
+        html = page(seed, sidebar_seed=0 if divs else 1, ads_seed=1)
+        url = f"https://example.org/syndicated/{seed}"
+
+        result = ArticleFinder(html=html, url=url, engine=engine, dedup=dedup).find()
+
+        if result['dedup']['duplicate'] != 'page':
+            errors.append(f"{url}: the copy of https://example.com/news/{seed} is not found as a near-duplicate page")
+
+    copies_time = time.perf_counter() - start
+
+    return errors, articles_time, copies_time
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--articles', type=int, default=20, help='distinct articles, each with a re-published copy')
+    parser.add_argument('--engines', default=ENGINE, help=f"parser engines to be checked, of: {', '.join(ENGINES)}")
+    args = parser.parse_args(argv)
+
+    failed = False
+
+    for engine in args.engines.split(','):
+
+        for divs in (False, True):
+            name = f"{engine} {'<div> template' if divs else 'template'}"
+            errors, articles_time, copies_time = check(args.articles, engine, divs)
+
+            for error in errors:
+                print(f"MISMATCH {name} {error}")
+
+            print(f"{name}: {args.articles} articles and their copies, {len(errors)} errors - "
+                  f"articles {articles_time / args.articles * 1000:.1f} ms/page (found twice), "
+                  f"copies {copies_time / args.articles * 1000:.1f} ms/page")
+
+            failed = failed or bool(errors)
+
+    return 1 if failed else 0
+
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
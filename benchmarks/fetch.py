@@ -0,0 +1,162 @@
+'''
+Benchmark of fetching and finding the articles of many URLs - blocking requests.get() and
+ArticleFinder.find() one page at a time, against the asyncio pipeline (ArticleFinder.find_urls()).
+
+Runs offline: the pages of benchmarks/corpus/ are served by a local HTTP server, with a delay
+standing in for the network.
+
+Usage:
+    python -m benchmarks.fetch [--pages 48] [--latency-ms 50] [--concurrency 16] [--workers 2]
+
+Fails (exit code 1) when a result of the pipeline differs from the result of ArticleFinder on the same page.
+'''
+
+import argparse
+import asyncio
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import sys
+import threading
+import time
+
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from find_article import ArticleFinder
+
+from benchmarks.run import load_corpus
+
+
+
+@contextlib.contextmanager
+def serve_corpus(corpus, latency=0.0):
+    '''
+    Serves the pages of `corpus` (file name => HTML) on a local port, each response delayed by `latency` seconds.
+    Yields the base URL; any query string is ignored, so /news_portal.html?1 and ?2 are the same page.
+    '''
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+
+            html = corpus.get(self.path.split('?')[0].lstrip('/'))
+
+            if html is None:
+                self.send_error(404)
+                return
+
+            body = html.encode('utf-8')
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+
+def run_blocking(urls):
+    '''
+    Returns url => article, fetching and finding one page at a time
+    '''
+
+    import requests
+
+    articles = {}
+
+    with requests.Session() as session:
+
+        for url in urls:
+            articles[url] = ArticleFinder(html=session.get(url).text).find()
+
+    return articles
+
+
+
+async def run_pipeline(urls, concurrency, workers):
+    '''
+    Returns url => result of the pipeline
+    '''
+
+    results = {}
+
+    async for result in ArticleFinder.find_urls(urls, concurrency=concurrency, workers=workers):
+        results[result['url']] = result
+
+    return results
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=48)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus()
+    names = sorted(corpus)
+    expected = {name: ArticleFinder(html=html).find() for name, html in corpus.items()}
+
+    with serve_corpus(corpus, latency=args.latency_ms / 1000) as base_url:
+        urls = [f'{base_url}/{names[i % len(names)]}?{i}' for i in range(args.pages)]
+        # One missing page, which has to come back as an error
+        urls.append(f'{base_url}/missing.html')
+
+        start = time.perf_counter()
+        run_blocking(urls[:-1])
+        blocking_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = asyncio.run(run_pipeline(urls, args.concurrency, args.workers))
+        pipeline_s = time.perf_counter() - start
+
+    print(f"{args.pages} pages, {args.latency_ms:.0f} ms latency")
+    print(f"blocking: {blocking_s:.2f} s ({args.pages / blocking_s:.1f} pages/s)")
+    print(f"pipeline: {pipeline_s:.2f} s ({args.pages / pipeline_s:.1f} pages/s)")
+
+    failed = False
+
+    if len(results) != len(urls):
+        print(f"FAIL: {len(results)} results for {len(urls)} URLs")
+        failed = True
+
+    for url, result in results.items():
+        name = url.split('?')[0].rsplit('/', 1)[-1]
+
+        if name not in expected:
+            if result['error'] is None:
+                print(f"FAIL: no error for {url}")
+                failed = True
+
+        elif result['error'] is not None or result['article'] != expected[name]:
+            print(f"FAIL: {url}: {result['error'] or 'the article differs'}")
+            failed = True
+
+    return 1 if failed else 0
+
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,100 @@
+'''
+Benchmark of the cold start - the time it takes to import `find_article` in a new process
+
+Usage:
+    python benchmarks/import_time.py [--runs 10] [--target-ms 250]
+
+Exits with a non-zero code when the median import time is over the target,
+or when one of the `HEAVY_MODULES` is imported along with `find_article`.
+'''
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Median import time of `find_article`, in milliseconds, that should not be exceeded
+IMPORT_TIME_TARGET_MS = 250
+
+# Modules that must not be imported on the extraction path
+HEAVY_MODULES = (
+        'pandas',
+        'numpy',
+        'requests',
+        'concurrent.futures',
+        'multiprocessing',
+)
+
+# Runs in a new interpreter, so nothing is imported beforehand
+IMPORT_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import find_article
+elapsed = time.perf_counter() - start
+print(json.dumps({"ms": elapsed * 1000, "modules": sorted(sys.modules)}))
+'''
+
+
+
+def measure_import(runs=10):
+    '''
+    Returns a dictionary with the import times of `find_article` in milliseconds
+    and the heavy modules that got imported along with it.
+    '''
+
+    times = []
+    heavy_modules = set()
+
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT],
+                                cwd=ROOT_PATH,
+                                check=True,
+                                capture_output=True,
+                                text=True).stdout
+
+        result = json.loads(output)
+        times.append(result['ms'])
+        heavy_modules.update(module for module in result['modules'] if module in HEAVY_MODULES)
+
+    return {
+        'median_ms': statistics.median(times),
+        'min_ms': min(times),
+        'max_ms': max(times),
+        'heavy_modules': sorted(heavy_modules),
+    }
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--target-ms', type=float, default=IMPORT_TIME_TARGET_MS)
+    args = parser.parse_args(argv)
+
+    result = measure_import(args.runs)
+
+    print(f"import find_article: median {result['median_ms']:.1f} ms "
+          f"(min {result['min_ms']:.1f} ms, max {result['max_ms']:.1f} ms, target {args.target_ms:.0f} ms)")
+
+    failed = False
+
+    if result['median_ms'] > args.target_ms:
+        print("FAIL: the import time is over the target")
+        failed = True
+
+    if result['heavy_modules']:
+        print(f"FAIL: heavy modules imported: {', '.join(result['heavy_modules'])}")
+        failed = True
+
+    return 1 if failed else 0
+
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
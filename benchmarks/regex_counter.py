@@ -0,0 +1,153 @@
+'''
+The symbols counter of TagSymbFinder before it counted all tags in one pass over the tree - a regex per tag name,
+run over the serialized tree (without the formatting tags). Kept only as the reference that the results of
+`TagSymbFinder.get_tags_counter()` are checked against.
+
+Its one artifact that the tree walk does not reproduce: a void tag whose name starts with the counted one
+(a <br/> inside of a <b>) is taken for it. The pages of the checks have no such tags.
+
+Usage:
+    python -m benchmarks.regex_counter [PAGE.html ...]
+
+Checks the pages of `EDGE_CASES` and the given HTML files, with each of `SKIPS` as `formatting_tags_to_skip`.
+Fails (exit code 1) when a tag counter differs from the one of the regex counter.
+'''
+
+import copy
+import os
+import re
+import sys
+
+from bs4 import BeautifulSoup
+
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from meta_modules.constants import ENGINE, FORMATTING_TAGS, PARSER
+from meta_modules.tag_symb_finder import TagSymbFinder
+
+
+# The `formatting_tags_to_skip` the tag counters are compared with
+SKIPS = (None, ('b', 'i'))
+
+# Pages with the details that the tree walk has to count as the regex did
+EDGE_CASES = {
+    'nested': '<html><body><div><p>One <b>bold</b> word</p><p>Plain text</p></div></body></html>',
+    'attributes': '<html><body><p class="a" id="b">Text with attributes</p>'
+                  '<span data-x="1">  spaced  </span></body></html>',
+    'entities': '<html><body><p>Fish &amp; chips &lt;3 &gt; all</p><td>a&nbsp;b</td></body></html>',
+    'scripts': '<html><head><script>if (a < b) { x = "&"; }</script><style>p > a { color: red }</style></head>'
+               '<body><p>Text</p></body></html>',
+    'comments': '<html><body><p>Before<!-- a comment -->after</p><p>No comment</p></body></html>',
+    'formatting': '<html><body><b>Bold only</b><i>Italic only</i><em>Emphasis</em><p>A <i>mixed</i> one</p>'
+                  '<strong>Strong</strong><u>Underlined</u></body></html>',
+    'empty': '<html><body><p></p><p>   </p><div><span></span></div><p>Last</p></body></html>',
+    'uppercase': '<HTML><BODY><P>Upper case tags</P><DIV><SPAN>Inside</SPAN></DIV></BODY></HTML>',
+    'unclosed': '<html><body><p>First paragraph<p>Second paragraph<div>A div</body></html>',
+}
+
+
+
+def single_tag_counter(html, tag):
+    '''
+    Returns the symbols of the text of all `tag` tags in `html`, that hold only text
+    '''
+
+    re_get_tag_text = f"<({tag})(?:[^>]+)?>([^<]+)<\\/{tag}>"
+
+    # List of matched tuples(1st group - TAG, 2nd group - SYMBOLS)
+    tag_count = re.findall(re_get_tag_text, html, flags=re.IGNORECASE)
+
+    tag_counter = 0
+
+    for _, curr_count in tag_count:
+        curr_count = curr_count.strip()
+        tag_counter += len(curr_count)
+
+    return tag_counter
+
+
+
+def regex_tags_counter(html, formatting_tags_to_skip=None):
+    '''
+    Returns a Dictionary with key:value - tag:symbols of `html`, as the regex counter did
+    '''
+
+    formatting_tags_to_rem = FORMATTING_TAGS
+
+    if formatting_tags_to_skip:
+        formatting_tags_to_rem = [tag for tag in FORMATTING_TAGS if tag not in formatting_tags_to_skip]
+
+    soup = BeautifulSoup(html, PARSER)
+    # The formatting tags are decomposed from a copy of the tree
+    new_soup = copy.copy(soup)
+
+    tags = sorted({tag.name for tag in soup.find_all()})
+    tag_counter_dict = {}
+
+    for tag in tags:
+
+        if tag not in formatting_tags_to_rem:
+
+            for f_tag in formatting_tags_to_rem:
+
+                for curr_subtag in new_soup(f_tag):
+                    curr_subtag.decompose()
+
+        tag_counter = single_tag_counter(str(new_soup), tag)
+
+        # If there are characters inside the tag
+        if tag_counter:
+            tag_counter_dict[tag] = tag_counter
+
+    return tag_counter_dict
+
+
+
+def check(pages, engine=ENGINE):
+    '''
+    Returns a list of the differences between the tag counters of `pages` (name => HTML),
+    for each of `SKIPS`, with `engine`, and the ones of the regex counter
+    '''
+
+    differences = []
+
+    for name, html in pages.items():
+
+        for skip in SKIPS:
+            expected = regex_tags_counter(html, skip)
+            result = TagSymbFinder(html, engine=engine).get_tags_counter(skip)
+
+            for tag in sorted(set(expected) | set(result)):
+
+                if expected.get(tag) != result.get(tag):
+                    differences.append(f"{name} skip={skip} <{tag}>: {result.get(tag)}, "
+                                       f"regex counter {expected.get(tag)}")
+
+    return differences
+
+
+
+def main(argv=None):
+    pages = dict(EDGE_CASES)
+
+    for path in (sys.argv[1:] if argv is None else argv):
+
+        with open(path, encoding='utf-8') as f:
+            pages[os.path.basename(path)] = f.read()
+
+    differences = check(pages)
+
+    for difference in differences:
+        print(f"MISMATCH {difference}")
+
+    print(f"{len(pages)} pages, {len(differences)} differences from the regex counter")
+
+    return 1 if differences else 0
+
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,366 @@
+'''
+Runner of the benchmarks - throughput, p50/p99 latency and peak memory of each stage,
+on the recorded corpus (benchmarks/corpus/) and on synthetic pages of growing size.
+
+Usage:
+    python -m benchmarks.run [--repeat 5] [--sizes 20000,80000,320000] [--engines bs4,lxml] [--save-baseline]
+
+With more than one engine, the stages of the other engines are named `stage [engine]`,
+and their speedup against the first one is printed.
+
+Fails (exit code 1) when:
+- a stage is slower than the saved baseline by more than `--tolerance`
+- the time of a stage grows faster with the page size than `--max-exponent` (e.g. quadratic)
+- the results on the corpus (title, date, body, body tag and tag counters), with any of the engines,
+differ from benchmarks/corpus/expected.json
+- the tag counters of the corpus and of the smallest synthetic pages, with any of the engines,
+differ from the ones of the previous regex counter (benchmarks/regex_counter.py)
+'''
+
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from find_article import ArticleFinder, BodyFinder, DateFinder, TitleFinder
+from meta_modules.cleaner import Cleaner
+from meta_modules.constants import ENGINE, ENGINES
+from meta_modules.document import Document
+from meta_modules.tag_symb_finder import TagSymbFinder
+
+from benchmarks import regex_counter
+from benchmarks.synthetic import generate_article
+
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+CORPUS_PATH = os.path.join(BENCHMARKS_PATH, 'corpus')
+EXPECTED_PATH = os.path.join(CORPUS_PATH, 'expected.json')
+BASELINE_PATH = os.path.join(BENCHMARKS_PATH, 'baseline.json')
+
+# Synthetic pages generated for each size
+SYNTHETIC_PAGES = 3
+
+
+
+def parsed(html, engine=ENGINE):
+    '''
+    Returns a Document with its tree already built
+    '''
+
+    document = Document(html, engine=engine)
+    document.soup
+
+    return document
+
+
+
+def cleaned(html, engine=ENGINE):
+    '''
+    Returns a Document with its tree already built and cleaned
+    '''
+
+    document = parsed(html, engine)
+    Cleaner(document, engine=engine).clean()
+
+    return document
+
+
+
+# Stage name => (prepare(html, engine) - not timed, run(prepared) - timed)
+STAGES = {
+    'parse': (
+        lambda html, engine: Document(html, engine=engine),
+        lambda document: document.soup,
+    ),
+    'ArticleFinder.find': (
+        lambda html, engine: ArticleFinder(html=html, engine=engine),
+        lambda article_finder: article_finder.find(),
+    ),
+    'Cleaner.clean': (
+        lambda html, engine: Cleaner(parsed(html, engine), engine=engine),
+        lambda cleaner: cleaner.clean(),
+    ),
+    'TagSymbFinder.get_tags_counter': (
+        lambda html, engine: TagSymbFinder(parsed(html, engine), engine=engine),
+        lambda finder: finder.get_tags_counter(),
+    ),
+    'BodyFinder.find': (
+        lambda html, engine: BodyFinder(html=cleaned(html, engine), engine=engine),
+        lambda body_finder: body_finder.find(),
+    ),
+}
+
+
+
+def load_corpus():
+    '''
+    Returns a dictionary - file name => HTML of the recorded corpus
+    '''
+
+    corpus = {}
+
+    for path in sorted(glob.glob(os.path.join(CORPUS_PATH, '*.html'))):
+
+        with open(path, encoding='utf-8') as f:
+            corpus[os.path.basename(path)] = f.read()
+
+    return corpus
+
+
+
+def percentile(values, q):
+    '''
+    Returns the `q`-th percentile of `values`, by the nearest-rank method
+    '''
+
+    values = sorted(values)
+    rank = max(math.ceil(q / 100 * len(values)), 1)
+
+    return values[rank - 1]
+
+
+
+def stage_name(stage, engine, engines):
+    '''
+    Returns the name of a stage in the results - with the engine, unless it is the first of `engines`
+    '''
+
+    return stage if engine == engines[0] else f"{stage} [{engine}]"
+
+
+
+def measure(stage, htmls, repeat, engine=ENGINE):
+    '''
+    Returns the statistics of a stage over the pages `htmls`, each one run `repeat` times
+    '''
+
+    prepare, run = STAGES[stage]
+
+    latencies = []
+    total_bytes = 0
+    peak = 0
+
+    for html in htmls:
+
+        for _ in range(repeat):
+            prepared = prepare(html, engine)
+
+            start = time.perf_counter()
+            run(prepared)
+            latencies.append(time.perf_counter() - start)
+
+            total_bytes += len(html)
+
+        # Measuring the memory separately, as tracing slows the stage down
+        prepared = prepare(html, engine)
+        tracemalloc.start()
+        run(prepared)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    total_time = sum(latencies)
+
+    return {
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'docs_per_s': len(latencies) / total_time,
+        'mb_per_s': total_bytes / total_time / 1e6,
+        'peak_mb': peak / 1e6,
+    }
+
+
+
+def scaling_exponent(small, large):
+    '''
+    Returns the exponent `k` of time ~ size^k between two synthetic sets - 1 is linear, 2 is quadratic
+    '''
+
+    (small_size, small_ms), (large_size, large_ms) = small, large
+
+    return math.log(large_ms / small_ms) / math.log(large_size / small_size)
+
+
+
+def check_corpus(corpus, engine=ENGINE):
+    '''
+    Returns the results of the corpus, compared to benchmarks/corpus/expected.json -
+    the body as the SHA-1 of the HTML that ArticleFinder returns, so any change of it is caught
+    '''
+
+    results = {}
+
+    for name, html in corpus.items():
+        body_finder = BodyFinder(html=cleaned(html, engine), engine=engine)
+        body = ArticleFinder(html=html, engine=engine).find()['body']
+
+        results[name] = {
+            'title': TitleFinder(html, engine=engine).find_text(),
+            'date': DateFinder(html).find(),
+            'body_tag': body_finder.tag,
+            'body_sha1': hashlib.sha1(body.encode('utf-8')).hexdigest(),
+            'tags_counter': TagSymbFinder(html, engine=engine).get_tags_counter(),
+        }
+
+    return results
+
+
+
+def print_table(results):
+    header = f"{'set':<18} {'stage':<38} {'p50 ms':>9} {'p99 ms':>9} {'docs/s':>9} {'MB/s':>7} {'peak MB':>8}"
+    print(header)
+    print('-' * len(header))
+
+    for set_name, stages in results.items():
+
+        for stage, stats in stages.items():
+            print(f"{set_name:<18} {stage:<38} {stats['p50_ms']:>9.2f} {stats['p99_ms']:>9.2f} "
+                  f"{stats['docs_per_s']:>9.1f} {stats['mb_per_s']:>7.2f} {stats['peak_mb']:>8.1f}")
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each stage on each page')
+    parser.add_argument('--sizes', default='20000,80000,320000', help='sizes of the synthetic pages, in characters')
+    parser.add_argument('--stages', default=','.join(STAGES), help='stages to be measured')
+    parser.add_argument('--engines', default=ENGINE, help=f"parser engines to be measured, of: {', '.join(ENGINES)}")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='the saved baseline to compare to')
+    parser.add_argument('--save-baseline', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=2.0, help='max ratio of p50 to the baseline p50')
+    parser.add_argument('--max-exponent', type=float, default=1.3, help='max exponent of time ~ size^k')
+    parser.add_argument('--update-expected', action='store_true', help='save the corpus results as expected')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    stages = args.stages.split(',')
+    engines = args.engines.split(',')
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+
+    corpus = load_corpus()
+    sets = {'corpus': list(corpus.values())}
+
+    for size in sizes:
+        sets[f'synthetic-{size}'] = [generate_article(size=size, seed=seed) for seed in range(SYNTHETIC_PAGES)]
+
+    results = {set_name: {stage_name(stage, engine, engines): measure(stage, htmls, args.repeat, engine)
+                          for engine in engines for stage in stages}
+               for set_name, htmls in sets.items()}
+
+    print_table(results)
+
+    # Speedup of the other engines - the p50 of the first engine over their p50
+    if len(engines) > 1:
+        print()
+
+        for set_name, stage_results in results.items():
+
+            for engine in engines[1:]:
+
+                for stage in stages:
+                    name = stage_name(stage, engine, engines)
+                    speedup = stage_results[stage]['p50_ms'] / stage_results[name]['p50_ms']
+                    print(f"speedup {set_name:<18} {name:<38} {speedup:>6.2f}x")
+
+    failed = False
+
+    # Scaling - from the smallest to the largest synthetic pages
+    if len(sizes) > 1:
+        print()
+
+        for stage in results[f'synthetic-{sizes[0]}']:
+            exponent = scaling_exponent((sizes[0], results[f'synthetic-{sizes[0]}'][stage]['p50_ms']),
+                                        (sizes[-1], results[f'synthetic-{sizes[-1]}'][stage]['p50_ms']))
+            status = 'ok'
+
+            if exponent > args.max_exponent:
+                status = 'FAIL: superlinear'
+                failed = True
+
+            print(f"scaling {stage:<38} time ~ size^{exponent:.2f} {status}")
+
+    # Comparing to the baseline
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+        print(f"\nSaved the baseline to {args.baseline}")
+
+    elif os.path.exists(args.baseline):
+        print()
+
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+        for set_name, stage_results in results.items():
+
+            for stage, stats in stage_results.items():
+                base_stats = baseline.get(set_name, {}).get(stage)
+
+                if not base_stats:
+                    continue
+
+                ratio = stats['p50_ms'] / base_stats['p50_ms']
+
+                if ratio > args.tolerance:
+                    print(f"REGRESSION {set_name} {stage}: p50 {stats['p50_ms']:.2f} ms, "
+                          f"baseline {base_stats['p50_ms']:.2f} ms ({ratio:.2f}x)")
+                    failed = True
+
+    # The results on the corpus
+    corpus_results = check_corpus(corpus, engines[0])
+
+    if args.update_expected:
+        with open(EXPECTED_PATH, 'w', encoding='utf-8') as f:
+            json.dump(corpus_results, f, indent=2, sort_keys=True, ensure_ascii=False)
+
+        print(f"Saved the expected results to {EXPECTED_PATH}")
+
+    else:
+        with open(EXPECTED_PATH, encoding='utf-8') as f:
+            expected = json.load(f)
+
+        for engine in engines:
+            engine_results = corpus_results if engine == engines[0] else check_corpus(corpus, engine)
+
+            for name, result in engine_results.items():
+
+                for key, value in result.items():
+
+                    if expected.get(name, {}).get(key) != value:
+                        print(f"MISMATCH {engine} {name} {key}: {value!r}, "
+                              f"expected {expected.get(name, {}).get(key)!r}")
+                        failed = True
+
+    # The tag counters, against the regex counter run on the same pages - the synthetic ones only of the smallest size,
+    # as it re-serializes the tree for every tag name
+    parity_pages = dict(corpus)
+
+    for seed, html in enumerate(sets[f'synthetic-{sizes[0]}']):
+        parity_pages[f"synthetic-{sizes[0]}-{seed}"] = html
+
+    for engine in engines:
+
+        for difference in regex_counter.check(parity_pages, engine):
+            print(f"MISMATCH {engine} tags counter {difference}")
+            failed = True
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    return 1 if failed else 0
+
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
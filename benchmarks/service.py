@@ -0,0 +1,189 @@
+'''
+Benchmark and check of the extraction service (meta_modules/service.py), run locally on a free port -
+the pages of benchmarks/corpus/ and synthetic pages are sent by many clients at the same time,
+then the load shedding and the timeouts are provoked on a service with a single worker.
+
+Usage:
+    python -m benchmarks.service [--workers 2] [--clients 8] [--rounds 3] [--engine bs4]
+
+Fails (exit code 1) when:
+- an article of the service differs from the one of ArticleFinder.find() on the same page
+- a full queue does not answer with 429, or a request over its timeout with 504
+- the worker of a timed out request is not replaced, or /metrics misses the requests
+'''
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+from find_article import ArticleFinder
+from meta_modules.cache import ResultCache
+from meta_modules.constants import ENGINE, ENGINES
+from meta_modules.service import ExtractionService
+
+from benchmarks.concurrency import load_pages
+from benchmarks.run import percentile
+from benchmarks.synthetic import generate_article
+
+
+# Symbols of the page that keeps the single worker busy, for the load shedding and the timeouts
+BIG_PAGE_SIZE = 2 * 1024 * 1024
+
+# Seconds of the timeout of a request on the big page, far less than it takes
+SHORT_TIMEOUT = 0.05
+
+
+
+def post(base_url, html, query=''):
+    '''
+    Returns (HTTP status, answer) of a page sent to the service
+    '''
+
+    request = urllib.request.Request(f"{base_url}/extract{query}",
+                                     data=html.encode('utf-8'),
+                                     headers={'Content-Type': 'text/html; charset=utf-8'})
+
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+
+def get_metrics(base_url):
+    '''
+    Returns the metrics of the service
+    '''
+
+    with urllib.request.urlopen(f"{base_url}/metrics") as response:
+        return json.loads(response.read())
+
+
+
+def check_throughput(pages, workers, clients, rounds, engine):
+    '''
+    Sends every page `rounds` times from `clients` threads, returns a list of the failures
+    '''
+
+    # Through JSON, as the answers of the service
+    expected = [json.loads(json.dumps(ArticleFinder(html=html, engine=engine).find())) for html in pages]
+    jobs = [index for _ in range(rounds) for index in range(len(pages))]
+    failures = []
+
+    with ExtractionService(port=0, workers=workers, engine=engine, cache=ResultCache()) as service:
+        base_url = 'http://{}:{}'.format(*service.address)
+
+        def send(index):
+            start = time.perf_counter()
+            status, answer = post(base_url, pages[index])
+
+            return index, status, answer, (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(clients) as executor:
+            results = list(executor.map(send, jobs))
+
+        seconds = time.perf_counter() - start
+        metrics = get_metrics(base_url)
+
+    latencies = [latency for _, _, _, latency in results]
+
+    print(f"{len(jobs)} requests, {clients} clients, {workers} workers: {len(jobs) / seconds:.1f} requests/s, "
+          f"p50 {percentile(latencies, 50):.1f} ms, p99 {percentile(latencies, 99):.1f} ms")
+
+    for stage, histogram in metrics['latency_ms']['stages'].items():
+        print(f"    {stage:<16} {histogram['count']:>6} times, mean {histogram['sum_ms'] / histogram['count']:.2f} ms")
+
+    for index, status, answer, _ in results:
+
+        if status != 200 or answer['article'] != expected[index]:
+            failures.append(f"page {index}: status {status}, the article differs from ArticleFinder.find()")
+
+    if metrics['requests']['found'] != len(jobs):
+        failures.append(f"/metrics counts {metrics['requests']['found']} found requests, not {len(jobs)}")
+
+    return failures
+
+
+
+def check_backpressure(small_page, engine):
+    '''
+    Fills the queue of a service with one worker, then times a request out. Returns a list of the failures.
+    '''
+
+    big_page = generate_article(size=BIG_PAGE_SIZE, seed=1)
+    failures = []
+
+    with ExtractionService(port=0, workers=1, queue_size=2, engine=engine) as service:
+        base_url = 'http://{}:{}'.format(*service.address)
+
+        # The worker takes one, two wait in the queue, the rest are dropped
+        with ThreadPoolExecutor(8) as executor:
+            statuses = list(executor.map(lambda _: post(base_url, big_page)[0], range(8)))
+
+        print(f"8 requests of a {BIG_PAGE_SIZE // 1024} KB page at once, 1 worker, queue of 2: "
+              f"{statuses.count(200)} found, {statuses.count(429)} dropped with 429")
+
+        if 429 not in statuses or set(statuses) - {200, 429}:
+            failures.append(f"a full queue answered with {sorted(set(statuses))}, not 200 and 429")
+
+        start = time.perf_counter()
+        status, _ = post(base_url, big_page, f"?timeout={SHORT_TIMEOUT}")
+        timed_out_ms = (time.perf_counter() - start) * 1000
+
+        # Found by the new worker
+        after_status, _ = post(base_url, small_page)
+        metrics = get_metrics(base_url)
+
+    print(f"A request with a timeout of {SHORT_TIMEOUT * 1000:.0f} ms: {status} after {timed_out_ms:.0f} ms, "
+          f"the next request: {after_status}, workers replaced: {metrics['restarts']}")
+
+    if status != 504:
+        failures.append(f"a request over its timeout answered with {status}, not 504")
+
+    if after_status != 200 or metrics['restarts'] < 1:
+        failures.append("the worker of the timed out request was not replaced")
+
+    if metrics['requests']['dropped'] != statuses.count(429) or metrics['requests']['timed_out'] != 1:
+        failures.append(f"/metrics misses the dropped or timed out requests: {metrics['requests']}")
+
+    return failures
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--pages', type=int, default=6, help='synthetic pages, on top of the corpus')
+    parser.add_argument('--engine', choices=ENGINES, default=ENGINE)
+    args = parser.parse_args(argv)
+
+    pages = load_pages(args.pages)
+
+    failures = check_throughput(pages, args.workers, args.clients, args.rounds, args.engine)
+    failures += check_backpressure(pages[0], args.engine)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+
+    return 1 if failures else 0
+
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,145 @@
+'''
+Generator of synthetic article pages, with a controlled size, nesting depth and number of paragraphs
+'''
+
+import random
+
+
+WORDS = (
+        'the', 'of', 'and', 'to', 'in', 'government', 'said', 'on', 'for', 'with', 'market',
+        'minister', 'year', 'was', 'percent', 'city', 'would', 'after', 'police', 'new', 'company',
+        'report', 'from', 'people', 'first', 'last', 'week', 'data', 'project', 'energy', 'price',
+        'school', 'health', 'court', 'election', 'water', 'team', 'season', 'bank', 'growth',
+)
+
+
+
+def sentence(rnd, words):
+    '''
+    Returns a sentence of `words` random words
+    '''
+
+    text = ' '.join(rnd.choice(WORDS) for _ in range(words))
+
+    return text.capitalize() + '.'
+
+
+
+def paragraph(rnd, words):
+    '''
+    Returns a <p> tag with about `words` words, some of them in formatting tags and links
+    '''
+
+    parts = []
+
+    while words > 0:
+        length = min(words, rnd.randint(6, 18))
+        text = sentence(rnd, length)
+        kind = rnd.random()
+
+        if kind < 0.08:
+            text = f'<a href="/story/{rnd.randint(1, 10 ** 6)}">{text}</a>'
+        elif kind < 0.14:
+            text = f'<strong>{text}</strong>'
+        elif kind < 0.18:
+            text = f'<em>{text}</em>'
+
+        parts.append(text)
+        words -= length
+
+    return f"<p>{' '.join(parts)}</p>"
+
+
+
+def noise_block(rnd):
+    '''
+    Returns a block that is not a part of the article - an ad, a list of related links or a share bar
+    '''
+
+    kind = rnd.random()
+
+    if kind < 0.4:
+        return ('<div class="ad-slot"><div class="ad-inner"><!-- ad -->'
+                f'<script>loadAd({rnd.randint(1, 99)});</script><span> </span></div></div>')
+
+    if kind < 0.7:
+        links = ''.join(f'<li><a href="/related/{rnd.randint(1, 10 ** 6)}">{sentence(rnd, 7)}</a></li>'
+                        for _ in range(rnd.randint(3, 6)))
+        return f'<aside class="related"><h3>Related</h3><ul>{links}</ul></aside>'
+
+    return ('<div class="share"><button>Share</button><a href="#fb"><i class="icon-fb"></i></a>'
+            '<a href="#tw"><i class="icon-tw"></i></a></div>')
+
+
+
+def generate_article(paragraphs=30, depth=3, words=60, noise=0.2, size=None, seed=0):
+    '''
+    Returns the HTML of a synthetic news article page.
+
+    `paragraphs`    - Integer - number of paragraphs of the article\n
+    `depth`         - Integer - number of <div> wrappers around the paragraphs\n
+    `words`         - Integer - average number of words of a paragraph\n
+    `noise`         - Float - ratio of ads and related links between the paragraphs\n
+    `size`          - Integer - if set, paragraphs are added until the page has about that many characters\n
+    `seed`          - Integer - seed of the random generator; the same arguments give the same page
+    '''
+
+    rnd = random.Random(seed)
+
+    title = sentence(rnd, 9).rstrip('.')
+    body = []
+    body_len = 0
+
+    def wanted():
+        if size is not None:
+            return body_len < size
+
+        return len(body) < paragraphs
+
+    while wanted():
+        if rnd.random() < noise:
+            block = noise_block(rnd)
+        elif rnd.random() < 0.08:
+            block = f'<h2>{sentence(rnd, 6)}</h2>'
+        else:
+            block = paragraph(rnd, rnd.randint(words // 2, words * 3 // 2))
+
+        body.append(block)
+        body_len += len(block)
+
+    article = ''.join(body)
+
+    for level in range(depth):
+        article = f'<div class="wrap-{level}">{article}</div>'
+
+    nav = ''.join(f'<li><a href="/section/{i}">{rnd.choice(WORDS).title()}</a></li>' for i in range(12))
+    footer_links = ''.join(f'<a href="/page/{i}">{sentence(rnd, 2)}</a> ' for i in range(10))
+
+    return f'''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title} | The Daily Synthetic</title>
+<meta property="og:title" content="{title}">
+<meta property="article:published_time" content="2020-0{rnd.randint(1, 9)}-1{rnd.randint(0, 9)}T08:30:00+02:00">
+<link rel="stylesheet" href="/static/site.css">
+<style>body {{ font-family: serif; }} .ad-slot {{ min-height: 250px; }}</style>
+<script>window.dataLayer = window.dataLayer || []; if (1 < 2) {{ dataLayer.push({{"page": "article"}}); }}</script>
+</head>
+<body>
+<header class="site-header"><div class="logo"><a href="/">The Daily Synthetic</a></div><nav><ul>{nav}</ul></nav></header>
+<main>
+<article>
+<h1>{title}</h1>
+<div class="byline"><span class="author">By {sentence(rnd, 2)}</span> <time>2020</time></div>
+{article}
+</article>
+<aside class="sidebar">{''.join(noise_block(rnd) for _ in range(4))}</aside>
+</main>
+<footer><p>{sentence(rnd, 12)}</p><div class="links">{footer_links}</div>
+<form action="/search"><input name="q"><button>Search</button></form></footer>
+<!-- analytics -->
+<script>(function() {{ var s = document.createElement("script"); s.src = "/a.js"; }})();</script>
+</body>
+</html>
+'''
@@ -3,36 +3,191 @@ Module that finds the article TITLE and BODY
 '''
 
 import datetime
+import functools
 import re
-import requests as req
-from bs4 import BeautifulSoup
 
 from meta_modules.tag_symb_finder import Finder
 from meta_modules.find_body_tag import BodyTagFinder
 
-from meta_modules.cleaner import Cleaner
-from meta_modules.constants import PARSER
+from meta_modules.budget import TRUNCATED
+from meta_modules.cache import cache_key
+from meta_modules.cleaner import Cleaner, clean_body, get_keep_tags
+from meta_modules.constants import ENGINE, ENGINES
+from meta_modules.document import Document
+from meta_modules.fingerprint import BOILERPLATE_TAGS, sketch
+from meta_modules import lxml_engine
+from meta_modules.instrumentation import StageTimer, logger
+from meta_modules.output import OUTPUTS, SourceIndex, node_text, tag_ordinals
+from meta_modules.templates import domain_of
+from meta_modules.text_index import build_table
+
+
+
+def _check_options(output, engine, templates):
+    '''
+    Raises ValueError when an option is unknown, or does not work with the other ones
+    '''
+
+    if output not in OUTPUTS:
+        raise ValueError(f"Unknown output: {output!r}, expected one of: {', '.join(OUTPUTS)}")
+
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine!r}, expected one of: {', '.join(ENGINES)}")
+
+    if engine == 'lxml' and (output == 'spans' or templates is not None):
+        raise ValueError("The 'lxml' engine works with neither the 'spans' output, nor the templates")
+
 
 
 class ArticleFinder(Finder):
     '''
     Class that automatically finds the TITLE and BODY of an article.
 
-    `html`          - String - the HTML source code\n
-    `skip_tags`     - List -tags to be skipped while counting the symbols inside the tags in the whole HTML\n
-    `clean_tags`    - List - tags to be cleaned as a final filter (as an argument in Cleaner())\n
+    `html`          - String or Document - the HTML source code\n
+    `skip_tags`     - Iterable - tags to be skipped while counting the symbols inside the tags in the whole HTML\n
+    `clean_tags`    - Iterable - tags to be cleaned as a final filter (as an argument in Cleaner())\n
     `anchor_text`   - Boolean - False if you want to get the text WITH the anchor tag; default value - True\n
-    `init_clean`    - Boolean - False for when you don't want to use the Cleaner before the Finder; default value - True
+    `init_clean`    - Boolean - False for when you don't want to use the Cleaner before the Finder; default value - True\n
+    `keep_tags`     - Iterable - tags to be kept by the Cleaner; default value - the tags from meta_modules/data/tags_percent.csv\n
+    `tracer`        - Tracer or callable - gets an event at the end of every stage, see meta_modules/instrumentation.py\n
+    `timings`       - Boolean - True for adding the wall time of every stage to the result, as 'timings'; default value - False\n
+    `cache`         - ResultCache - the results of the same HTML and options are found only once,
+    see meta_modules/cache.py\n
+    `url`           - String - the URL of the page, needed for the `templates`\n
+    `templates`     - TemplateStore - the body of a page is first looked for where it was on the previous pages
+    of the same domain, see meta_modules/templates.py\n
+    `output`        - String - the form of the TITLE and BODY; default value - 'html':
+    - 'html' - the TITLE as an <h1> tag and the BODY as the HTML of its cleaned parent tag
+    - 'text' - the TITLE and the plain text of the BODY, one line per paragraph, without serializing any HTML
+    - 'spans' - the TITLE and (start, end) of the parent tag of the BODY in `html`, `html[start:end]`
+    being its original HTML (for bytes, the positions are in the decoded str); None if it is not in `html`\n
+    `engine`        - String - what builds the tree of the page; default value - 'bs4':
+    - 'bs4' - BeautifulSoup
+    - 'lxml' - lxml alone, a few times faster, with the same results; not with the `templates` or the 'spans' output
+    (see meta_modules/lxml_engine.py)\n
+    `budget`        - Budget - limits on the size of the page, its tags, the time of every stage and the candidates
+    of the body; a page over them gives a degraded result, with the outcome added to the result as 'budget',
+    see meta_modules/budget.py\n
+    `dedup`         - DedupIndex - the result of a near-duplicate of an earlier page is reused without finding it again,
+    and a body that is a near-duplicate of an earlier one is marked, in the result as 'dedup', see meta_modules/fingerprint.py
     '''
 
-    def __init__(self, html, skip_tags=[], clean_tags=[], only_body=False, anchor_text=True, init_clean=True):
-        super().__init__(html)
+    def __init__(self, html, skip_tags=(), clean_tags=(), only_body=False, anchor_text=True, init_clean=True, keep_tags=None,
+                 tracer=None, timings=False, cache=None, url=None, templates=None, output='html', engine=ENGINE,
+                 budget=None, dedup=None):
+        super().__init__(html, engine)
+
+        _check_options(output, self.document.engine, templates)
+
+        if output == 'spans' and self.html is None:
+            raise ValueError("The 'spans' output needs the source code, which a streamed Document does not keep")
 
-        self.skip_tags = skip_tags
+        # Copied, so a list changed by the caller afterwards does not change the options
+        self.skip_tags = tuple(skip_tags or ())
         self.symbols_dct = None
-        self.clean_tags = clean_tags
+        self.clean_tags = tuple(clean_tags or ())
         self.anchor_text = anchor_text
         self.init_clean = init_clean
+        self.keep_tags = keep_tags
+        self.tracer = tracer
+        self.timings = timings
+        self.cache = cache
+        self.url = url
+        self.templates = templates
+        self.output = output
+        self.budget = budget
+        self.dedup = dedup
+
+        # Stage => wall time in milliseconds, of the last `find()`
+        self.stage_timings = {}
+
+        # The date of a Document read with `from_stream()`
+        self.stream_date = None
+
+        # The BudgetTracker of the last `find()`, None without a budget
+        self.budget_tracker = None
+
+
+    @classmethod
+    def find_many(cls, htmls, workers=None, ordered=True, max_pending=None, urls=None, **options):
+        '''
+        Returns a generator of the articles of many HTML documents, found in parallel
+        by a pool of `workers` processes.
+
+        `htmls`     - Iterable - the HTML source codes, read lazily\n
+        `urls`      - Iterable - the URL of each HTML source code, in the same order, read along with it\n
+        `ordered`   - Boolean - False for getting the results as they are completed; default value - True\n
+        `options`   - the same keyword arguments as ArticleFinder(), set once for the whole batch
+
+        Each result is a dictionary - {'index': ..., 'article': ..., 'error': ...},
+        see meta_modules/batch.py
+        '''
+
+        # Imported only when needed, as the multiprocessing modules are slow to import
+        from meta_modules.batch import BatchFinder
+
+        batch_finder = BatchFinder(cls,
+                                   workers=workers,
+                                   ordered=ordered,
+                                   max_pending=max_pending,
+                                   **options)
+
+        return batch_finder.find(htmls, urls)
+
+
+    @classmethod
+    def find_urls(cls, urls, concurrency=16, per_host=4, queue_size=None, workers=None, **options):
+        '''
+        Returns an async generator of the articles of many URLs. The pages are fetched with asyncio
+        while the articles of the fetched ones are found by a pool of `workers` processes.
+
+        `urls`          - Iterable or async iterable - the URLs of the pages\n
+        `concurrency`   - Integer - max number of pages being fetched at the same time\n
+        `per_host`      - Integer - max number of pages being fetched from the same host\n
+        `queue_size`    - Integer - max number of fetched pages waiting for the extraction\n
+        `options`       - the same keyword arguments as ArticleFinder(), set once for all pages;
+        `timeout` and `headers` are used for the requests
+
+        Each result is a dictionary - {'index': ..., 'url': ..., 'article': ..., 'error': ...},
+        see meta_modules/pipeline.py
+        '''
+
+        # Imported only when needed, as requests and the multiprocessing modules are slow to import
+        from meta_modules.pipeline import Pipeline
+
+        pipeline = Pipeline(cls,
+                            concurrency=concurrency,
+                            per_host=per_host,
+                            queue_size=queue_size,
+                            workers=workers,
+                            **options)
+
+        return pipeline.find(urls)
+
+
+    @classmethod
+    def from_stream(cls, chunks, encoding=None, **options):
+        '''
+        Returns an ArticleFinder of an HTML source code that is read chunk by chunk.
+
+        Each chunk is given to the parser as soon as it is read and the DATE is looked for
+        on the fly, so only the tree is kept in memory, never the whole source code.
+
+        `chunks`    - Iterable or file-like object - chunks of str or bytes\n
+        `encoding`  - String - the encoding of bytes chunks; default value - utf-8\n
+        `options`   - the same keyword arguments as ArticleFinder()
+        '''
+
+        date_scanner = DateScanner()
+        document = Document.from_chunks(chunks,
+                                        encoding=encoding,
+                                        on_text=date_scanner.feed,
+                                        engine=options.get('engine', ENGINE))
+
+        article_finder = cls(html=document, **options)
+        article_finder.stream_date = date_scanner.find()
+
+        return article_finder
 
 
     def find(self):
@@ -43,248 +198,809 @@ class ArticleFinder(Finder):
         of it being published.
         '''
         self.dct = {}
+        self.stage_timings = {}
+        self.budget_tracker = tracker = self.budget.tracker() if self.budget is not None else None
+
+        # A streamed Document has no source code to be hashed, so it is never cached
+        key = None
+        options = {'skip_tags': self.skip_tags,
+                   'clean_tags': self.clean_tags,
+                   'anchor_text': self.anchor_text,
+                   'init_clean': self.init_clean,
+                   'keep_tags': self.keep_tags,
+                   'output': self.output}
+
+        # The sketches of the pages and of the bodies are kept apart for each set of options
+        namespace = cache_key('', options) if self.dedup is not None else None
+        page_sketch = None
+        duplicate = None
+
+        # The positions of the 'spans' are of the source code of a single page, so they are never reused
+        if self.dedup is not None and self.html is not None and self.output != 'spans':
+
+            with self.__stage('dedup') as event:
+                # The template of the site is left out, it is the same on the pages of other articles
+                page_sketch = sketch(self.html, BOILERPLATE_TAGS + tuple(self.skip_tags))
+                duplicate = self.dedup.find(f"page/{namespace}", page_sketch) if page_sketch is not None else None
+
+                # A short article can still have few shingles of its own, next to the rest of the template
+                if duplicate is not None and not self.__same_article(duplicate[2]['result']):
+                    duplicate = None
+
+                event['candidates'] = int(duplicate is not None)
+
+            if duplicate is not None:
+                entry_id, similarity, value = duplicate
+                self.dct = value['result']
+
+                return self.__finish(tracker, self.__dedup_outcome('page', entry_id, similarity, value))
+
+        if self.cache is not None and self.html is not None:
+
+            with self.__stage('cache') as event:
+                key = cache_key(self.html, options)
+                cached = self.cache.get(key)
+                event['candidates'] = int(cached is not None)
+
+            if cached is not None:
+                self.dct = cached
+
+                # The results are cached as JSON, which has no tuples
+                if self.output == 'spans' and self.dct['body'] is not None:
+                    self.dct['body'] = tuple(self.dct['body'])
+
+                return self.__finish(tracker, self.__dedup_outcome() if self.dedup is not None else None)
+
+        # Cutting a page that is too long, before anything is parsed
+        if (tracker is not None and self.budget.max_input_size is not None and self.html is not None
+                and len(self.html) > self.budget.max_input_size and not self.document.is_parsed):
+            self.document = Document(self.html[:self.budget.max_input_size], engine=self.document.engine)
+            self.html = self.document.html
+            tracker.hit('max_input_size', TRUNCATED)
+
+        # The HTML is parsed only once, every stage below works on `self.document`
 
         # Getting the TITLE
-        title = TitleFinder(self.html).find()
+        with self.__stage('title'):
+            title_finder = TitleFinder(self.document)
+            title = title_finder.find() if self.output == 'html' else title_finder.find_text()
         
         # Getting the DATE
-        date = DateFinder(self.html).find()
-
-        # Initial use of the Cleaner
-        if self.init_clean:
-            cleaner = Cleaner(self.html)
-            self.html = str(cleaner.clean())
+        with self.__stage('date') as event:
+            # A streamed Document has no source code kept, its DATE was found while reading it
+            if self.document.html is None:
+                date = self.stream_date
+            else:
+                date_finder = DateFinder(self.document)
+                date = date_finder.find()
+                event['candidates'] = date_finder.candidates_count
+
+        with self.__stage('parse'):
+            self.document.soup
+
+            # A streamed page nested deeper than lxml builds, whose tree is missing the rest of the page
+            if self.document.depth_cut:
+                logger.warning("The tree is cut at a depth of %d tags, the rest of the page is missing",
+                               lxml_engine.MAX_DEPTH)
+
+                if tracker is not None:
+                    tracker.hit('max_depth', TRUNCATED)
+
+            # Which start tag of the source code each tag comes from, before the cleaning removes any
+            if self.output == 'spans':
+                ordinals = tag_ordinals(self.document.soup)
+
+            # Cutting a tree with too many tags, after the ordinals, which are of the whole source code
+            if tracker is not None and self.budget.max_nodes is not None:
+
+                if self.document.truncate(self.budget.max_nodes):
+                    tracker.hit('max_nodes', TRUNCATED)
+
+        # Initial use of the Cleaner, which cleans the tree in place
+        if self.init_clean and not (tracker is not None and tracker.skips('cleaning')):
+            with self.__stage('cleaning') as event:
+                cleaner = Cleaner(self.document, keep_tags=self.keep_tags).clean(budget=tracker)
+                event['nodes'] = cleaner.nodes_count
+                event['candidates'] = cleaner.removed_count
 
         # Getting the BODY
-        body_finder = BodyFinder(html=self.html, skip_tags=self.skip_tags)
-        body = body_finder.find()
+        domain = domain_of(self.url) if self.templates is not None and self.url else None
+        template = None
+
+        if domain:
+            # Where the body was on the previous pages of the domain
+            with self.__stage('template') as event:
+                template = self.templates.find(domain, self.document.soup)
+                event['candidates'] = int(template is not None)
+
+        if template is not None:
+            container = template[1]
+            self.symbols_dct = None
+
+        else:
+            with self.__stage('tag_counting') as event:
+                body_finder = BodyFinder(html=self.document, skip_tags=self.skip_tags)
+                event['nodes'] = body_finder.nodes_count
+                event['candidates'] = len(body_finder.get_tags_dct())
 
+            with self.__stage('body') as event:
+                container = body_finder.find_container(budget=tracker)
+                event['nodes'] = len(body_finder.features)
+                event['candidates'] = body_finder.candidates_count
 
-        self.symbols_dct = body_finder.get_tags_dct()
+            self.symbols_dct = body_finder.get_tags_dct()
+
+            if domain and body_finder.article_tag:
+                self.templates.learn(domain, body_finder.tag, body_finder.article_tag)
 
         try:
             self.dct['title'] = title
-            self.dct['body'] = body
             self.dct['date'] = date
-            self.__clean_article(clean_tags=self.clean_tags)
 
-            return self.dct
+            with self.__stage('post_processing'):
+
+                # "" when there is no body
+                if self.output == 'text' and isinstance(container, str):
+                    self.dct['body'] = ''
+
+                elif self.output == 'text' and self.document.engine == 'lxml':
+                    self.dct['body'] = lxml_engine.node_text(container, self.clean_tags)
+
+                elif self.output == 'text':
+                    self.dct['body'] = node_text(container, self.clean_tags)
+
+                elif self.output == 'spans':
+                    self.dct['body'] = self.__span(container, ordinals)
+
+                else:
+                    self.dct['body'] = self.__clean_article(container, clean_tags=self.clean_tags)
+
+            degraded = tracker is not None and tracker.degraded
+            dedup = None
+
+            if self.dedup is not None:
+                with self.__stage('body_dedup') as event:
+                    dedup = self.__dedup_body(namespace, page_sketch, degraded)
+                    event['candidates'] = int(dedup['duplicate'] is not None)
+
+            # A degraded result is not the one of the page, so it is not cached
+            if key is not None and not degraded:
+                self.cache.put(key, self.dct)
+
+            return self.__finish(tracker, dedup)
 
         except TypeError:
             return "Article BODY or TITLE wasn't found"
 
 
-    def __clean_article(self, clean_tags=[]):
+    def __finish(self, tracker, dedup=None):
         '''
-        Removes the <a> tag, while leaving the text in it.
-        Uses the meta_modules/cleaner.py module to clean it afterwards.
+        Returns the result, with what is added to it on top of the TITLE, DATE and BODY of the page
         '''
 
-        # Removing the <a> tag, but leaving out the text in it
-        if self.anchor_text:
-            self.dct['body'] = re.sub(pattern='(?:<a[^<]+>)|(?:<\s*\/a\s*>)',
-                                  repl='',
-                                  string=self.dct['body'])
+        if dedup is not None:
+            self.dct['dedup'] = dedup
+
+        if self.timings:
+            self.dct['timings'] = self.stage_timings
+
+        if tracker is not None:
+            self.dct['budget'] = tracker.report()
+
+        return self.dct
+
+
+    def __same_article(self, result):
+        '''
+        Returns True if `result`, of a near-duplicate page, has the TITLE and DATE of this page, so it can be reused
+        '''
+
+        title_finder = TitleFinder(self.document)
+        title = title_finder.find() if self.output == 'html' else title_finder.find_text()
+
+        return result['title'] == title and result['date'] == DateFinder(self.document).find()
+
+
+    def __dedup_body(self, namespace, page_sketch, degraded):
+        '''
+        Looks for a near-duplicate of the found body among the earlier ones, and adds the sketches of the page
+        (along with its result) and of the body to `dedup`, unless the result is degraded.
+        Returns the outcome, see `__dedup_outcome()`.
+        '''
+
+        body = self.dct['body']
+
+        if self.output == 'spans':
+            body = self.html[body[0]:body[1]] if body is not None else None
+
+        body_sketch = sketch(body) if body else None
+        duplicate = self.dedup.find(f"body/{namespace}", body_sketch) if body_sketch is not None else None
+
+        if not degraded:
+
+            if page_sketch is not None:
+                self.dedup.add(f"page/{namespace}", page_sketch, {'url': self.url, 'result': self.dct})
+
+            # The first of the near-duplicate bodies stands for all of them
+            if body_sketch is not None and duplicate is None:
+                self.dedup.add(f"body/{namespace}", body_sketch, {'url': self.url})
+
+        if duplicate is None:
+            return self.__dedup_outcome()
+
+        return self.__dedup_outcome('body', *duplicate)
+
+
+    @staticmethod
+    def __dedup_outcome(duplicate=None, entry_id=None, similarity=None, value=None):
+        '''
+        Returns the outcome of the `dedup` index, added to the result - {'duplicate': ..., 'of': ..., 'similarity': ...}:
+        `duplicate`     - 'page' when the result of an earlier page is reused, 'body' when only the body
+        is a near-duplicate of an earlier one, None for neither\n
+        `of`            - the URL of the earlier page, or its id in the index when it had none\n
+        `similarity`    - the estimated share of the shingles of the two, between 0 and 1
+        '''
+
+        if duplicate is None:
+            return {'duplicate': None, 'of': None, 'similarity': None}
+
+        return {'duplicate': duplicate, 'of': value['url'] or entry_id, 'similarity': similarity}
+
+
+    def __stage(self, stage):
+        '''
+        Returns the StageTimer of a stage of `find()`
+        '''
+
+        input_size = len(self.html) if self.html is not None else None
+
+        return StageTimer(stage,
+                          tracer=self.tracer,
+                          timings=self.stage_timings,
+                          input_size=input_size,
+                          budget=self.budget_tracker)
+
+
+    def __span(self, container, ordinals):
+        '''
+        Returns (start, end) of `container` in the source code, None if it is not there
+        '''
+
+        if not container:
+            return None
+
+        tag_ordinals, tag_counts = ordinals
+
+        return SourceIndex(self.html).span(container, tag_ordinals[id(container)], tag_counts[container.name])
+
+
+    def __clean_article(self, container, clean_tags=None):
+        '''
+        Returns the HTML of the body, cleaned with a single pass over `container` (see cleaner.clean_body()) -
+        the <a> tags unwrapped, while leaving the text in them, and the tags not kept or in `clean_tags` removed.
+        The body is serialized once, without newlines, as a page of its own (<html><body>...</body></html>).
+        '''
+
+        # "" when there is no body
+        if isinstance(container, str):
+            return container
+
+        unwrap_tags = ('a',) if self.anchor_text else ()
+
+        kept = clean_body(self.document, container,
+                          keep_tags=self.keep_tags,
+                          additional_tags=clean_tags,
+                          unwrap_tags=unwrap_tags)
+
+        name = container.tag if self.document.engine == 'lxml' else container.name
+        body = self.document.serialize(container, contents=name in unwrap_tags).replace('\n', '')
+
+        # Nothing is left of the body
+        if not kept or not body:
+            return ''
+
+        if name == 'html':
+            return body
+
+        if name in ('body', 'head'):
+            return f"<html>{body}</html>"
+
+        return f"<html><body>{body}</body></html>"
+
+
+
+class Extractor:
+    '''
+    Finds the articles of many pages with the same options, which are checked and set up once,
+    when it is created - the tags to be kept are read, the date patterns compiled and the engine chosen.
+
+    It holds no state of a page: every `extract()` keeps what it finds in an ArticleFinder of its own,
+    so a single Extractor can be shared by the threads of a pool, e.g. next to the lxml parsing,
+    which releases the GIL, or on a free-threaded build of Python. The `cache`, `templates` and `dedup`
+    lock themselves while they are used; a `tracer` gets the events of every thread, so it must be thread-safe.
+
+    Takes the same keyword arguments as ArticleFinder, but for `html` and `url`, which are given to `extract()`.
+    '''
+
+    def __init__(self, skip_tags=(), clean_tags=(), anchor_text=True, init_clean=True, keep_tags=None,
+                 tracer=None, timings=False, cache=None, templates=None, output='html', engine=ENGINE,
+                 budget=None, dedup=None):
+        _check_options(output, engine, templates)
+
+        # Read and compiled now, rather than by the first page of one of the threads
+        if keep_tags is None:
+            get_keep_tags()
+
+        DateFinder.patterns()
+
+        self.options = {
+            'skip_tags': tuple(skip_tags or ()),
+            'clean_tags': tuple(clean_tags or ()),
+            'anchor_text': anchor_text,
+            'init_clean': init_clean,
+            'keep_tags': frozenset(keep_tags) if keep_tags is not None else None,
+            'tracer': tracer,
+            'timings': timings,
+            'cache': cache,
+            'templates': templates,
+            'output': output,
+            'engine': engine,
+            'budget': budget,
+            'dedup': dedup,
+        }
+
+
+    def extract(self, html, url=None):
+        '''
+        Returns the article of a page - the same dictionary as ArticleFinder.find().
+        Reentrant, it can be called by many threads at the same time.
+
+        `html`  - String, bytes-like or Document - the HTML source code, or a Document that no other thread uses\n
+        `url`   - String - the URL of the page, needed for the `templates` and kept by the `dedup`
+        '''
+
+        return ArticleFinder(html, url=url, **self.options).find()
+
+
+    def __repr__(self):
+        options = ', '.join(f"{option}={value!r}" for option, value in self.options.items())
+
+        return f"Extractor({options})"
+
+
+# (anchor, pattern, symbols before the anchor, symbols after the anchor), in order of priority
+DATE_PATTERNS = (
+    # <meta property="article:published_time" content="...">, or with `content` before `property`
+    ('published_time',
+     re.compile(r'[\'\"][^\'\"<>]+published_time[\'\"][^>]*content\s*=\s*[\'\"](.+?)[\'\"]'
+                r'|content\s*=\s*[\'\"]([^\'\"<>]+)[\'\"][^<>]*[\'\"][^\'\"<>]*published_time[\'\"]'),
+     1024, 1024),
+    # "datePublished": "..." in the JSON-LD <script> tags
+    ('datePublished',
+     re.compile(r'[\'\"]datePublished[\'\"]\s*:\s*[\'\"](.+?)[\'\"]'),
+     1, 256),
+)
+
+# Dates like 2020-12-31, 2020/12/31 or 31-12-2020
+DATE_RE = re.compile(r'(\d{4})[\-:\/](\d{1,2})[\-\/](\d{1,2})|(\d{2})[\-:\/](\d{2})[\-\/](\d{4})')
+
+
+
+@functools.lru_cache(maxsize=2)
+def _year_date_pattern(year):
+    '''
+    Returns the pattern of a date in `year`, compiled once per year
+    '''
+
+    pattern = re.compile(f'((?:{year}[\\-:\\/]\\d{{1,2}}[\\-\\/]\\d{{1,2}})|(?:\\d{{2}}[\\-:\\/]\\d{{2}}[\\-\\/]{year}))')
+
+    # From `31-12-` before the year, to `-12-31` after it
+    return (str(year), pattern, 6, 6)
+
+
+
+def search_around(text, anchor, pattern, before, after):
+    '''
+    Returns the first match of `pattern` in the windows of `text` around each occurrence of `anchor`,
+    None if there is no match.
+
+    The date is in the only group of the match that is not None - `match[match.lastindex]`.
+    '''
+
+    pos = text.find(anchor)
+
+    while pos != -1:
+        match = pattern.search(text, max(pos - before, 0), pos + len(anchor) + after)
+
+        if match:
+            return match
+
+        pos = text.find(anchor, pos + 1)
+
+    return None
+
 
-        self.dct['body'] = re.sub(pattern='\n',
-                                  repl='',
-                                  string=self.dct['body'])
 
-        cleaner = Cleaner(self.dct['body'])
-        self.dct['body'] = str(cleaner.clean(additional_tags=clean_tags))
+def normalize_date(date):
+    '''
+    Returns `date` in ISO 8601 - `2020-12-31T10:00:00+02:00`, or `2020-12-31` if it has no time.
+
+    Dates like `31-12-2020` are read as day-month-year, unless the month is over 12.
+    If `date` can not be read, it is returned stripped, as it is.
+    '''
+
+    date = date.strip()
+
+    try:
+        # `Z` is not read by datetime.fromisoformat() before Python 3.11
+        parsed = datetime.datetime.fromisoformat(re.sub(r'[zZ]$', '+00:00', date))
+
+        if parsed.time() == datetime.time() and parsed.tzinfo is None and len(date) <= 10:
+            return parsed.date().isoformat()
+
+        return parsed.isoformat()
+
+    except ValueError:
+        pass
+
+    match = DATE_RE.fullmatch(date)
+
+    if not match:
+        return date
+
+    try:
+        if match.group(1):
+            year, month, day = match.group(1, 2, 3)
+        else:
+            day, month, year = match.group(4, 5, 6)
+
+            if int(month) > 12:
+                day, month = month, day
+
+        return datetime.date(int(year), int(month), int(day)).isoformat()
+
+    except ValueError:
+        return date
+
 
 
 class DateFinder(Finder):
+    '''
+    Finds the date of publishing of an article, normalized to ISO 8601 (see `normalize_date()`).
+
+    Looks for, in order of priority:
+    - the <meta> tag with `published_time`
+    - "datePublished" in the JSON-LD <script> tags
+    - a date of the current year, anywhere in the source code
+
+    Instead of running each pattern over the whole source code, the literal anchor of the pattern
+    (e.g. `published_time`) is found with `str.find()` and the pattern is only matched
+    in a small window around it.
+    '''
 
     def __init__(self, html):
         super().__init__(html)
 
+        # Number of patterns tried by the last `find()`
+        self.candidates_count = 0
 
-    def __re_search(self, pttrn):
-        date = None
-        match = re.search(pattern=pttrn,
-                          string=self.html)
 
-        if match:
-            date = match.group(1)
+    @staticmethod
+    def patterns():
+        '''
+        Returns a tuple of (anchor, pattern, symbols before the anchor, symbols after the anchor),
+        in order of priority. The patterns are compiled only once.
+        '''
 
-        return date
+        return DATE_PATTERNS + (_year_date_pattern(datetime.date.today().year),)
 
 
     def find(self):
-        date = None
+        '''
+        Returns the date with the highest priority, None if there is no date
+        '''
 
-        # Checking in the <meta> tags
-        date = self.__re_search(r'[\'\"][^\'\"]+published_time[\'\"][^>]*content\s*=\s*[\'\"](.+?)[\'\"]')
-        if date:
-            return date
+        self.candidates_count = 0
 
-        # Checking in the <script> tags
-        date = self.__re_search(r'[\'\"]datePublished[\'\"]:[\'\"](.+?)[\'\"]')
-        if date:
-            return date
+        for pattern in self.patterns():
+            self.candidates_count += 1
+            match = search_around(self.html, *pattern)
 
-        # Checking in the whole of the source code
-        now = datetime.datetime.now()
-        current_year = now.year
-        date_pattern = f'((?:{current_year}[\-:\/]\d{{1,2}}[\-\/]\d{{1,2}})|(?:\d{{2}}[\-:\/]\d{{2}}[\-\/]{current_year}))'
+            if match:
+                return normalize_date(match[match.lastindex])
 
-        date = self.__re_search(date_pattern)
+        return None
 
-        return date
+
+
+class DateScanner:
+    '''
+    Finds the date of an HTML source code that is read chunk by chunk,
+    with the same patterns as DateFinder, without keeping the whole source code.
+
+    Call `feed()` with every chunk of text, then `find()`.
+    '''
+
+    # Symbols kept from the previous chunks, so that a date split between two chunks is still found
+    overlap = 4096
+
+
+    def __init__(self):
+        self.patterns = DateFinder.patterns()
+        self.dates = [None] * len(self.patterns)
+        self.tail = ''
+
+
+    def feed(self, text):
+        '''
+        Looks for every date that has not been found yet, in the tail of the previous chunks and `text`
+        '''
+
+        window = self.tail + text
+
+        for i, pattern in enumerate(self.patterns):
+
+            if self.dates[i] is None:
+                match = search_around(window, *pattern)
+
+                # A match touching the end of the window might go on in the next chunk
+                if match and match.end() < len(window):
+                    self.dates[i] = match[match.lastindex]
+
+        self.tail = window[-self.overlap:]
+
+
+    def find(self):
+        '''
+        Returns the date with the highest priority, that was found
+        '''
+
+        for i, pattern in enumerate(self.patterns):
+
+            if self.dates[i] is None:
+                match = search_around(self.tail, *pattern)
+
+                if match:
+                    self.dates[i] = match[match.lastindex]
+
+            if self.dates[i]:
+                return normalize_date(self.dates[i])
+
+        return None
 
 
 
 class TitleFinder(Finder):
+    '''
+    Finds the TITLE of an article - from the <meta> tag with property='og:title', or the <title> tag.
 
-    def __init__(self, html):
-        super().__init__(html)
+    Both are in <head>, so only <head> is parsed (or searched, if the Document is already parsed).
+    The whole tree is searched only if the title is not found in <head>.
+    '''
+
+    def __init__(self, html, engine=ENGINE):
+        super().__init__(html, engine)
 
 
     def find(self):
         '''
-        Finds the title using the meta tags in HTML
+        Returns the title, as an <h1> tag
         '''
 
+        title = self.find_text()
+
+        if title is None:
+            return None
+
+        return f'<h1 class="auto-title">{title}</h1>'
+
+
+    def find_text(self):
+        '''
+        Returns the title, as a string
+        '''
+
+        for soup in self.__soups():
+            title = self.__find_in(soup)
+
+            if title is not None:
+                return title
+
+        logger.debug("The title has not been found!")
+
+        return None
+
+
+    def __soups(self):
+        '''
+        Yields the trees to look for the title in, starting with <head>
+        '''
+
+        if self.document.is_parsed and self.document.engine == 'lxml':
+            head = lxml_engine.find_head(self.document.soup)
+        elif self.document.is_parsed:
+            head = self.document.soup.head
+        else:
+            head = self.document.head_soup()
+
+        if head is not None:
+            yield head
+
+        # <head> is missing or malformed
+        yield self.document.soup
+
+
+    def __find_in(self, soup):
+        '''
+        Returns the title in `soup`, None if there is none
+        '''
+
+        if self.document.engine == 'lxml':
+            return lxml_engine.find_title(soup)
+
         meta_tag = 'meta'
         title = 'title'
         property = 'og:title'
         content = 'content'
 
+        # Finding the <meta> tag containing the title
+        meta_found = soup.find(meta_tag, property=property)
 
-        soup = BeautifulSoup(self.html, PARSER)
+        if meta_found is not None and meta_found.get(content) is not None:
+            return meta_found[content]
 
-        try:
-            try:
-                # Finding the <meta> tag containing the title
-                meta_found = soup.find(meta_tag, property=property)
-                # Return the title from the <meta> tag 
-                return f'<h1 class="auto-title">{meta_found[content]}</h1>'
-
-            # If the title is not in a <meta> tag with the property='og:title'
-            except TypeError:
-                meta_found = soup.find(title)
-                return f'<h1 class="auto-title">{meta_found.text}</h1>'
-        except TypeError:
-            print("The title has not been found!")
+        # If the title is not in a <meta> tag with the property='og:title'
+        title_found = soup.find(title)
 
+        if title_found is not None:
+            return title_found.text
 
         return None
 
 
+
+def find_title(html):
+    '''
+    Returns the TITLE of an HTML source code as a string, None if there is no title.
+
+    Lightweight - parses only <head> and needs no ArticleFinder.
+    '''
+
+    return TitleFinder(html).find_text()
+
+
+
 class BodyFinder(BodyTagFinder):
     '''
     Finds the parent tag that holds the body of an article
 
     `formatting_tags_to_skip`   - List - DO NOT skip counting the symbols inside of formatting tags such as - <i>, etc...\n
-    `skip_tags`                 - List - tags to be skipped while counting the symbols inside the tags in the whole HTML\n
+    `skip_tags`                 - Iterable - tags to be skipped while counting the symbols inside the tags in the whole HTML\n
+    `engine`                    - String - 'bs4' or 'lxml', see Document\n
     '''
 
-    def __init__(self, html, formatting_tags_to_skip=None, skip_tags=[]):
-        super().__init__(html, formatting_tags_to_skip, skip_tags)
+    def __init__(self, html, formatting_tags_to_skip=None, skip_tags=(), engine=ENGINE):
+        super().__init__(html, formatting_tags_to_skip, skip_tags, engine)
         self.tag = self.find_body_tag()
-        print(f"TAG::: {self.tag}\n\n")
+        logger.debug("Body tag: %s", self.tag)
 
-        self.soup = BeautifulSoup(html, PARSER)
+        # Number of `self.tag` tags scored by the last `find()`
+        self.candidates_count = 0
 
+        self.soup = self.document.soup
+        self.is_lxml = self.document.engine == 'lxml'
 
-    def find(self):
+
+    def find_container(self, budget=None):
         '''
-        Returns a string of the closest parent tag that has the whole body of the article
+        Returns the closest parent tag that has the whole body of the article, "" if there is none
+
+        `budget` - BudgetTracker - the scoring stops at the limit of candidates, or once the stage is out of time,
+        with the best parent scored so far, see meta_modules/budget.py
         '''
 
-        article_tag = self.__find_best_parent()
+        # The tree flattened once into arrays, which every candidate is scored from
+        self.features = lxml_engine.feature_table(self.soup) if self.is_lxml else build_table(self.soup)
+
+        article_tag = self.__find_best_parent(budget)
 
         # Searching for siblings of the already found article_tag.
         # If the upper siblings of the article tags have the tag with the most symbols
         # and he has the most symbols in the scope of the previously refered sibling
         # the article_tag becomes the parent tag of all of them. 
         try:
+            prev_prev_sibling = self.__prev_prev_sibling(article_tag)
 
-            if article_tag.previous_sibling.previous_sibling:
-                prev_sibl_children_dct = self.__get_child_symbs_dct(article_tag.previous_sibling.previous_sibling)
+            # A string or a comment has no tags inside of it
+            prev_prev_row = self.features.row(prev_prev_sibling)
 
-                if self.tag in prev_sibl_children_dct.keys():
+            if prev_prev_row is not None and self.tag in self.features.name_ids:
+                # The symbols of the `self.tag` tags inside of it, and the most of a single name, from the same batches
+                # that score the candidates
+                (count, symbols), = self.features.symbs((prev_prev_row,), self.features.name_ids[self.tag])
 
-                    if prev_sibl_children_dct[self.tag] == max(prev_sibl_children_dct.values()):
-                        article_tag = article_tag.previous_sibling.parent
+                if count and symbols == self.features.max_symbs((prev_prev_row,))[0]:
+                    article_tag = article_tag.getparent() if self.is_lxml else article_tag.previous_sibling.parent
  
         # For when article_tag.previous_sibling is NoneType
         except (AttributeError, TypeError):
             pass
 
-        body_string = f"{str(article_tag)}"
+        # The container of the body, "" if there is none
+        self.article_tag = article_tag
+
+        return article_tag
+
+
+    def find(self):
+        '''
+        Returns a string of the closest parent tag that has the whole body of the article
+        '''
+
+        body_string = self.document.serialize(self.find_container())
 
         return body_string
 
-    def __find_best_parent(self):
+    def __find_best_parent(self, budget=None):
         '''
         Find sthe the `self.tag` that is having the most symbols within the scope of the parent tag.
 
-        This loops through the whole html, it finds the `self.tag` with maximum symbols, overall.
-        Returns the parent tag.
+        A parent is a candidate when its `self.tag` tags have the most symbols of all names inside of it,
+        and the first candidate with the most symbols is returned.
+        All the parents are scored together from the feature table, one name at a time.
         '''
 
-        max_len = 0;
         article_tag = ""
 
         curr_max = 0
 
-        for tag in self.soup.find_all(self.tag):
-            curr_dct = self.__get_child_symbs_dct(tag.parent)
+        # No tag with symbols was found
+        if self.tag is None:
+            return article_tag
 
-            if curr_dct[tag.name] == max(curr_dct.values()):
-                if curr_dct[tag.name] > curr_max:
-                    curr_max = curr_dct[tag.name]
-                    article_tag = tag.parent
+        features = self.features
+        rows = features.rows_of(self.tag)
 
-        return article_tag
+        # At least one candidate is scored, whatever the time left
+        if budget is not None:
+            rows = rows[:budget.allowed_candidates(len(rows))]
 
+        self.candidates_count += len(rows)
 
-    def __get_tags(self, parent_soup):
-        '''
-        Returns a set of all tags inside of `parent_soup`
-        '''
-        
-        tag_set = set()
+        # The parents, in the order of their first `self.tag` tag
+        parents = list(dict.fromkeys(features.parent[row] for row in rows))
 
-        for tag in parent_soup.find_all():
-            tag_set.add(tag.name)
+        tag_symbs = features.symbs(parents, features.name_ids[self.tag])
+        max_symbs = features.max_symbs(parents)
 
-        return tag_set
+        for parent, (_, symbols), most_symbols in zip(parents, tag_symbs, max_symbs):
 
+            if symbols == most_symbols and symbols > curr_max:
+                curr_max = symbols
+                article_tag = features.nodes[parent]
 
-    def __get_child_symbs_dct(self, parent_soup):
-        '''
-        Returns a dictionary - child of `parent_soup` => symbols
-
-        Surrounding whitespace is not counted as symbols.
-        '''
-
-        tags = self.__get_tags(parent_soup)
-
-        child_symbs_dct = {}
+        return article_tag
 
-        for tag in tags:
-            curr_tags = parent_soup.find_all(tag)
-            symb_count = 0
 
-            for curr_tag in curr_tags:
-                try:
-                    curr_string = curr_tag.text.strip()
-                    symb_count += len(curr_string)
+    def __prev_prev_sibling(self, tag):
+        '''
+        Returns the sibling before the previous sibling of `tag` (a tag or a string), None if there is none
+        '''
 
-                except(AttributeError, TypeError):
-                    pass
+        if self.is_lxml:
+            siblings = lxml_engine.previous_siblings(tag, self.document.merged_strings)
+            next(siblings, None)
 
-            child_symbs_dct[tag] = symb_count
+            return next(siblings, None)
 
-        return child_symbs_dct
+        return tag.previous_sibling.previous_sibling or None
 
 
 
 if __name__ == "__main__":
 
+    import requests as req
+
     url = 'https://www.campograndenews.com.br/economia/petrobras-anuncia-fracasso-na-venda-de-usina-de-fertilizantes-em-ms'
 
     resp = req.get(url)
@@ -0,0 +1,164 @@
+'''
+Module that finds the articles of many HTML documents, in parallel
+'''
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import itertools
+import os
+
+
+
+# The Finder class and its options, set once in each worker process
+_finder_cls = None
+_finder_options = None
+
+
+
+def _init_worker(finder_cls, options):
+    '''
+    Configures the worker process once, instead of sending the options with every document
+    '''
+
+    global _finder_cls, _finder_options
+
+    _finder_cls = finder_cls
+    _finder_options = options
+
+
+
+def _cpu_count():
+    '''
+    Returns the number of CPUs this process is allowed to run on
+    '''
+
+    try:
+        return len(os.sched_getaffinity(0))
+
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+
+def _find_one(index, html, url=None):
+    '''
+    Returns the result of a single document.
+
+    Any exception is returned as an error of this document only,
+    so that a single bad page does not fail the whole batch.
+    '''
+
+    options = _finder_options
+
+    # The URL of the page, for the templates of the sites
+    if url is not None:
+        options = dict(options, url=url)
+
+    try:
+        article = _finder_cls(html=html, **options).find()
+        return {'index': index, 'article': article, 'error': None}
+
+    except Exception as e:
+        return {'index': index, 'article': None, 'error': f"{type(e).__name__}: {e}"}
+
+
+
+class BatchFinder:
+    '''
+    Finds the articles of many HTML documents, using a pool of processes.
+
+    `finder_cls`    - Class - the Finder to be used for each document, e.g. ArticleFinder\n
+    `workers`       - Integer - number of worker processes; default value - the number of available CPUs\n
+    `ordered`       - Boolean - False for getting the results as they are completed; default value - True\n
+    `max_pending`   - Integer - max number of documents sent to the pool, but not yet returned;
+    default value - 4 per worker\n
+    `options`       - the keyword arguments of `finder_cls`, e.g. skip_tags, clean_tags, anchor_text, init_clean
+    '''
+
+    def __init__(self, finder_cls, workers=None, ordered=True, max_pending=None, **options):
+        self.finder_cls = finder_cls
+        self.workers = workers or _cpu_count()
+        self.ordered = ordered
+        self.max_pending = max_pending or 4 * self.workers
+        self.options = options
+
+
+    def find(self, htmls, urls=None):
+        '''
+        Generator of the results, one per document of the iterable `htmls`.
+
+        `urls` - Iterable - the URL of each document, in the order of `htmls`, for the templates
+        and the near-duplicates of the sites; default value - no URLs
+
+        Each result is a dictionary with:
+        `index`     - the position of the document in `htmls`
+        `article`   - the result of `finder_cls.find()`, None if it failed
+        `error`     - the error of the document, None if it succeeded
+
+        Documents are read from `htmls` only when there is room for them in the pool,
+        so the whole iterable is never held in memory.
+        '''
+
+        documents = zip(htmls, itertools.repeat(None) if urls is None else urls)
+
+        with ProcessPoolExecutor(max_workers=self.workers,
+                                 initializer=_init_worker,
+                                 initargs=(self.finder_cls, self.options)) as executor:
+
+            if self.ordered:
+                yield from self.__find_ordered(executor, documents)
+            else:
+                yield from self.__find_unordered(executor, documents)
+
+
+    def __find_ordered(self, executor, documents):
+        '''
+        Yields the results in the order of `documents`, pairs of (html, url)
+        '''
+
+        pending = deque()
+
+        for index, (html, url) in enumerate(documents):
+            pending.append((index, executor.submit(_find_one, index, html, url)))
+
+            if len(pending) >= self.max_pending:
+                yield self.__result(*pending.popleft())
+
+        while pending:
+            yield self.__result(*pending.popleft())
+
+
+    def __find_unordered(self, executor, documents):
+        '''
+        Yields the results of `documents`, pairs of (html, url), as soon as they are completed
+        '''
+
+        pending = {}
+
+        for index, (html, url) in enumerate(documents):
+            pending[executor.submit(_find_one, index, html, url)] = index
+
+            if len(pending) >= self.max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    yield self.__result(pending.pop(future), future)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                yield self.__result(pending.pop(future), future)
+
+
+    @staticmethod
+    def __result(index, future):
+        '''
+        Returns the result of a future, even if its worker process has crashed
+        '''
+
+        try:
+            return future.result()
+
+        except Exception as e:
+            return {'index': index, 'article': None, 'error': f"{type(e).__name__}: {e}"}
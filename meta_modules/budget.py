@@ -0,0 +1,171 @@
+'''
+Module with the resource budget of ArticleFinder.find() - limits on the size of a page, the number of its tags,
+the time of every stage and the candidates scored, so that a pathological page (a 40 MB dump,
+tens of thousands of nested tags) gives a degraded result instead of stalling the whole batch
+'''
+
+import time
+
+
+
+# Stages of ArticleFinder.find() that are skipped once another stage has run out of time
+OPTIONAL_STAGES = ('cleaning',)
+
+# What is done when a limit is hit
+TRUNCATED = 'truncated'     # the source code or the tree is cut to the limit
+STOPPED = 'stopped'         # the stage is stopped, with the best result found so far
+SKIPPED = 'skipped'         # the stage is not run at all
+OVER = 'over'               # the stage cannot be stopped, and went over its time
+
+
+
+class Budget:
+    '''
+    Limits on the resources spent by ArticleFinder.find() on a single page; None for no limit.
+    Set once and shared by all pages (and worker processes), while `tracker()` follows a single page.
+
+    `max_input_size`    - Integer - symbols of the HTML source code; a longer one is cut to it before parsing\n
+    `max_nodes`         - Integer - tags of the tree; the tags after the first `max_nodes`, in document order,
+    are removed right after parsing\n
+    `max_stage_ms`      - Float - wall time of every stage, in milliseconds; the cleaning is stopped between
+    its passes and the scoring of the body between two candidates, and once a stage is out of time,
+    the optional stages after it (`OPTIONAL_STAGES`) are skipped\n
+    `max_candidates`    - Integer - parents scored for the body, at least 1; the best one of them is taken
+    '''
+
+    def __init__(self, max_input_size=None, max_nodes=None, max_stage_ms=None, max_candidates=None):
+        self.max_input_size = max_input_size
+        self.max_nodes = max_nodes
+        self.max_stage_ms = max_stage_ms
+        self.max_candidates = max_candidates
+
+
+    def tracker(self):
+        '''
+        Returns a new BudgetTracker, for a single page
+        '''
+
+        return BudgetTracker(self)
+
+
+    def __repr__(self):
+        return (f"Budget(max_input_size={self.max_input_size}, max_nodes={self.max_nodes}, "
+                f"max_stage_ms={self.max_stage_ms}, max_candidates={self.max_candidates})")
+
+
+
+class BudgetTracker:
+    '''
+    Follows the budget of a single page - the stage being run, its deadline,
+    and every limit that was hit, with what was done about it.
+
+    `budget` - Budget - the limits
+    '''
+
+    def __init__(self, budget):
+        self.budget = budget
+
+        # {'limit': ..., 'stage': ..., 'action': ...} of every limit hit, in order
+        self.exceeded = []
+
+        self.stage = None
+        self.__deadline = None
+        # Stages that were found out of time
+        self.__late_stages = set()
+
+
+    @property
+    def degraded(self):
+        '''
+        True if any limit was hit, so the result might not be the one found without the budget
+        '''
+
+        return bool(self.exceeded)
+
+
+    def start(self, stage):
+        '''
+        Starts the clock of `stage`
+        '''
+
+        self.stage = stage
+
+        if self.budget.max_stage_ms is not None:
+            self.__deadline = time.perf_counter() + self.budget.max_stage_ms / 1000
+
+
+    def stop(self, stage, wall_ms):
+        '''
+        Ends `stage`, which took `wall_ms` milliseconds, noting it if it went over its time without being stopped
+        '''
+
+        max_stage_ms = self.budget.max_stage_ms
+
+        if max_stage_ms is not None and wall_ms > max_stage_ms and stage not in self.__late_stages:
+            self.__late_stages.add(stage)
+            self.hit('max_stage_ms', OVER, stage)
+
+        self.stage = None
+        self.__deadline = None
+
+
+    def out_of_time(self):
+        '''
+        Returns True if the current stage has run out of time, which the stage stops at
+        '''
+
+        if self.__deadline is None or time.perf_counter() <= self.__deadline:
+            return False
+
+        if self.stage not in self.__late_stages:
+            self.__late_stages.add(self.stage)
+            self.hit('max_stage_ms', STOPPED)
+
+        return True
+
+
+    def allowed_candidates(self, candidates_count):
+        '''
+        Returns how many of `candidates_count` candidates can be scored - all of them, `max_candidates`,
+        or only the first one once the stage is out of time
+        '''
+
+        max_candidates = self.budget.max_candidates
+
+        if max_candidates is not None and candidates_count > max(max_candidates, 1):
+            self.hit('max_candidates', STOPPED)
+            candidates_count = max(max_candidates, 1)
+
+        if candidates_count > 1 and self.out_of_time():
+            return 1
+
+        return candidates_count
+
+
+    def skips(self, stage):
+        '''
+        Returns True if `stage` is to be skipped, as an optional stage after another one ran out of time
+        '''
+
+        if stage not in OPTIONAL_STAGES or not self.__late_stages:
+            return False
+
+        self.hit('max_stage_ms', SKIPPED, stage)
+
+        return True
+
+
+    def hit(self, limit, action, stage=None):
+        '''
+        Notes that `limit` was hit in `stage` (by default, the current one) and what was done about it
+        '''
+
+        self.exceeded.append({'limit': limit, 'stage': stage or self.stage, 'action': action})
+
+
+    def report(self):
+        '''
+        Returns the outcome of the budget, added to the result - {'degraded': ..., 'exceeded': [...]}
+        '''
+
+        return {'degraded': self.degraded, 'exceeded': list(self.exceeded)}
@@ -0,0 +1,223 @@
+'''
+Module with the cache of the extraction results - keyed by the hash of the HTML and the options
+'''
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+
+
+
+# Changed whenever the results of the same HTML and options change, so old results are not read
+CACHE_VERSION = 2
+
+# Options of ArticleFinder that change its result
+CACHE_OPTIONS = (
+        'skip_tags',
+        'clean_tags',
+        'anchor_text',
+        'init_clean',
+        'keep_tags',
+        'output',
+)
+
+# Default size of the in-memory tier, in symbols of the serialized results
+CACHE_MAX_SIZE = 64 * 1024 * 1024
+
+
+
+def cache_key(html, options):
+    '''
+    Returns the key of an HTML source code and the options it is extracted with
+
+    `html`      - String - the HTML source code\n
+    `options`   - Dictionary - option => value, only the ones in `CACHE_OPTIONS` are used
+    '''
+
+    key_options = {}
+
+    for option in CACHE_OPTIONS:
+        value = options.get(option)
+
+        # The order of the tags does not change the result
+        if value is not None and not isinstance(value, (bool, str)):
+            value = sorted(value)
+
+        key_options[option] = value
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([CACHE_VERSION, key_options], sort_keys=True).encode('utf-8'))
+    digest.update(html.encode('utf-8', 'surrogatepass'))
+
+    return digest.hexdigest()
+
+
+
+class ResultCache:
+    '''
+    Cache of the results of ArticleFinder.find(), with two tiers:
+    - in memory - least recently used results are evicted once their size is over `max_size`
+    - on disk (optional) - an SQLite database, which can be shared by many processes and kept between runs
+
+    The results are kept serialized, so a result given by `get()` can be changed freely.
+    It can be shared by many threads, which use it one at a time.
+
+    `max_size`  - Integer - max size of the in-memory tier, in symbols of the serialized results\n
+    `path`      - String - the SQLite database of the on-disk tier; None for no on-disk tier
+    '''
+
+    def __init__(self, max_size=CACHE_MAX_SIZE, path=None):
+        self.max_size = max_size
+        self.path = path
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # key => serialized result
+        self.__memory = OrderedDict()
+        self.__memory_size = 0
+        self.__connection = None
+        self.__connection_pid = None
+        self.__lock = threading.Lock()
+
+
+    def get(self, key):
+        '''
+        Returns the result of `key`, None if it is not cached
+        '''
+
+        with self.__lock:
+            value = self.__memory.get(key)
+
+            if value is not None:
+                self.__memory.move_to_end(key)
+
+            elif self.path is not None:
+                row = self.__db().execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+
+                if row is not None:
+                    value = row[0]
+                    self.disk_hits += 1
+                    self.__remember(key, value)
+
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+        return json.loads(value)
+
+
+    def put(self, key, result):
+        '''
+        Caches `result`, in both tiers
+        '''
+
+        value = json.dumps(result, ensure_ascii=False)
+
+        with self.__lock:
+            self.__remember(key, value)
+
+            if self.path is not None:
+                db = self.__db()
+
+                with db:
+                    db.execute('INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)', (key, value))
+
+
+    def stats(self):
+        '''
+        Returns a dictionary with the counters of the cache
+        '''
+
+        with self.__lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self.__memory),
+                'size': self.__memory_size,
+            }
+
+
+    def clear(self):
+        '''
+        Removes every result, from both tiers
+        '''
+
+        with self.__lock:
+            self.__memory.clear()
+            self.__memory_size = 0
+
+            if self.path is not None:
+                db = self.__db()
+
+                with db:
+                    db.execute('DELETE FROM results')
+
+
+    def __remember(self, key, value):
+        '''
+        Adds a serialized result to the in-memory tier, evicting the least recently used ones
+        '''
+
+        # Too big to be cached at all
+        if len(value) > self.max_size:
+            return
+
+        old_value = self.__memory.pop(key, None)
+
+        if old_value is not None:
+            self.__memory_size -= len(old_value)
+
+        self.__memory[key] = value
+        self.__memory_size += len(value)
+
+        while self.__memory_size > self.max_size:
+            _, evicted = self.__memory.popitem(last=False)
+            self.__memory_size -= len(evicted)
+
+
+    def __db(self):
+        '''
+        Returns the connection to the on-disk tier, opened once in each process
+        and used by its threads under the lock
+        '''
+
+        if self.__connection is None or self.__connection_pid != os.getpid():
+            # Imported only when needed, most caches have no on-disk tier
+            import sqlite3
+
+            self.__connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.__connection_pid = os.getpid()
+
+            # Many processes can read while one of them writes
+            self.__connection.execute('PRAGMA journal_mode=WAL')
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT)')
+
+        return self.__connection
+
+
+    def __getstate__(self):
+        '''
+        Sent to other processes (e.g. the workers of `ArticleFinder.find_many()`) without
+        the lock, the connection and the in-memory tier - each process opens its own connection
+        '''
+
+        state = self.__dict__.copy()
+        state['_ResultCache__memory'] = OrderedDict()
+        state['_ResultCache__memory_size'] = 0
+        state['_ResultCache__connection'] = None
+        state['_ResultCache__connection_pid'] = None
+        del state['_ResultCache__lock']
+
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
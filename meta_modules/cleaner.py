@@ -1,15 +1,72 @@
+import csv
 import os
 import sys
 import re
 
-import requests
-import math
-
-from bs4 import BeautifulSoup
-import pandas as pd
-import numpy as np
+from bs4 import Comment
+from bs4.element import PreformattedString, Tag
 
 from meta_modules.constants import *
+from meta_modules.document import Document
+from meta_modules import lxml_engine
+
+
+# Frozenset of the tags to be kept, shared by all Cleaners of the process
+_keep_tags = None
+
+
+
+def load_keep_tags(csv_path=CSV_PATH):
+    '''
+    Returns a frozenset of the tags that will NOT be removed, read from the CSV file in the data/ directory.
+    The tags are filtered by the percentage regarding each tag.
+    '''
+
+    keep_tags = set()
+
+    with open(csv_path, newline='', encoding='utf-8') as f:
+
+        for row in csv.DictReader(f):
+
+            try:
+                if int(row["Percent"]) == KEEP_TAG:
+                    keep_tags.add(row["Tag"])
+
+            # Skipping the empty rows
+            except (TypeError, ValueError):
+                pass
+
+    return frozenset(keep_tags)
+
+
+
+def get_keep_tags():
+    '''
+    Returns the frozenset of the tags to be kept.
+
+    The CSV file is read only on the first call, then the same frozenset is returned.
+    '''
+
+    global _keep_tags
+
+    if _keep_tags is None:
+        _keep_tags = load_keep_tags()
+
+    return _keep_tags
+
+
+
+def set_keep_tags(tags):
+    '''
+    Overrides the tags to be kept, for all Cleaners created afterwards.
+    Use `set_keep_tags(load_keep_tags(csv_path))` for another CSV file.
+    Passing None makes the next Cleaner read the default CSV file again.
+    '''
+
+    global _keep_tags
+
+    _keep_tags = frozenset(tags) if tags is not None else None
+
 
 
 class Cleaner:
@@ -17,13 +74,27 @@ class Cleaner:
     # Not removing these tags because they are parents of every tag
     tags_not_to_remove = ["body", "head", "html"]
 
+    # Text without any word characters (whitespace, punctuation) leaves a tag empty.
+    # `&`, `<` and `>` are escaped with letters in the HTML, so they are not empty
+    re_not_empty = re.compile(r"[\w&<>]")
+
 
-    def __init__(self, src):
-        self.init_src = src
+    def __init__(self, src, keep_tags=None, engine=ENGINE):
+        '''
+        `src`       - String or Document - the HTML source code, or an already parsed Document,
+        whose tree is cleaned in place\n
+        `keep_tags` - Iterable - the tags to be kept, instead of the ones from `get_keep_tags()`\n
+        `engine`    - String - 'bs4' or 'lxml', the engine of the tree of `src` (see Document)
+        '''
+
+        self.keep_tags = keep_tags
 
+        self.document = Document.of(src, engine)
+        self.init_src = self.document.html
 
-        # Creating the BeautifulSoup Object
-        self.soup = BeautifulSoup(self.init_src, PARSER)
+        # Using the already built tree
+        self.soup = self.document.soup
+        self.is_lxml = self.document.engine == 'lxml'
 
         # Creating the variable self.tags
         self.__get_tags()
@@ -41,6 +112,10 @@ class Cleaner:
         Creates a list with unique values - tags of the source code 
         '''
 
+        if self.is_lxml:
+            self.tags = list(lxml_engine.tag_names(self.soup).difference(self.tags_not_to_remove))
+            return
+
         self.tags = []
 
         for tag in self.soup.find_all():
@@ -55,63 +130,62 @@ class Cleaner:
 
     def __csv_tags_stats(self):
         '''
-        Creates a DataFrame out of the Excel file in the data/ directory.
-        Then filters out tags that will NOT be removed, by the percentage regarding each tag. 
+        Gets the frozenset of the tags that will NOT be removed.
+        The CSV file is read once per process, see `get_keep_tags()`.
         '''
 
-        # Filtering the tags by percentage
-        # Ordering the tags from the CSV file in descending order
-        df = pd.read_csv(CSV_PATH, error_bad_lines=False)
-        df = df[df["Percent"] == KEEP_TAG].sort_values(by=["Percent"],
-                                                              ascending=False)
-
-        # Making a list out of all remaining tags
-        np.asarray(df)
-        df = np.transpose(df["Tag"])
-        
-        self.csv_tags = list(df)
+        if self.keep_tags is not None:
+            self.csv_tags = frozenset(self.keep_tags)
+        else:
+            self.csv_tags = get_keep_tags()
 
 
 
     def __clean_comments(self):
         '''
-        Removes the comments off the HTML
+        Removes the comments off the HTML, straight from the tree
         '''
 
-        re_comments = r"<!\-\-[^~]+?\-\->";
-
-        curr_html = str(self.soup)
-
-        new_html = re.sub(pattern=re_comments,
-                          repl='',
-                          string=curr_html,
-                          flags=re.MULTILINE)
+        if self.is_lxml:
+            lxml_engine.clean_comments(self.soup, self.document.merged_strings)
+            return
 
-        self.soup = BeautifulSoup(new_html, PARSER)
+        for comment in self.soup.find_all(string=lambda string: isinstance(string, Comment)):
+            comment.extract()
 
 
 
     def __clean_empty_tags(self):
         '''
-        Removes empty tag, recursively, not in the sense of actually using recursion,
-        but as a way of solution design.
+        Removes empty tags, recursively, with a single post-order pass over the tree.
+
+        The children of a tag are cleaned before the tag itself, so a tag whose
+        children were all empty gets removed as well.
+        Self-closing tags, such as <br/> and <img/>, are never empty.
         '''
 
-        curr_string = str(self.soup)
+        if self.is_lxml:
+            nodes_count, removed_count = lxml_engine.clean_empty_tags(self.soup,
+                                                                      self.document.merged_strings,
+                                                                      self.re_not_empty)
+            self.nodes_count += nodes_count
+            self.removed_count += removed_count
+            return
 
-        re_empty_tags = r"<([^>]+)(?:[^>]+)?>[\W]*?<\/\1>"
+        stack = [(self.soup, False)]
 
-        prev_string = ''
+        while stack:
+            tag, visited = stack.pop()
 
-        while prev_string != curr_string:
-            prev_string = curr_string
-            
-            curr_string = re.sub(pattern=re_empty_tags,
-                                 repl='',
-                                 string=curr_string,
-                                 flags=re.MULTILINE)
-        
-        self.soup = BeautifulSoup(curr_string, PARSER)
+            if not visited:
+                self.nodes_count += 1
+                stack.append((tag, True))
+                stack.extend((child, False) for child in tag.contents if isinstance(child, Tag))
+                continue
+
+            if tag is not self.soup and _is_empty(tag):
+                self.removed_count += 1
+                tag.decompose()
 
 
 
@@ -130,16 +204,40 @@ class Cleaner:
 
 
 
-    def __clean_additional(self, tags):
+    def __clean_tags(self, tags_to_rem):
         '''
-        Cleans tags that are not in the list of the ones to be deleted.
+        Removes the tags in `tags_to_rem` (along with everything inside of them),
+        with a single pass over the tree.
         '''
 
-        for tag in tags:
+        if self.is_lxml:
+            found_tags = lxml_engine.clean_tags(self.soup, tags_to_rem, self.document.merged_strings)
+            self.removed_count += len(found_tags)
+            self.deleted_tags.update(tag.tag for tag in found_tags)
+            return
+
+        found_tags = []
+        stack = [self.soup]
+
+        while stack:
+            tag = stack.pop()
+
+            for child in tag.contents:
+
+                if not isinstance(child, Tag):
+                    continue
 
-            for curr_tag in self.soup.find_all(tag):
-                self.deleted_tags.add(curr_tag.name)
-                curr_tag.decompose()
+                # Not going inside of a tag that is removed anyway
+                if child.name in tags_to_rem:
+                    found_tags.append(child)
+                else:
+                    stack.append(child)
+
+        self.removed_count += len(found_tags)
+
+        for tag in found_tags:
+            self.deleted_tags.add(tag.name)
+            tag.decompose()
 
 
 
@@ -149,33 +247,43 @@ class Cleaner:
         '''
 
         with open(f"{filename}.{ext}", "w", encoding="utf-8") as f:
-            soup_str = str(self.soup)
+            soup_str = str(self.document)
             f.write(soup_str)
 
 
 
-    def clean(self, additional_tags=None, skip_tags=[]):
+    def clean(self, additional_tags=None, skip_tags=(), budget=None):
         '''
         Removes all unneeded tags.
+
+        Works on the tree in place, with one pass for each of: the unneeded tags,
+        the comments and the empty tags.
+
+        `budget` - BudgetTracker - the passes left are skipped once the stage is out of time,
+        see meta_modules/budget.py
         '''
 
         self.deleted_tags = set()
+        # Tags gone over by the empty tags pass and tags removed, for the instrumentation
+        self.nodes_count = 0
+        self.removed_count = 0
 
-        for tag in self.tags:
-
-            if tag not in skip_tags:
+        tags_to_rem = set(self.tags).difference(self.common_tags, skip_tags)
 
-                if tag not in self.common_tags:
-                    
-                    for curr_tag in self.soup.find_all(tag):
-                        self.deleted_tags.add(curr_tag.name)
-                        curr_tag.decompose()
-            
         if additional_tags:
-            self.__clean_additional(additional_tags)
-        
+            # Cleaning tags that are not in the list of the ones to be deleted
+            tags_to_rem.update(additional_tags)
+
+        self.__clean_tags(tags_to_rem)
+
+        if budget is not None and budget.out_of_time():
+            return self
+
         self.__clean_comments()
-        
+
+        if budget is not None and budget.out_of_time():
+            return self
+
         self.__clean_empty_tags()
 
 
@@ -193,7 +301,7 @@ class Cleaner:
 
         self.minified = re.sub(pattern=pattern,
                                repl="><",
-                               string=str(self.soup),
+                               string=str(self.document),
                                flags=re.MULTILINE)
 
         return self
@@ -211,15 +319,97 @@ class Cleaner:
 
     def __str__(self):
 
-        return str(self.soup)
+        return str(self.document)
+
+
+
+def clean_body(document, node, keep_tags=None, additional_tags=None, unwrap_tags=()):
+    '''
+    Cleans `node`, the body found in `document`, in place, the way Cleaner.clean() cleans the whole tree -
+    but with a single post-order pass over the tags inside of `node`, that also unwraps the tags in `unwrap_tags`
+    (keeping what is inside of them). Returns False if `node` itself would be removed, which is left to the caller.
+
+    `keep_tags`         - Iterable - the tags to be kept, instead of the ones from `get_keep_tags()`\n
+    `additional_tags`   - Iterable - tags to be removed even if they are kept\n
+    `unwrap_tags`       - Iterable - tags to be unwrapped, even if they are removed
+    '''
+
+    keep_tags = frozenset(keep_tags) if keep_tags is not None else get_keep_tags()
+    keep_tags = keep_tags.union(Cleaner.tags_not_to_remove)
+    tags_to_rem = frozenset(additional_tags or ())
+    unwrap_tags = frozenset(unwrap_tags)
+
+    if document.engine == 'lxml':
+        return lxml_engine.clean_body(node, keep_tags, tags_to_rem, unwrap_tags,
+                                      document.merged_strings, Cleaner.re_not_empty)
+
+    stack = [(node, False)]
 
+    while stack:
+        tag, visited = stack.pop()
 
+        if not visited:
+            stack.append((tag, True))
 
+            for child in list(tag.contents):
+
+                if isinstance(child, Comment):
+                    child.extract()
+
+                elif not isinstance(child, Tag):
+                    continue
+
+                elif child.name in unwrap_tags:
+                    stack.append((child, False))
+
+                # Not going inside of a tag that is removed anyway
+                elif child.name in tags_to_rem or child.name not in keep_tags:
+                    child.decompose()
+
+                else:
+                    stack.append((child, False))
+
+            continue
+
+        if tag is node:
+            continue
+
+        if tag.name in unwrap_tags:
+            tag.unwrap()
+
+        elif _is_empty(tag):
+            tag.decompose()
+
+    name = node.name
+
+    return name in unwrap_tags or not (name in tags_to_rem or name not in keep_tags or _is_empty(node))
+
+
+
+def _is_empty(tag):
+    '''
+    Returns True if `tag` has no child tags and no text with word characters in it
+    '''
+
+    if tag.is_empty_element:
+        return False
+
+    for child in tag.contents:
+
+        if isinstance(child, (Tag, PreformattedString)):
+            return False
+
+        if Cleaner.re_not_empty.search(child):
+            return False
+
+    return True
 
 
 
 if __name__ == "__main__":
 
+    import requests
+
     # Getting the first argument off the console
     url = sys.argv[1]
 
@@ -234,4 +424,3 @@ if __name__ == "__main__":
     cleaner.minify()
 
     cleaner.save_source()
-    
\ No newline at end of file
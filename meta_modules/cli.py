@@ -0,0 +1,248 @@
+'''
+Command line bulk extractor - finds the articles of a corpus (directories, JSONL or WARC files)
+and writes one JSON result per line
+
+Usage:
+    find-article INPUT [INPUT ...] [-o results.jsonl] [--workers 4] [--fields title,body,date]
+                 [--checkpoint results.checkpoint] [--checkpoint-every 100] [--engine lxml]
+                 [--max-input-size N] [--max-nodes N] [--max-stage-ms MS] [--max-candidates N]
+                 [--dedup dedup.sqlite]
+
+`find-article` is installed along with the package (see setup.py), `python -m meta_modules.cli` runs it without it.
+
+Every result has the `id` of its record, and the chosen `--fields` of:
+url, title, body, date, timings, budget, dedup, error
+'''
+
+import argparse
+from collections import deque
+import itertools
+import json
+import os
+import sys
+
+from meta_modules.budget import Budget
+from meta_modules.constants import ENGINE, ENGINES
+from meta_modules.corpus import iter_mapped
+from meta_modules.fingerprint import DedupIndex
+
+
+
+# Fields of a result, written by default
+FIELDS = ('url', 'title', 'body', 'date', 'timings', 'budget', 'dedup', 'error')
+
+# Results written between two checkpoints
+CHECKPOINT_EVERY = 100
+
+
+
+def find_articles(records, workers=None, **options):
+    '''
+    Generator of (record, article, error), in the order of `records`.
+
+    With more than one worker, the records are sent to a pool of processes (see `ArticleFinder.find_many()`),
+    and only the records being processed are held in memory.
+    '''
+
+    from find_article import ArticleFinder
+
+    if workers == 1:
+
+        for record in records:
+
+            try:
+                yield record, ArticleFinder(html=record['html'], url=record['url'], **options).find(), None
+
+            except Exception as e:
+                yield record, None, f"{type(e).__name__}: {e}"
+
+        return
+
+    # The records sent to the pool, but without a result yet
+    pending = deque()
+
+    # The URLs are read along with the HTML of each record, so only the record being sent is held twice
+    records, url_records = itertools.tee(records)
+    urls = (record['url'] for record in url_records)
+
+    def htmls():
+        for record in records:
+            pending.append(record)
+            yield record['html']
+
+    for result in ArticleFinder.find_many(htmls(), workers=workers, ordered=True, urls=urls, **options):
+        record = pending.popleft()
+        yield record, result['article'], result['error']
+
+
+
+def to_line(record, article, error, fields):
+    '''
+    Returns the JSON line of the result of a record
+    '''
+
+    # ArticleFinder.find() returns a message instead of a dictionary when it fails
+    if article is not None and not isinstance(article, dict):
+        error = error or article
+        article = None
+
+    article = article or {}
+
+    values = {
+        'url': record['url'],
+        'title': article.get('title'),
+        'body': article.get('body'),
+        'date': article.get('date'),
+        'timings': article.get('timings'),
+        'budget': article.get('budget'),
+        'dedup': article.get('dedup'),
+        'error': error,
+    }
+
+    line = {'id': record['id']}
+    line.update((field, values[field]) for field in fields)
+
+    return json.dumps(line, ensure_ascii=False) + '\n'
+
+
+
+def load_checkpoint(path, inputs):
+    '''
+    Returns the checkpoint of a previous run with the same inputs - {'inputs', 'done', 'position', 'output_size'},
+    None if there is none
+    '''
+
+    if not path or not os.path.exists(path):
+        return None
+
+    with open(path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+
+    if checkpoint['inputs'] != inputs:
+        raise ValueError(f"The checkpoint {path} is of other inputs: {checkpoint['inputs']}")
+
+    return checkpoint
+
+
+
+def save_checkpoint(path, inputs, done, position, output_size):
+    '''
+    Saves the number of records done, the `position` of the last one (its input, and the file and the byte offset
+    in it that the run resumes from, see corpus.iter_records()) and the size of the output at that point,
+    replacing the file atomically
+    '''
+
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'inputs': inputs, 'done': done, 'position': position, 'output_size': output_size}, f)
+
+    os.replace(tmp_path, path)
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='find-article',
+                                     description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='directories of HTML files, .jsonl(.gz) or .warc(.gz) files')
+    parser.add_argument('-o', '--output', help='the JSONL file of the results; default - stdout')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes; default - the number of CPUs')
+    parser.add_argument('--fields', default=','.join(FIELDS), help=f"fields of the results, of: {', '.join(FIELDS)}")
+    parser.add_argument('--checkpoint', help='file with the progress, the run is resumed from it if it exists')
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY, help='results between checkpoints')
+    parser.add_argument('--body', choices=('html', 'text', 'spans'), default='html',
+                        help='the body as HTML, plain text or [start, end] in the page')
+    parser.add_argument('--no-anchor-text', action='store_true', help='keep the <a> tags in the body')
+    parser.add_argument('--no-init-clean', action='store_true', help='do not clean the page before finding the body')
+    parser.add_argument('--engine', choices=ENGINES, default=ENGINE, help='the parser that builds the tree of the pages')
+    parser.add_argument('--max-input-size', type=int, help='symbols of a page, a longer one is cut before parsing')
+    parser.add_argument('--max-nodes', type=int, help='tags of a page, the ones after them are removed')
+    parser.add_argument('--max-stage-ms', type=float, help='wall time of every stage of a page, in milliseconds')
+    parser.add_argument('--max-candidates', type=int, help='parents scored for the body of a page')
+    parser.add_argument('--dedup', help='SQLite index of the near-duplicates, shared by the workers and kept between runs; '
+                                        'the result of a near-duplicate of an earlier page is reused')
+    args = parser.parse_args(argv)
+
+    fields = [field.strip() for field in args.fields.split(',') if field.strip()]
+    unknown_fields = set(fields).difference(FIELDS)
+
+    if unknown_fields:
+        parser.error(f"unknown fields: {', '.join(sorted(unknown_fields))}")
+
+    if args.engine == 'lxml' and args.body == 'spans':
+        parser.error("--body spans needs --engine bs4")
+
+    if args.checkpoint and not args.output:
+        parser.error("--checkpoint needs --output")
+
+    inputs = [os.path.abspath(path) for path in args.inputs]
+
+    try:
+        checkpoint = load_checkpoint(args.checkpoint, inputs)
+
+    except ValueError as e:
+        parser.error(str(e))
+
+    done = 0
+    # The input, file and byte offset in it after the last record done
+    position = None
+
+    if args.output:
+        output = open(args.output, 'a+' if checkpoint else 'w', encoding='utf-8', newline='\n')
+
+        # Dropping what was written after the last checkpoint, as those records are done again
+        if checkpoint:
+            done = checkpoint['done']
+            position = checkpoint['position'] and tuple(checkpoint['position'])
+            output.seek(checkpoint['output_size'])
+            output.truncate()
+    else:
+        output = sys.stdout
+
+    # Resuming right after the last record done, the records before it are not read again
+    records = iter_mapped(inputs, start=position)
+
+    limits = (args.max_input_size, args.max_nodes, args.max_stage_ms, args.max_candidates)
+    budget = Budget(*limits) if any(limit is not None for limit in limits) else None
+    dedup = DedupIndex(path=args.dedup) if args.dedup else None
+
+    try:
+        results = find_articles(records,
+                                workers=args.workers,
+                                anchor_text=not args.no_anchor_text,
+                                init_clean=not args.no_init_clean,
+                                output=args.body,
+                                engine=args.engine,
+                                budget=budget,
+                                dedup=dedup,
+                                timings='timings' in fields)
+
+        for record, article, error in results:
+            output.write(to_line(record, article, error, fields))
+            done += 1
+            position = record['position']
+
+            if args.checkpoint and done % args.checkpoint_every == 0:
+                output.flush()
+                save_checkpoint(args.checkpoint, inputs, done, position, output.tell())
+
+        if args.checkpoint:
+            output.flush()
+            save_checkpoint(args.checkpoint, inputs, done, position, output.tell())
+
+    # The reader of stdout has stopped, e.g. `| head`
+    except BrokenPipeError:
+        sys.stdout = open(os.devnull, 'w')
+
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    return 0
+
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
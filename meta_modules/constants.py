@@ -6,8 +6,16 @@ import os
 HOME_PATH = os.path.dirname(os.path.abspath(__file__))
 
 PARSER = 'lxml'
+
+# Engines building the tree of a Document - BeautifulSoup, or lxml alone (see meta_modules/lxml_engine.py)
+ENGINES = ('bs4', 'lxml')
+ENGINE = 'bs4'
+
 KEEP_TAG = 1
 
+# Size of the chunks read from a file-like object, when streaming the HTML
+STREAM_CHUNK_SIZE = 64 * 1024
+
 # Creating the Absolute Paths
 CSV_PATH = os.path.join('data', 'tags_percent.csv')
 CSV_PATH = os.path.join(HOME_PATH, CSV_PATH)
@@ -15,6 +23,9 @@ CSV_PATH = os.path.join(HOME_PATH, CSV_PATH)
 LOG_DIR = os.path.join('output', 'log.log')
 LOG_DIR = os.path.join(HOME_PATH, LOG_DIR)
 
+# Name of the logger of all diagnostics
+LOGGER_NAME = 'article_finder'
+
 FORMATTING_TAGS = (
         'b',
         'strong',
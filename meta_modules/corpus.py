@@ -0,0 +1,538 @@
+'''
+Module that reads the HTML pages of a corpus - a directory tree, JSONL files of {url, html} records
+or WARC/WARC.gz crawl archives - one record at a time
+'''
+
+from collections import OrderedDict
+import gzip
+import json
+import mmap
+import os
+import zlib
+
+
+
+# Extensions of the HTML files of a directory tree
+HTML_EXTENSIONS = ('.html', '.htm')
+
+# Encoding of the pages that do not declare one
+DEFAULT_ENCODING = 'utf-8'
+
+# Max number of files kept mapped by each process
+MAX_MAPPED_FILES = 64
+
+# Path => mmap of the files mapped by this process, the least recently used first
+_maps = OrderedDict()
+
+
+
+class MappedSlice:
+    '''
+    A part of a memory-mapped file - an HTML page in it, read without copying it.
+
+    Only the path and the position are pickled, so sending it to a worker process costs nothing;
+    the worker maps the file itself, and all processes share the same pages of the OS page cache.
+    Accepted as the `html` of ArticleFinder, Cleaner and the other Finders.
+
+    `path`      - String - the file\n
+    `offset`    - Integer - the first byte of the page\n
+    `length`    - Integer - the number of bytes of the page\n
+    `encoding`  - String - the encoding of the page; None for the one declared in the HTML, or utf-8
+    '''
+
+    __slots__ = ('path', 'offset', 'length', 'encoding')
+
+
+    def __init__(self, path, offset, length, encoding=None):
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.encoding = encoding
+
+
+    def view(self):
+        '''
+        Returns a memoryview of the page, in the memory-mapped file
+        '''
+
+        if self.length == 0:
+            return memoryview(b'')
+
+        return memoryview(map_file(self.path))[self.offset:self.offset + self.length]
+
+
+    def __getstate__(self):
+        return (self.path, self.offset, self.length, self.encoding)
+
+
+    def __setstate__(self, state):
+        self.path, self.offset, self.length, self.encoding = state
+
+
+    def __repr__(self):
+        return f"MappedSlice({self.path!r}, {self.offset}, {self.length})"
+
+
+
+def map_file(path):
+    '''
+    Returns the read-only mmap of `path`, kept mapped while it is one of the last `MAX_MAPPED_FILES` files used.
+
+    Each mmap holds a file descriptor, so a directory of many small files would run out of them.
+    A file dropped from the cache is unmapped, and its descriptor closed, as soon as nothing uses it anymore
+    (a page being decoded, a WARC file being read), so it is not closed here.
+    '''
+
+    mapped = _maps.get(path)
+
+    if mapped is not None:
+        _maps.move_to_end(path)
+        return mapped
+
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    _maps[path] = mapped
+
+    while len(_maps) > MAX_MAPPED_FILES:
+        _maps.popitem(last=False)
+
+    return mapped
+
+
+
+def iter_records(paths, start=None):
+    '''
+    Generator of the records of every path in `paths`, in order.
+
+    A record is a dictionary - {'id': ..., 'url': ..., 'html': ..., 'position': ...}, where `id` is unique
+    in the corpus, `url` is None if it is not known, and `position` is (index of its input in `paths`,
+    path of its file, byte offset right after it) - the `start` that the records after it are read from.
+    Only a single record is held in memory at a time, whatever the size of the corpus.
+
+    `start` - Tuple - the `position` of a record, the reading resumes right after it: the inputs before its input
+    are skipped, and its file is read from its offset on (a directory from the file after it), without reading
+    the records before it again. A compressed file is still decompressed up to the offset.
+    '''
+
+    for index, path, path_start in _inputs_from(paths, start):
+        yield from _positioned(index, _iter_input(path, path_start))
+
+
+
+def iter_mapped(paths, start=None):
+    '''
+    Generator of the records of every path in `paths`, in order, the same as `iter_records()`,
+    but with the `html` of the records of HTML files and uncompressed WARC files as a MappedSlice,
+    so the pages are never read into the memory of this process.
+
+    Compressed files, JSONL files and WARC records whose payload is encoded (chunked, gzip)
+    cannot be mapped, so they are read as by `iter_records()`.
+
+    `start` - Tuple - the `position` of a record, the reading resumes right after it, see `iter_records()`
+    '''
+
+    for index, path, path_start in _inputs_from(paths, start):
+        yield from _positioned(index, _iter_mapped_input(path, path_start))
+
+
+
+def _iter_input(path, start=None):
+    '''
+    Generator of the records of a single input, after `start` - (path, byte offset) of a record in it
+    '''
+
+    if os.path.isdir(path):
+        yield from iter_directory(path, start)
+
+    elif path.endswith(('.jsonl', '.jsonl.gz')):
+        yield from iter_jsonl(path, start)
+
+    elif path.endswith(('.warc', '.warc.gz')):
+        yield from iter_warc(path, start)
+
+    elif path.endswith(HTML_EXTENSIONS):
+
+        # A single file is a single record, done if it is the start
+        if start is None:
+            yield _file_record(path, path)
+
+    else:
+        raise ValueError(f"Unknown type of input: {path}")
+
+
+
+def _iter_mapped_input(path, start=None):
+    '''
+    Generator of the records of a single input, after `start`, with the pages mapped when they can be
+    '''
+
+    if os.path.isdir(path):
+
+        for file_path, record_id in _iter_html_files(path, start):
+            yield _mapped_file_record(file_path, record_id)
+
+    elif path.endswith('.warc'):
+        yield from _iter_mapped_warc(path, start)
+
+    elif path.endswith(HTML_EXTENSIONS):
+
+        if start is None:
+            yield _mapped_file_record(path, path)
+
+    else:
+        yield from _iter_input(path, start)
+
+
+
+def _inputs_from(paths, start):
+    '''
+    Returns a list of (index, path, its start) of the inputs of `paths` that are read to resume after `start`
+    (see `iter_records()`) - from the input of `start`, the start of the others being None
+    '''
+
+    if start is None:
+        return [(index, path, None) for index, path in enumerate(paths)]
+
+    index = start[0]
+    following = [(i, path, None) for i, path in enumerate(paths[index + 1:], index + 1)]
+
+    return [(index, paths[index], tuple(start[1:]))] + following
+
+
+
+def _positioned(index, records):
+    '''
+    Generator of `records` of the input at `index`, with the index put in front of their `position`
+    '''
+
+    for record in records:
+        record['position'] = (index, *record['position'])
+        yield record
+
+
+
+def iter_directory(path, start=None):
+    '''
+    Generator of the records of the HTML files in the directory tree `path`, in alphabetical order,
+    after the file of `start` - (path, byte offset) of a record in it - if it is given
+    '''
+
+    for file_path, record_id in _iter_html_files(path, start):
+        yield _file_record(file_path, record_id)
+
+
+
+def _iter_html_files(path, start=None):
+    '''
+    Generator of (path, id) of the HTML files in the directory tree `path`, in alphabetical order,
+    after the file of `start` if it is given - only the names of the files before it are walked through
+    '''
+
+    html_files = _walk_html_files(path)
+
+    if start is not None:
+
+        for file_path, _ in html_files:
+
+            if file_path == start[0]:
+                break
+
+        else:
+            raise ValueError(f"The start {start} is not in {path}")
+
+    yield from html_files
+
+
+
+def _walk_html_files(path):
+    '''
+    Generator of (path, id) of the HTML files in the directory tree `path`, in alphabetical order
+    '''
+
+    for root, dirs, files in os.walk(path):
+        # Walking in the same order every time, so that the checkpoints stay valid
+        dirs.sort()
+
+        for name in sorted(files):
+
+            if name.endswith(HTML_EXTENSIONS):
+                file_path = os.path.join(root, name)
+                yield file_path, os.path.relpath(file_path, path)
+
+
+
+def _iter_mapped_warc(path, start=None):
+    '''
+    Generator of the records of an uncompressed WARC file, with the payloads as slices of the mapped file,
+    from the offset of `start` - (path, byte offset) of a record in it - if it is given
+    '''
+
+    if os.path.getsize(path) == 0:
+        return
+
+    data = map_file(path)
+    pos = start[1] if start is not None else 0
+
+    while True:
+        start = data.find(b'WARC/', pos)
+
+        if start == -1:
+            return
+
+        headers_end = data.find(b'\r\n\r\n', start)
+
+        if headers_end == -1:
+            raise ValueError(f"Truncated WARC record in {path} at {start}")
+
+        headers = _parse_headers(data[start:headers_end].split(b'\r\n')[1:])
+        block_start = headers_end + 4
+        block_end = block_start + int(headers.get('content-length', 0))
+        pos = block_end
+
+        if headers.get('warc-type') != 'response':
+            continue
+
+        http_end = data.find(b'\r\n\r\n', block_start, block_end)
+
+        if http_end == -1 or not data[block_start:block_start + 5] == b'HTTP/':
+            continue
+
+        http_headers = _parse_headers(data[block_start:http_end].split(b'\r\n')[1:])
+
+        if 'html' not in http_headers.get('content-type', '').lower():
+            continue
+
+        record = {
+            'id': headers.get('warc-record-id') or f"{path}:{start}",
+            'url': headers.get('warc-target-uri'),
+            'position': (path, block_end),
+        }
+
+        # An encoded payload has to be decoded, so it is read the usual way
+        if 'transfer-encoding' in http_headers or 'content-encoding' in http_headers:
+            record['html'] = _http_html(data[block_start:block_end])
+
+        else:
+            payload_start = http_end + 4
+            record['html'] = MappedSlice(path, payload_start, block_end - payload_start,
+                                         _charset(http_headers.get('content-type', '')))
+
+        yield record
+
+
+
+def _mapped_file_record(path, record_id):
+    '''
+    Returns the record of a single HTML file, with the `html` as a MappedSlice of the whole file
+    '''
+
+    size = os.path.getsize(path)
+
+    return {'id': record_id, 'url': None, 'html': MappedSlice(path, 0, size), 'position': (path, size)}
+
+
+
+def iter_jsonl(path, start=None):
+    '''
+    Generator of the records of a JSONL file (optionally gzipped), each line a JSON object with `html` and `url`,
+    from the offset of `start` - (path, byte offset) of a record in it - if it is given.
+
+    A line without an `id` gets the byte offset of the line in the file (uncompressed) as its id - `path:offset`.
+    '''
+
+    opener = gzip.open if path.endswith('.gz') else open
+
+    with opener(path, 'rb') as f:
+        offset = 0
+
+        if start is not None:
+            offset = f.seek(start[1])
+
+        for line in f:
+            line_start = offset
+            offset += len(line)
+
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+
+            yield {
+                'id': record.get('id') or f"{path}:{line_start}",
+                'url': record.get('url'),
+                'html': record['html'],
+                'position': (path, offset),
+            }
+
+
+
+def iter_warc(path, start=None):
+    '''
+    Generator of the records of a WARC file (optionally gzipped) - only the HTML responses,
+    from the offset of `start` - (path, byte offset) of a record in it - if it is given
+    '''
+
+    opener = gzip.open if path.endswith('.gz') else open
+
+    with opener(path, 'rb') as f:
+
+        if start is not None:
+            f.seek(start[1])
+
+        while True:
+            # The offset of the record in the file (uncompressed), its id if it has no WARC-Record-ID
+            record_start = f.tell()
+            line = f.readline()
+
+            if not line:
+                return
+
+            # The blank lines between the records
+            if not line.strip():
+                continue
+
+            if not line.startswith(b'WARC/'):
+                raise ValueError(f"Not a WARC record in {path}: {line[:80]!r}")
+
+            headers = _read_headers(f)
+            block = f.read(int(headers.get('content-length', 0)))
+
+            if headers.get('warc-type') != 'response':
+                continue
+
+            html = _http_html(block)
+
+            if html is not None:
+                yield {
+                    'id': headers.get('warc-record-id') or f"{path}:{record_start}",
+                    'url': headers.get('warc-target-uri'),
+                    'html': html,
+                    'position': (path, f.tell()),
+                }
+
+
+
+def _file_record(path, record_id):
+    '''
+    Returns the record of a single HTML file, decoded with the encoding declared in it, as a MappedSlice of it is
+    '''
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    return {'id': record_id, 'url': None, 'html': _decode(data), 'position': (path, len(data))}
+
+
+
+def _read_headers(f):
+    '''
+    Returns the headers of a WARC record or an HTTP response (lowercase name => value), up to the blank line
+    '''
+
+    headers = {}
+
+    while True:
+        line = f.readline()
+
+        if not line.strip():
+            return headers
+
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+
+def _http_html(block):
+    '''
+    Returns the decoded body of an HTTP response, None if it is not an HTML page
+    '''
+
+    head, _, body = block.partition(b'\r\n\r\n')
+
+    if not head.startswith(b'HTTP/'):
+        return None
+
+    headers = _parse_headers(head.split(b'\r\n')[1:])
+
+    content_type = headers.get('content-type', '').lower()
+
+    if 'html' not in content_type:
+        return None
+
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = _dechunk(body)
+
+    if headers.get('content-encoding', '').lower() in ('gzip', 'deflate'):
+        # Both gzip and zlib headers are accepted
+        body = zlib.decompress(body, zlib.MAX_WBITS | 32)
+
+    return _decode(body, _charset(content_type))
+
+
+
+def _decode(data, encoding=None):
+    '''
+    Returns `data` (bytes) decoded the same way as the pages read as a MappedSlice -
+    with `encoding`, or the one declared in the HTML, or `DEFAULT_ENCODING` (see Document.decode())
+    '''
+
+    # Imported here, as meta_modules.document imports this module
+    from meta_modules.document import Document
+
+    return Document.decode(data, encoding)
+
+
+
+def _parse_headers(lines):
+    '''
+    Returns the headers in `lines` (bytes) - lowercase name => value
+    '''
+
+    headers = {}
+
+    for line in lines:
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    return headers
+
+
+
+def _charset(content_type):
+    '''
+    Returns the charset of a Content-Type header, None if it has none
+    '''
+
+    content_type = content_type.lower()
+
+    if 'charset=' not in content_type:
+        return None
+
+    return content_type.split('charset=', 1)[1].split(';')[0].strip(' "\'')
+
+
+
+def _dechunk(body):
+    '''
+    Returns the body of a response with `Transfer-Encoding: chunked`, without the chunk sizes
+    '''
+
+    chunks = []
+    pos = 0
+
+    while True:
+        line_end = body.find(b'\r\n', pos)
+
+        if line_end == -1:
+            break
+
+        size = int(body[pos:line_end].split(b';')[0] or b'0', 16)
+
+        if size == 0:
+            break
+
+        chunks.append(body[line_end + 2:line_end + 2 + size])
+        pos = line_end + 2 + size + 2
+
+    return b''.join(chunks)
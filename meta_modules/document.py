@@ -0,0 +1,302 @@
+'''
+Module with the Document - the HTML source code, parsed only once
+'''
+
+import codecs
+import mmap
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from meta_modules.constants import ENGINE, ENGINES, PARSER, STREAM_CHUNK_SIZE
+from meta_modules.corpus import DEFAULT_ENCODING, MappedSlice
+from meta_modules import lxml_engine
+
+
+# Types of an HTML source code that has not been decoded yet
+BYTES_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+
+
+
+class Document:
+    '''
+    Holds the HTML source code and its tree.
+
+    The tree is built once, on first use, and then passed through every Finder and the Cleaner,
+    which work on it (and mutate it) instead of re-parsing the source code.
+
+    `html`      - String or bytes-like - the HTML source code, None for a Document built with `from_chunks()`.
+    Bytes, a memoryview or an mmap are decoded once, straight into the str that every stage uses\n
+    `encoding`  - String - the encoding of bytes; default value - the one declared in the HTML, or utf-8\n
+    `engine`    - String - what builds the tree; default value - 'bs4':
+    - 'bs4' - a BeautifulSoup tree
+    - 'lxml' - an lxml tree, built without BeautifulSoup and a few times faster, with the same results
+    (see meta_modules/lxml_engine.py). A page nested deeper than libxml2 builds (lxml_engine.MAX_DEPTH)
+    is parsed by BeautifulSoup instead, and `engine` becomes 'bs4'; a streamed one cannot be parsed again,
+    so its tree stays cut and `depth_cut` is True
+    '''
+
+    # The end of <head> - its closing tag, or the start of <body> if it is not closed
+    re_head_end = re.compile(r"</head\s*>|<body[\s>]", re.IGNORECASE)
+
+    # The encoding declared in <meta charset="..."> or <meta http-equiv="Content-Type" content="...; charset=...">
+    re_charset = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.IGNORECASE)
+
+    # Bytes of the beginning of the source code, where the encoding is looked for
+    charset_window = 2048
+
+
+    def __init__(self, html, encoding=None, engine=ENGINE):
+
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine!r}, expected one of: {', '.join(ENGINES)}")
+
+        if isinstance(html, BYTES_TYPES):
+            html = self.decode(html, encoding)
+
+        self.html = html
+        self.engine = engine
+        self.__soup = None
+
+        # True if the tree is missing what is nested deeper than lxml_engine.MAX_DEPTH
+        self.depth_cut = False
+
+        # The strings of the lxml tree, joined by removing the nodes between them, see lxml_engine.remove()
+        self.merged_strings = {}
+
+
+    @classmethod
+    def decode(cls, data, encoding=None):
+        '''
+        Returns the HTML source code in `data` (bytes-like) as a str, without copying `data` beforehand.
+
+        `encoding` - String - default value - the one declared in the HTML, or utf-8
+        '''
+
+        if encoding is None:
+            # A memoryview is searched without copying it, so is a slice of it
+            charset = cls.re_charset.search(memoryview(data)[:cls.charset_window])
+            encoding = charset[1].decode('ascii') if charset else DEFAULT_ENCODING
+
+        if encoding.lower().replace('_', '-') in ('utf-8', 'utf8') and data[:3] == b'\xef\xbb\xbf':
+            encoding = 'utf-8-sig'
+
+        try:
+            return str(data, encoding, 'replace')
+
+        except LookupError:
+            return str(data, DEFAULT_ENCODING, 'replace')
+
+
+    @property
+    def soup(self):
+        '''
+        The tree of the whole source code, parsed on first use - a BeautifulSoup object,
+        or the root element of the lxml tree for the 'lxml' engine
+        '''
+
+        if self.__soup is None:
+
+            if self.engine == 'lxml':
+                self.__soup = lxml_engine.parse(self.html)
+
+                # libxml2 dropped the rest of a page nested too deep, BeautifulSoup keeps it
+                if lxml_engine.reaches_max_depth(self.__soup):
+                    self.engine = 'bs4'
+                    self.__soup = None
+
+            if self.__soup is None:
+                self.__soup = BeautifulSoup(self.html, PARSER)
+
+        return self.__soup
+
+
+    @soup.setter
+    def soup(self, soup):
+        self.__soup = soup
+
+
+    @property
+    def is_parsed(self):
+        '''
+        True if the tree of the whole source code is already built
+        '''
+
+        return self.__soup is not None
+
+
+    def head_soup(self):
+        '''
+        Returns a BeautifulSoup of only the <meta> and <title> tags of <head> (for the 'lxml' engine,
+        the lxml tree of <head>), without parsing anything after <head>.
+
+        Returns None if the end of <head> is not found in the source code.
+        '''
+
+        if self.html is None:
+            return None
+
+        head_end = self.re_head_end.search(self.html)
+
+        if not head_end:
+            return None
+
+        if self.engine == 'lxml':
+            return lxml_engine.parse(self.html[:head_end.start()])
+
+        return BeautifulSoup(self.html[:head_end.start()], PARSER, parse_only=SoupStrainer(['meta', 'title']))
+
+
+    def truncate(self, max_nodes):
+        '''
+        Removes the tags after the first `max_nodes` of the tree, in document order, along with everything
+        inside of them - what is left is the tree of the beginning of the page. Returns the number of tags removed.
+        '''
+
+        soup = self.soup
+
+        if self.engine == 'lxml':
+            return lxml_engine.truncate(soup, max_nodes, self.merged_strings)
+
+        tags = soup.find_all(True)
+
+        if len(tags) <= max_nodes:
+            return 0
+
+        kept = {id(tag) for tag in tags[:max_nodes]}
+        kept.add(id(self.soup))
+
+        # Only the first removed tag of each kept parent is removed by itself, the rest go along with it
+        for tag in tags[max_nodes:]:
+
+            if id(tag.parent) in kept:
+                tag.decompose()
+
+        return len(tags) - max_nodes
+
+
+    def serialize(self, node, contents=False):
+        '''
+        Returns the HTML of `node`, a tag of the tree (a str is returned as it is),
+        or only of what is inside of it if `contents` is True
+        '''
+
+        if isinstance(node, str):
+            return node
+
+        if self.engine == 'lxml':
+            return lxml_engine.serialize(node, contents)
+
+        return node.decode_contents() if contents else str(node)
+
+
+    @classmethod
+    def of(cls, html, engine=ENGINE):
+        '''
+        Returns `html` if it already is a Document (with its own engine), otherwise makes one out of it.
+
+        `html` can also be a MappedSlice (see meta_modules/corpus.py) - a record of a memory-mapped file.
+        '''
+
+        if isinstance(html, cls):
+            return html
+
+        if isinstance(html, MappedSlice):
+            return cls(html.view(), html.encoding, engine)
+
+        return cls(html, engine=engine)
+
+
+    @classmethod
+    def from_chunks(cls, chunks, encoding=None, on_text=None, engine=ENGINE):
+        '''
+        Builds a Document from an HTML source code that is read chunk by chunk.
+
+        Each chunk is fed to the parser as soon as it is read, so parsing starts before
+        the whole source code is available, and only the tree is kept in memory.
+
+        `chunks`    - Iterable or file-like object - chunks of str or bytes\n
+        `encoding`  - String - the encoding of bytes chunks; default value - utf-8\n
+        `on_text`   - Callable - called with every chunk, decoded to str, e.g. to look for something on the fly\n
+        `engine`    - String - 'bs4' or 'lxml', see Document
+        '''
+
+        document = cls(None, engine=engine)
+
+        if engine == 'lxml':
+            document.soup = lxml_engine.parse_chunks(cls.__on_text(cls.__iter_text(chunks, encoding), on_text))
+            document.depth_cut = lxml_engine.reaches_max_depth(document.soup)
+
+            return document
+
+        # An empty soup, to which the parser adds the tags while the chunks are fed
+        soup = BeautifulSoup('', PARSER)
+        soup.reset()
+        soup.builder.initialize_soup(soup)
+        parser = soup.builder.parser_for(None)
+
+        for text in cls.__iter_text(chunks, encoding):
+
+            if on_text:
+                on_text(text)
+
+            parser.feed(text)
+
+        parser.close()
+
+        # Closing the tags that were left open, the same way as BeautifulSoup does
+        soup.endData()
+        while soup.currentTag is not None and soup.currentTag.name != soup.ROOT_TAG_NAME:
+            soup.popTag()
+
+        soup.builder.soup = None
+
+        document.soup = soup
+
+        return document
+
+
+    @staticmethod
+    def __on_text(texts, on_text=None):
+        '''
+        Yields the chunks of `texts`, calling `on_text` with every one of them
+        '''
+
+        for text in texts:
+
+            if on_text:
+                on_text(text)
+
+            yield text
+
+
+    @staticmethod
+    def __iter_text(chunks, encoding=None):
+        '''
+        Yields the non-empty chunks as str, decoding the bytes ones incrementally,
+        so that a character split between two chunks is decoded properly.
+        '''
+
+        if hasattr(chunks, 'read'):
+            read = chunks.read
+            chunks = iter(lambda: read(STREAM_CHUNK_SIZE), read(0))
+
+        decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+
+        for chunk in chunks:
+
+            if isinstance(chunk, (bytes, bytearray, memoryview)):
+                chunk = decoder.decode(chunk)
+
+            if chunk:
+                yield chunk
+
+        rest = decoder.decode(b'', final=True)
+
+        if rest:
+            yield rest
+
+
+    def __str__(self):
+
+        return self.serialize(self.soup)
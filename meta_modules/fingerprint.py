@@ -0,0 +1,417 @@
+'''
+Module with the fingerprints of near-duplicate pages - a MinHash sketch of the word shingles of a text,
+and an index that finds the earlier sketches similar to a new one, in memory or on disk
+'''
+
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+import functools
+from itertools import compress, repeat
+import json
+import os
+import re
+import sys
+import threading
+import zlib
+
+
+
+# Changed whenever the sketch of the same text changes, so the sketches of an index on disk made before are not compared
+SKETCH_VERSION = 3
+
+# Words in a shingle
+SHINGLE_SIZE = 3
+
+# Hashed between the words of a shingle, so that the same letters split into other words ('ab c', 'a bc') differ
+SEPARATOR = b' '
+
+# Values of a sketch - each one is the smallest hash of the shingles that fall into its bin (one permutation MinHash)
+SKETCH_BINS = 64
+
+# Values of a sketch in a band of the index; two sketches are compared when any of their bands are the same
+BAND_ROWS = 4
+
+# Shingles of a text with no sketch, too short to be told apart from other texts
+MIN_SHINGLES = 16
+
+# Share of the bins of two sketches with the same value, for the texts to be near-duplicates
+MIN_SIMILARITY = 0.9
+
+# Max number of sketches kept in memory
+DEDUP_MAX_ENTRIES = 100000
+
+# The value of an empty bin
+EMPTY_BIN = 0xFFFFFFFF
+
+# Hashes (crc32) in each bin
+BIN_WIDTH = (1 << 32) // SKETCH_BINS
+
+# Hashes expected to be left in each bin once the ones far from the start of their bin are dropped, see sketch()
+BIN_SAMPLE = 12
+
+# Tags whose content is not text
+NOT_TEXT_TAGS = ('script', 'style', 'template')
+
+# Tags of the parts of a page that are the same on every page of a site - left out of the sketch of a page,
+# so the pages of two short articles are not near-duplicates because of their template
+BOILERPLATE_TAGS = ('header', 'nav', 'aside', 'form', 'footer')
+
+# Scripts, styles and comments, and the tags, none of which are text
+re_not_text = re.compile(r'<(script|style|template)\b.*?</\1\s*>|<!--.*?-->', re.S | re.I)
+re_tag = re.compile(r'<[^>]*>')
+
+
+
+def sketch(text, skip_tags=()):
+    '''
+    Returns the MinHash sketch (an array of `SKETCH_BINS` integers) of the shingles of the words of `text`,
+    None if it has fewer than `MIN_SHINGLES` shingles.
+
+    `text` can be HTML - its tags, scripts, styles and comments are left out with regular expressions,
+    so the sketch of a page is made without parsing it. So is everything inside of the `skip_tags`
+    (an Iterable), e.g. `BOILERPLATE_TAGS`.
+
+    Every step is a single call over all the words: the hash of a shingle is crc32 of its words, with `SEPARATOR`
+    between them, continued from the hash of the shingle one word shorter, and the smallest hash of each bin
+    is found with a binary search in the sorted hashes. Only the hashes close to the start of their bin are sorted -
+    about `BIN_SAMPLE` of them per bin; a bin left with none of them (rarely) is searched in all the hashes.
+    '''
+
+    text = re_tag.sub(' ', _not_text_pattern(tuple(skip_tags)).sub(' ', text))
+    words = text.lower().encode('utf-8', 'surrogatepass').split()
+
+    if len(words) - SHINGLE_SIZE + 1 < MIN_SHINGLES:
+        return None
+
+    hashes = map(zlib.crc32, words)
+
+    for size in range(1, SHINGLE_SIZE):
+        hashes = map(zlib.crc32, words[size:], map(zlib.crc32, repeat(SEPARATOR), hashes))
+
+    hashes = list(hashes)
+
+    # The smallest hash of a bin is below `limit` from its start, but for one in about e^BIN_SAMPLE bins
+    limit = BIN_WIDTH * BIN_SAMPLE * SKETCH_BINS // len(hashes)
+    sampled = limit < BIN_WIDTH
+
+    if sampled:
+        kept = sorted(set(compress(hashes, map(limit.__gt__, map(BIN_WIDTH.__rmod__, hashes)))))
+    else:
+        kept = sorted(set(hashes))
+
+    kept_count = len(kept)
+    values = array('I')
+
+    for start in range(0, SKETCH_BINS * BIN_WIDTH, BIN_WIDTH):
+        end = start + BIN_WIDTH
+        i = bisect_left(kept, start)
+
+        if i < kept_count and kept[i] < end:
+            values.append(kept[i])
+
+        elif sampled:
+            values.append(min((value for value in hashes if start <= value < end), default=EMPTY_BIN))
+
+        else:
+            values.append(EMPTY_BIN)
+
+    return values
+
+
+
+@functools.lru_cache(maxsize=16)
+def _not_text_pattern(skip_tags):
+    '''
+    Returns the pattern of what is not text - `re_not_text`, along with the `skip_tags` (a tuple) and their content.
+    Compiled once for each `skip_tags`.
+    '''
+
+    if not skip_tags:
+        return re_not_text
+
+    names = '|'.join(map(re.escape, NOT_TEXT_TAGS + skip_tags))
+
+    return re.compile(f'<({names})\\b.*?</\\1\\s*>|<!--.*?-->', re.S | re.I)
+
+
+
+def similarity(first, second):
+    '''
+    Returns the estimated share of the shingles that two texts have in common (Jaccard), between 0 and 1,
+    from their sketches - the share of the bins, empty in neither of them, with the same value
+    '''
+
+    same = 0
+    bins = 0
+
+    for first_value, second_value in zip(first, second):
+
+        if first_value == EMPTY_BIN and second_value == EMPTY_BIN:
+            continue
+
+        bins += 1
+        same += first_value == second_value
+
+    return same / bins if bins else 0.0
+
+
+
+def _to_bytes(values):
+    '''
+    Returns the bytes of a sketch, in the same (little-endian) order on every machine
+    '''
+
+    if sys.byteorder == 'big':
+        values = array('I', values)
+        values.byteswap()
+
+    return values.tobytes()
+
+
+
+def _from_bytes(data):
+    '''
+    Returns the sketch of `_to_bytes()`
+    '''
+
+    values = array('I', data)
+
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    return values
+
+
+
+def _band_keys(namespace, values):
+    '''
+    Returns the keys of the bands of a sketch; a band with an empty bin has no key,
+    as short texts would all share it
+    '''
+
+    keys = []
+
+    for start in range(0, SKETCH_BINS, BAND_ROWS):
+        band = values[start:start + BAND_ROWS]
+
+        if EMPTY_BIN not in band:
+            keys.append(f"{SKETCH_VERSION}/{namespace}/{start // BAND_ROWS}/{_to_bytes(band).hex()}")
+
+    return keys
+
+
+
+class DedupIndex:
+    '''
+    Index of the sketches of the texts already seen (see `sketch()`), which finds the near-duplicates of a new one.
+
+    Locality-sensitive hashing - each sketch is put in a bucket for every band of `BAND_ROWS` values of it,
+    and only the sketches that share a bucket with the new one are compared with it.
+    The sketches are kept apart by a namespace, e.g. of the options they were found with.
+    It can be shared by many threads, which use it one at a time - the near-duplicates of a page being found
+    by one thread while another one finds the page itself are not seen.
+
+    `min_similarity`    - Float - share of the bins of two sketches with the same value, for them to be near-duplicates\n
+    `path`              - String - an SQLite database to keep the sketches in, which can be shared by many processes
+    and kept between runs; None for keeping them in memory\n
+    `max_entries`       - Integer - max number of sketches kept in memory, the oldest ones are dropped
+    '''
+
+    def __init__(self, min_similarity=MIN_SIMILARITY, path=None, max_entries=DEDUP_MAX_ENTRIES):
+        self.min_similarity = min_similarity
+        self.path = path
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.compared = 0
+
+        # id => (namespace, sketch, serialized value), and band key => ids
+        self.__entries = OrderedDict()
+        self.__buckets = {}
+        self.__next_id = 1
+        self.__connection = None
+        self.__connection_pid = None
+        self.__lock = threading.Lock()
+
+
+    def find(self, namespace, values):
+        '''
+        Returns (id, similarity, value) of the most similar earlier sketch of `namespace`,
+        None if there is no near-duplicate of `values`
+        '''
+
+        with self.__lock:
+            best = None
+
+            for entry_id, entry_values, value in self.__candidates(namespace, values):
+                self.compared += 1
+                entry_similarity = similarity(values, entry_values)
+
+                if entry_similarity >= self.min_similarity and (best is None or entry_similarity > best[1]):
+                    best = (entry_id, entry_similarity, value)
+
+            if best is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+        entry_id, entry_similarity, value = best
+
+        return entry_id, entry_similarity, json.loads(value)
+
+
+    def add(self, namespace, values, value=None):
+        '''
+        Adds a sketch of `namespace` with its `value` (anything JSON serializable), returns its id
+        '''
+
+        value = json.dumps(value, ensure_ascii=False)
+        keys = _band_keys(namespace, values)
+
+        with self.__lock:
+            if self.path is not None:
+                db = self.__db()
+
+                with db:
+                    entry_id = db.execute('INSERT INTO entries (namespace, sketch, value) VALUES (?, ?, ?)',
+                                          (namespace, _to_bytes(values), value)).lastrowid
+                    db.executemany('INSERT INTO buckets (key, id) VALUES (?, ?)', ((key, entry_id) for key in keys))
+
+                return entry_id
+
+            entry_id = self.__next_id
+            self.__next_id += 1
+
+            self.__entries[entry_id] = (namespace, array('I', values), value)
+
+            for key in keys:
+                self.__buckets.setdefault(key, []).append(entry_id)
+
+            while len(self.__entries) > self.max_entries:
+                self.__drop_oldest()
+
+            return entry_id
+
+
+    def stats(self):
+        '''
+        Returns a dictionary with the counters of the index
+        '''
+
+        with self.__lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'compared': self.compared,
+                'entries': len(self.__entries) if self.path is None else self.__db().execute(
+                    'SELECT COUNT(*) FROM entries').fetchone()[0],
+            }
+
+
+    def clear(self):
+        '''
+        Removes every sketch
+        '''
+
+        with self.__lock:
+            self.__entries.clear()
+            self.__buckets.clear()
+
+            if self.path is not None:
+                db = self.__db()
+
+                with db:
+                    db.execute('DELETE FROM buckets')
+                    db.execute('DELETE FROM entries')
+
+
+    def __candidates(self, namespace, values):
+        '''
+        Generator of (id, sketch, serialized value) of the sketches sharing a bucket with `values`
+        '''
+
+        keys = _band_keys(namespace, values)
+
+        if not keys:
+            return
+
+        if self.path is not None:
+            rows = self.__db().execute(
+                'SELECT id, sketch, value FROM entries WHERE id IN '
+                f"(SELECT id FROM buckets WHERE key IN ({', '.join('?' * len(keys))}))", keys)
+
+            for entry_id, data, value in rows:
+                yield entry_id, _from_bytes(data), value
+
+            return
+
+        entry_ids = set()
+
+        for key in keys:
+            entry_ids.update(self.__buckets.get(key, ()))
+
+        for entry_id in sorted(entry_ids):
+            _, entry_values, value = self.__entries[entry_id]
+            yield entry_id, entry_values, value
+
+
+    def __drop_oldest(self):
+        '''
+        Drops the oldest sketch kept in memory, along with its buckets
+        '''
+
+        entry_id, (namespace, values, _) = self.__entries.popitem(last=False)
+
+        for key in _band_keys(namespace, values):
+            bucket = self.__buckets[key]
+            bucket.remove(entry_id)
+
+            if not bucket:
+                del self.__buckets[key]
+
+
+    def __db(self):
+        '''
+        Returns the connection to the database, opened once in each process
+        and used by its threads under the lock
+        '''
+
+        if self.__connection is None or self.__connection_pid != os.getpid():
+            # Imported only when needed, most indexes are kept in memory
+            import sqlite3
+
+            self.__connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.__connection_pid = os.getpid()
+
+            # Many processes can read while one of them writes
+            self.__connection.execute('PRAGMA journal_mode=WAL')
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS entries '
+                                      '(id INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT, sketch BLOB, value TEXT)')
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT, id INTEGER)')
+            self.__connection.execute('CREATE INDEX IF NOT EXISTS buckets_key ON buckets (key)')
+
+        return self.__connection
+
+
+    def __getstate__(self):
+        '''
+        Sent to other processes (e.g. the workers of `ArticleFinder.find_many()`) without
+        the lock, the connection and the sketches kept in memory - each process opens its own connection
+        '''
+
+        state = self.__dict__.copy()
+        state['_DedupIndex__entries'] = OrderedDict()
+        state['_DedupIndex__buckets'] = {}
+        state['_DedupIndex__connection'] = None
+        state['_DedupIndex__connection_pid'] = None
+        del state['_DedupIndex__lock']
+
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
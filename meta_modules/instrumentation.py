@@ -0,0 +1,144 @@
+'''
+Module with the instrumentation of the article finder - the timings of every stage,
+given to a tracer, and the logging of the diagnostics
+'''
+
+import logging
+import os
+import time
+
+from meta_modules.constants import LOG_DIR, LOGGER_NAME
+
+
+logger = logging.getLogger(LOGGER_NAME)
+
+# The stages of ArticleFinder.find(), in order
+STAGES = (
+        'dedup',
+        'cache',
+        'title',
+        'date',
+        'parse',
+        'cleaning',
+        'template',
+        'tag_counting',
+        'body',
+        'post_processing',
+        'body_dedup',
+)
+
+
+
+class Tracer:
+    '''
+    Receives an event at the end of every stage of ArticleFinder.find().
+    Override `on_stage()`, or pass any callable taking the event as the tracer instead.
+
+    An event is a dictionary:\n
+    `stage`         - String - one of `STAGES`\n
+    `wall_ms`       - Float - wall time of the stage, in milliseconds\n
+    `cpu_ms`        - Float - CPU time of the stage (of the thread running it), in milliseconds\n
+    `input_size`    - Integer - symbols of the HTML source code, None if it is not kept (streaming)\n
+    `nodes`         - Integer - tags gone over by the stage, None if it does not go over the tree\n
+    `candidates`    - Integer - candidates considered by the stage - 1 for a cache or template hit, date patterns tried, tags removed by the cleaning,
+                      tags with symbols, parents scored for the body; None if it has none
+    '''
+
+    def on_stage(self, event):
+        pass
+
+
+
+class LoggingTracer(Tracer):
+    '''
+    Tracer that logs every event, at the debug level by default
+    '''
+
+    def __init__(self, level=logging.DEBUG):
+        self.level = level
+
+
+    def on_stage(self, event):
+        logger.log(self.level,
+                   "%s: %.2f ms wall, %.2f ms cpu, input %s, nodes %s, candidates %s",
+                   event['stage'], event['wall_ms'], event['cpu_ms'],
+                   event['input_size'], event['nodes'], event['candidates'])
+
+
+
+class StageTimer:
+    '''
+    Context manager that measures a stage and reports its event to the tracer.
+    The event is returned by `with`, so the stage can fill in its `nodes` and `candidates`.
+
+    `stage`         - String - the name of the stage\n
+    `tracer`        - Tracer or callable - gets the event; None for no tracer\n
+    `timings`       - Dictionary - gets stage => wall time in milliseconds; None for no timings\n
+    `input_size`    - Integer - symbols of the HTML source code
+
+    `budget`        - BudgetTracker - starts the clock of the stage, see meta_modules/budget.py; None for no budget
+    '''
+
+    def __init__(self, stage, tracer=None, timings=None, input_size=None, budget=None):
+        self.stage = stage
+        self.tracer = tracer
+        self.timings = timings
+        self.budget = budget
+
+        self.event = {
+            'stage': stage,
+            'wall_ms': None,
+            'cpu_ms': None,
+            'input_size': input_size,
+            'nodes': None,
+            'candidates': None,
+        }
+
+
+    def __enter__(self):
+        self.__wall_start = time.perf_counter()
+        self.__cpu_start = time.thread_time()
+
+        if self.budget is not None:
+            self.budget.start(self.stage)
+
+        return self.event
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.event['wall_ms'] = (time.perf_counter() - self.__wall_start) * 1000
+        self.event['cpu_ms'] = (time.thread_time() - self.__cpu_start) * 1000
+
+        # A failed stage is not reported
+        if exc_type is not None:
+            return False
+
+        if self.budget is not None:
+            self.budget.stop(self.stage, self.event['wall_ms'])
+
+        if self.timings is not None:
+            self.timings[self.stage] = self.event['wall_ms']
+
+        if self.tracer is not None:
+            on_stage = getattr(self.tracer, 'on_stage', self.tracer)
+            on_stage(self.event)
+
+        return False
+
+
+
+def log_to_file(path=LOG_DIR, level=logging.DEBUG):
+    '''
+    Writes the diagnostics of the article finder to `path` (meta_modules/output/log.log by default).
+    Returns the handler, to be removed with `logger.removeHandler()`.
+    '''
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+
+    logger.addHandler(handler)
+    logger.setLevel(level)
+
+    return handler
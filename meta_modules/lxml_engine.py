@@ -0,0 +1,1128 @@
+'''
+Module with the 'lxml' engine - the tree of a Document built by lxml alone, without BeautifulSoup,
+and the passes of the Cleaner and the Finders over it.
+
+Each function gives the same result as the BeautifulSoup code it stands for, so that the engine
+can be switched without changing the articles that are found. BeautifulSoup builds its tree from
+the same lxml parser, so the trees only differ in the details that BeautifulSoup adds on top
+(and in the pages nested deeper than `MAX_DEPTH`, see `reaches_max_depth()`):
+- strings of whitespace only are collapsed to a single space or newline - done once, by `parse()`
+- the strings inside of <script>, <style>, etc. are not text of their parent tags
+- a tag that is removed leaves the strings around it apart, where lxml joins them -
+the joined strings are counted in `merged`, see `remove()`
+- the attributes with no value, that lxml sets to their own name (<td nowrap>) - see `BareAttributes`
+- the doctype, a node of the tree in BeautifulSoup - kept as a processing instruction (which the HTML parser
+never makes, it turns them into comments)
+- the serialization - see `serialize()`
+'''
+
+import re
+
+from lxml import etree
+
+from meta_modules.output import BLOCK_TAGS
+from meta_modules.text_index import LINK_TAG, FeatureTable, _join, _segment, _stripped_len
+
+
+
+# Name of the root element, holding the <html> element, as the BeautifulSoup object does
+ROOT_TAG = 'document'
+
+# Depth of the tree, counting <html>, at which libxml2 stops building it (with `huge_tree`)
+MAX_DEPTH = 2048
+
+# Whitespace of the strings that are collapsed
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+# Tags whose whitespace is kept as it is
+PRESERVE_WHITESPACE_TAGS = frozenset(('pre', 'textarea'))
+
+# Tags whose strings are not text of their parents (see Tag.interesting_string_types)
+STRING_CONTAINER_TAGS = frozenset(('rp', 'rt', 'script', 'style', 'template'))
+
+# Tags whose strings are not escaped when serialized
+CDATA_CONTAINING_TAGS = frozenset(('script', 'style'))
+
+# Tags serialized as <tag/> when they are empty
+VOID_TAGS = frozenset((
+        'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image', 'img',
+        'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source', 'spacer',
+        'track', 'wbr',
+))
+
+# Attributes with a list of values, whose whitespace is normalized - tag => attributes, '*' for every tag
+LIST_ATTRIBUTES = {
+        '*': frozenset(('accesskey', 'class', 'dropzone')),
+        'a': frozenset(('rel', 'rev')),
+        'area': frozenset(('rel',)),
+        'form': frozenset(('accept-charset',)),
+        'icon': frozenset(('sizes',)),
+        'iframe': frozenset(('sandbox',)),
+        'link': frozenset(('rel', 'rev')),
+        'object': frozenset(('archive',)),
+        'output': frozenset(('for',)),
+        'td': frozenset(('headers',)),
+        'th': frozenset(('headers',)),
+}
+
+# Attributes that lxml sets to their own name when they have no value, where BeautifulSoup has ''
+BOOLEAN_ATTRIBUTES = frozenset((
+        'checked', 'compact', 'declare', 'defer', 'disabled', 'ismap', 'multiple', 'nohref', 'noresize',
+        'noshade', 'nowrap', 'readonly', 'selected',
+))
+
+# Tags whose content is text, not tags - read up to their end tag (<plaintext> up to the end of the source code)
+RAW_TEXT_TAGS = frozenset(('iframe', 'noembed', 'noframes', 'plaintext', 'script', 'style', 'textarea', 'title', 'xmp'))
+
+# Target of the processing instruction standing for the doctype
+DOCTYPE_TARGET = 'doctype'
+
+# Symbols at the end of the source code, where the whitespace after </html> is looked for
+TAIL_WINDOW = 1024
+
+# Namespace of the `xml:` attributes, e.g. xml:lang
+XML_NAMESPACE = '{http://www.w3.org/XML/1998/namespace}'
+
+# The charset of <meta http-equiv="Content-Type" content="...">, replaced with utf-8 when serialized
+re_content_charset = re.compile(r"((^|;)\s*charset=)([^;]*)", re.M)
+
+re_not_whitespace = re.compile(r"\S+")
+
+# A boolean attribute with no value - only a hint, the start tags are then read by `BareAttributes`
+re_bare_attribute = re.compile(rf"[\s\"'/](?:{'|'.join(sorted(BOOLEAN_ATTRIBUTES))})(?!\s*=)(?=[\s/>])", re.IGNORECASE)
+
+# The first letter of the name of a start tag
+re_tag_name_start = re.compile(r"[a-zA-Z]")
+
+# A start tag - a `>` in a quoted value of an attribute does not end it, a quote anywhere else is a symbol
+re_start_tag = re.compile(r"<([a-zA-Z][^\s/>]*)(?:=\s*\"[^\"]*\"|=\s*'[^']*'|=(?!\s*[\"'])|[^=>])*>")
+
+# An attribute of a start tag, and its value
+re_attribute = re.compile(r"([^\s/>][^\s/>=]*)(\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s>]*))?")
+
+# The end of a comment
+re_comment_end = re.compile(r"--!?>")
+
+# The end of a bogus comment - <!...>, <?...> - or of an end tag
+re_tag_end = re.compile(r">")
+
+# Tag => the end of its text; nothing ends <plaintext>
+re_raw_text_ends = {name: re.compile(rf"</{name}[\s/>]" if name != 'plaintext' else r"(?!)", re.IGNORECASE)
+                    for name in RAW_TEXT_TAGS}
+
+# The doctype - its name, and the public and system identifiers
+re_doctype = re.compile(r"<!DOCTYPE\s+([^\s>]+)"
+                        r"(?:\s+PUBLIC\s+[\"']([^\"']*)[\"'](?:\s+[\"']([^\"']*)[\"'])?"
+                        r"|\s+SYSTEM\s+[\"']([^\"']*)[\"'])?",
+                        re.IGNORECASE)
+
+# Comments and whitespace after </html>, up to the end of the source code
+re_after_html = re.compile(r"</html\s*>((?:\s|<!--.*?-->)*)\Z", re.IGNORECASE | re.DOTALL)
+
+
+
+def parse(html):
+    '''
+    Returns the root element of the tree of `html` (a str)
+    '''
+
+    # lxml fails on a str starting with a BOM
+    if html[:1] == '\ufeff':
+        html = html[1:]
+
+    parser = _parser()
+
+    # Reading the start tags only when there might be an attribute to fix
+    if re_bare_attribute.search(html):
+        parser.feed(BareAttributes().feed(html, final=True))
+    else:
+        parser.feed(html)
+
+    return _build(parser, html, html[-TAIL_WINDOW:])
+
+
+
+def parse_chunks(chunks):
+    '''
+    Returns the root element of the tree of an HTML source code, fed to the parser chunk by chunk (str)
+    '''
+
+    parser = _parser()
+    bare_attributes = BareAttributes()
+
+    head = ''
+    tail = ''
+
+    for chunk in chunks:
+
+        if not head and chunk[:1] == '\ufeff':
+            chunk = chunk[1:]
+
+        # The beginning and the end of the source code, where the doctype and the whitespace after </html> are
+        if len(head) < TAIL_WINDOW:
+            head += chunk[:TAIL_WINDOW]
+
+        tail = (tail + chunk)[-TAIL_WINDOW:]
+
+        parser.feed(bare_attributes.feed(chunk))
+
+    parser.feed(bare_attributes.feed('', final=True))
+
+    return _build(parser, head, tail)
+
+
+
+def _parser():
+    '''
+    Returns a new HTML parser of lxml.
+
+    libxml2 stops building the tree at a depth of 256 tags (2048 with `huge_tree`) and drops everything after it,
+    which BeautifulSoup, fed by the same parser one tag at a time, does not - see `reaches_max_depth()`.
+    '''
+
+    return etree.HTMLParser(recover=True, strip_cdata=False, huge_tree=True)
+
+
+
+def reaches_max_depth(root):
+    '''
+    Returns True if the tree of `root` reaches `MAX_DEPTH`, where libxml2 stopped building it -
+    the rest of the source code is missing from the tree, without any error.
+
+    The parser stops right after the tag at `MAX_DEPTH`, so it is the last one of the tree,
+    found by following the last children down from <html>.
+    '''
+
+    for node in root:
+
+        # Only the <html> element has children
+        depth = 1
+
+        while len(node):
+            node = node[-1]
+            depth += 1
+
+        if depth >= MAX_DEPTH:
+            return True
+
+    return False
+
+
+
+def _build(parser, head, tail):
+    '''
+    Returns the root element of the tree of an HTML source code fed to `parser`
+
+    `head` - String - the beginning of the source code, with the doctype\n
+    `tail` - String - the end of the source code
+    '''
+
+    try:
+        html = parser.close()
+
+    # Nothing to parse, e.g. an empty str
+    except etree.XMLSyntaxError:
+        html = None
+
+    root = etree.Element(ROOT_TAG)
+
+    if html is None:
+        return root
+
+    # The comments before and after <html> are siblings of it
+    preceding = list(html.itersiblings(preceding=True))
+    preceding.reverse()
+    following = list(html.itersiblings())
+
+    root.extend(preceding)
+    root.append(html)
+    root.extend(following)
+
+    doctype = re_doctype.search(head)
+
+    # The doctype, after the comments coming before it
+    if doctype:
+        root.insert(min(head.count('<!--', 0, doctype.start()), len(preceding)), _doctype(doctype))
+
+    # lxml drops the whitespace after </html>, unless the </html> is in a <textarea>, a comment, etc. left open
+    after_html = re_after_html.search(tail)
+
+    if after_html and not re_after_html.search(_last_string(html) + after_html[1]):
+        strings = re.split(r"<!--.*?-->", after_html[1], flags=re.DOTALL)
+
+        if len(strings) == len(following) + 1:
+
+            for node, string in zip([html] + following, strings):
+                node.tail = string or None
+
+    _collapse_whitespace(root)
+
+    return root
+
+
+
+def _last_string(element):
+    '''
+    Returns the last string inside of `element`, in the order of the source code
+    '''
+
+    chain = []
+
+    while len(element):
+        element = element[-1]
+        chain.append(element)
+
+    for node in chain:
+        if node.tail:
+            return node.tail
+
+    return element.text or ''
+
+
+
+def _doctype(match):
+    '''
+    Returns the processing instruction standing for the doctype of `re_doctype`, the same as BeautifulSoup's Doctype
+    '''
+
+    name, public_id, public_system_id, system_id = match.groups()
+
+    if public_id is not None:
+        name += f' PUBLIC "{public_id}"'
+
+        if public_system_id is not None:
+            name += f' "{public_system_id}"'
+
+    elif system_id is not None:
+        name += f' SYSTEM "{system_id}"'
+
+    return etree.ProcessingInstruction(DOCTYPE_TARGET, name)
+
+
+
+class BareAttributes:
+    '''
+    Gives the boolean attributes that have no value in the start tags of an HTML source code an empty value -
+    <td nowrap> becomes <td nowrap="">, which lxml reads the same way as BeautifulSoup does.
+
+    The source code can be fed chunk by chunk - `feed()` returns the part that is done,
+    keeping a start tag that is split between two chunks for the next one.
+    The content of comments, <script>, <style>, etc. is left as it is.
+    '''
+
+    def __init__(self):
+        self.pending = ''
+        # The pattern of the end of the comment or <script>, etc. that the source code is in
+        self.raw_end = None
+
+
+    def feed(self, text, final=False):
+        '''
+        Returns the fixed source code of `text`, up to where it can be read;
+        `final` - Boolean - True for the last chunk
+        '''
+
+        text = self.pending + text
+        self.pending = ''
+
+        parts = []
+        pos = 0
+
+        while pos < len(text):
+
+            if self.raw_end is not None:
+                end = self.raw_end.search(text, pos)
+
+                if end is None:
+                    # The end might be split between two chunks
+                    keep = len(text) if final else max(pos, len(text) - 16)
+                    parts.append(text[pos:keep])
+                    self.pending = text[keep:]
+                    break
+
+                parts.append(text[pos:end.end()])
+                pos = end.end()
+                self.raw_end = None
+                continue
+
+            start = text.find('<', pos)
+
+            if start == -1:
+                parts.append(text[pos:])
+                break
+
+            parts.append(text[pos:start])
+
+            if text.find('>', start) == -1:
+
+                # A tag that goes on in the next chunk
+                if not final:
+                    self.pending = text[start:]
+                else:
+                    parts.append(text[start:])
+
+                break
+
+            if text.startswith('<!--', start):
+                parts.append('<!--')
+                pos = start + 4
+
+                # <!--> and <!---> are empty comments
+                if not text.startswith(('>', '->'), pos):
+                    self.raw_end = re_comment_end
+
+                continue
+
+            start_tag = re_start_tag.match(text, start)
+
+            # A start tag with a quoted value that is not closed yet, or not closed at all
+            if start_tag is None and re_tag_name_start.match(text, start + 1):
+
+                if not final:
+                    self.pending = text[start:]
+                else:
+                    parts.append(text[start:])
+
+                break
+
+            if start_tag is None:
+                parts.append('<')
+                pos = start + 1
+
+                # An end tag, a doctype or a bogus comment
+                if text.startswith(('<!', '<?', '</'), start):
+                    self.raw_end = re_tag_end
+
+                continue
+
+            tag = start_tag[0]
+            name = start_tag[1].lower()
+
+            if re_bare_attribute.search(tag):
+                name_end = len(name) + 1
+                tag = tag[:name_end] + re_attribute.sub(_fix_attribute, tag[name_end:])
+
+            parts.append(tag)
+            pos = start_tag.end()
+
+            self.raw_end = re_raw_text_ends.get(name)
+
+        return ''.join(parts)
+
+
+
+def _fix_attribute(match):
+    '''
+    Returns an attribute of `re_attribute`, with an empty value if it is a boolean attribute with no value
+    '''
+
+    name, value = match.groups()
+
+    if value is None and name.lower() in BOOLEAN_ATTRIBUTES:
+        return f'{name}=""'
+
+    return match[0]
+
+
+
+def _collapse_whitespace(root):
+    '''
+    Replaces every string of whitespace only with a newline if it has one, otherwise with a space,
+    except inside of <pre> and <textarea>. The same goes for the comments, an empty one becoming a space.
+    '''
+
+    preserved = set()
+
+    for tag in root.iter(*PRESERVE_WHITESPACE_TAGS):
+        preserved.update(tag.iter())
+
+    for element in root.iter():
+
+        text = element.text
+
+        if element.tag is etree.Comment:
+            text = text or ' '
+
+        if text and element.tag is not etree.PI and element not in preserved and not text.strip(ASCII_SPACES):
+            element.text = '\n' if '\n' in text else ' '
+
+        tail = element.tail
+
+        if tail and not tail.strip(ASCII_SPACES) and element.getparent() not in preserved:
+            element.tail = '\n' if '\n' in tail else ' '
+
+
+
+def in_string_container(element):
+    '''
+    Returns True if the strings inside of `element` are in <script>, <style>, etc.
+    '''
+
+    if element.tag in STRING_CONTAINER_TAGS:
+        return True
+
+    return any(parent.tag in STRING_CONTAINER_TAGS for parent in element.iterancestors())
+
+
+
+def remove(node, merged):
+    '''
+    Removes `node` along with everything inside of it, keeping the string after it (its tail).
+
+    The tail is joined to the string before `node`, which BeautifulSoup keeps as two strings,
+    so `merged` - (element, is tail) => number of strings - counts the strings joined in each text and tail.
+    '''
+
+    tail = node.tail
+
+    if tail:
+        previous = node.getprevious()
+        key = (previous, True) if previous is not None else (node.getparent(), False)
+        element, is_tail = key
+        string = element.tail if is_tail else element.text
+
+        merged[key] = (merged.get(key, 1) if string else 0) + merged.pop((node, True), 1)
+
+        if is_tail:
+            element.tail = (string or '') + tail
+        else:
+            element.text = (string or '') + tail
+
+    node.getparent().remove(node)
+
+
+
+def previous_siblings(node, merged):
+    '''
+    Generator of the siblings before `node`, closest first, as BeautifulSoup has them -
+    elements, comments and strings (a string for each one that was joined by `remove()`)
+    '''
+
+    parent = node.getparent()
+
+    if parent is None:
+        return
+
+    for sibling in node.itersiblings(preceding=True):
+
+        if sibling.tail:
+            for _ in range(merged.get((sibling, True), 1)):
+                yield sibling.tail
+
+        yield sibling
+
+    if parent.text:
+        for _ in range(merged.get((parent, False), 1)):
+            yield parent.text
+
+
+
+def text(element):
+    '''
+    Returns the text of `element`, the same as Tag.text
+    '''
+
+    if element.tag in STRING_CONTAINER_TAGS:
+        return ''.join(_container_strings(element, element.tag, element.tag))
+
+    # Every string inside of <script>, <style>, etc. is of their own type
+    if in_string_container(element):
+        return ''
+
+    return ''.join(_text_strings(element))
+
+
+
+def _text_strings(element):
+    '''
+    Generator of the strings of `element`, that are not in <script>, <style>, etc.
+    '''
+
+    if element.text:
+        yield element.text
+
+    for child in element:
+
+        if isinstance(child.tag, str) and child.tag not in STRING_CONTAINER_TAGS:
+            yield from _text_strings(child)
+
+        if child.tail:
+            yield child.tail
+
+
+
+def _container_strings(element, name, container):
+    '''
+    Generator of the strings inside of `element`, whose closest <script>, <style>, etc. is a `name` tag
+
+    `container` - String - the name of the closest <script>, <style>, etc. of the strings of `element`
+    '''
+
+    if element.tag in STRING_CONTAINER_TAGS:
+        container = element.tag
+
+    if element.text and container == name:
+        yield element.text
+
+    for child in element:
+
+        if isinstance(child.tag, str):
+            yield from _container_strings(child, name, container)
+
+        if child.tail and container == name:
+            yield child.tail
+
+
+
+def find_title(root):
+    '''
+    Returns the title in the tree of `root` - the `content` of <meta property="og:title">,
+    or the text of <title>, None if there is none
+    '''
+
+    for meta in root.iterdescendants('meta'):
+
+        if meta.get('property') == 'og:title':
+
+            if meta.get('content') is not None:
+                return meta.get('content')
+
+            break
+
+    for title in root.iterdescendants('title'):
+        return text(title)
+
+    return None
+
+
+
+def find_head(root):
+    '''
+    Returns the first <head> element, None if there is none
+    '''
+
+    return next(root.iterdescendants('head'), None)
+
+
+
+def count_tags(root, formatting_tags_to_rem):
+    '''
+    Returns a tuple of (names of all tags, tag => symbols, formatting tag => symbols, number of tags gone over),
+    see TagSymbFinder.get_tags_counter()
+    '''
+
+    tags = set()
+    tag_counter = {}
+    formatting_tag_counter = {}
+    nodes_count = 1
+    # Formatting tags that the walk is inside of
+    formatting_depth = 0
+
+    # A single walk in C, with an event at the end of each tag, instead of a stack of proxies of the elements
+    for event, element in etree.iterwalk(root, events=('start', 'end')):
+        name = element.tag
+
+        # Comments and processing instructions
+        if not isinstance(name, str):
+            continue
+
+        if event == 'end':
+            if name in formatting_tags_to_rem:
+                formatting_depth -= 1
+            continue
+
+        if element is root:
+            continue
+
+        nodes_count += 1
+        tags.add(name)
+
+        if name in formatting_tags_to_rem:
+            count = _single_tag_counter(element)
+            if count:
+                formatting_tag_counter[name] = formatting_tag_counter.get(name, 0) + count
+
+            formatting_depth += 1
+
+        elif not formatting_depth:
+            count = _single_tag_counter(element, formatting_tags_to_rem)
+            if count:
+                tag_counter[name] = tag_counter.get(name, 0) + count
+
+    return tags, tag_counter, formatting_tag_counter, nodes_count
+
+
+
+def _single_tag_counter(element, formatting_tags_to_rem=()):
+    '''
+    Returns the characters inside `element`, if it holds only text, otherwise - None,
+    see TagSymbFinder.__single_tag_counter()
+    '''
+
+    strings = [element.text] if element.text else []
+
+    for child in element:
+
+        # Comments and processing instructions are not text
+        if child.tag not in formatting_tags_to_rem:
+            return None
+
+        if child.tail:
+            strings.append(child.tail)
+
+    text = ''.join(strings)
+
+    if not text:
+        return None
+
+    if element.tag in CDATA_CONTAINING_TAGS:
+        return None if '<' in text else len(text.strip())
+
+    text = text.strip()
+
+    return len(text) + 4 * text.count('&') + 3 * (text.count('<') + text.count('>'))
+
+
+
+def tag_names(root):
+    '''
+    Returns the set of the names of all tags below `root`
+    '''
+
+    return {element.tag for element in root.iterdescendants(etree.Element)}
+
+
+
+def clean_tags(root, tags_to_rem, merged):
+    '''
+    Removes the tags in `tags_to_rem` (along with everything inside of them), returns the removed tags
+    '''
+
+    found_tags = []
+    stack = [root]
+
+    while stack:
+        element = stack.pop()
+
+        for child in element.iterchildren(etree.Element):
+
+            # Not going inside of a tag that is removed anyway
+            if child.tag in tags_to_rem:
+                found_tags.append(child)
+            else:
+                stack.append(child)
+
+    for element in found_tags:
+        remove(element, merged)
+
+    return found_tags
+
+
+
+def clean_comments(root, merged):
+    '''
+    Removes the comments
+    '''
+
+    for comment in list(root.iter(etree.Comment)):
+        remove(comment, merged)
+
+
+
+def clean_empty_tags(root, merged, re_not_empty):
+    '''
+    Removes empty tags, recursively, with a single post-order pass over the tree,
+    see Cleaner.__clean_empty_tags(). Returns (number of tags gone over, number of tags removed).
+    '''
+
+    nodes_count = 0
+    removed_count = 0
+
+    stack = [(root, False)]
+
+    while stack:
+        element, visited = stack.pop()
+
+        if not visited:
+            nodes_count += 1
+            stack.append((element, True))
+            stack.extend((child, False) for child in element.iterchildren(etree.Element))
+            continue
+
+        if element is not root and is_empty(element, re_not_empty):
+            removed_count += 1
+            remove(element, merged)
+
+    return nodes_count, removed_count
+
+
+
+def is_empty(element, re_not_empty):
+    '''
+    Returns True if `element` has no child tags and no text matching `re_not_empty` in it
+    '''
+
+    # Tags, comments or processing instructions inside of it
+    if len(element):
+        return False
+
+    # Self-closing tags, such as <br/> and <img/>, are never empty
+    if element.text:
+        return not re_not_empty.search(element.text)
+
+    return element.tag not in VOID_TAGS
+
+
+
+def unwrap(node, merged):
+    '''
+    Replaces `node` with its children and strings, as Tag.unwrap() does.
+
+    Its text is joined to the string before it, and its tail to its last child (or to its text),
+    counted in `merged` the same way as by `remove()`.
+    '''
+
+    parent = node.getparent()
+    previous = node.getprevious()
+    children = list(node)
+
+    # The strings of `node`, in order, and where each of them ends up
+    text_key = (previous, True) if previous is not None else (parent, False)
+    tail_key = (children[-1], True) if children else text_key
+
+    for string, is_tail, key in ((node.text, False, text_key), (node.tail, True, tail_key)):
+
+        if not string:
+            continue
+
+        element, to_tail = key
+        joined = element.tail if to_tail else element.text
+
+        merged[key] = (merged.get(key, 1) if joined else 0) + merged.pop((node, is_tail), 1)
+
+        if to_tail:
+            element.tail = (joined or '') + string
+        else:
+            element.text = (joined or '') + string
+
+    # Setting the tails first, as moving a child keeps its tail
+    node.text = node.tail = None
+    index = parent.index(node)
+    parent[index:index + 1] = children
+
+
+
+def clean_body(node, keep_tags, tags_to_rem, unwrap_tags, merged, re_not_empty):
+    '''
+    Cleans the tags inside of `node` with a single post-order pass, see cleaner.clean_body()
+    '''
+
+    stack = [(node, False)]
+
+    while stack:
+        element, visited = stack.pop()
+
+        if not visited:
+            stack.append((element, True))
+
+            for child in list(element):
+
+                if child.tag is etree.Comment:
+                    remove(child, merged)
+
+                elif not isinstance(child.tag, str):
+                    continue
+
+                # Not going inside of a tag that is removed anyway
+                elif child.tag in unwrap_tags:
+                    stack.append((child, False))
+
+                elif child.tag in tags_to_rem or child.tag not in keep_tags:
+                    remove(child, merged)
+
+                else:
+                    stack.append((child, False))
+
+            continue
+
+        if element is node:
+            continue
+
+        if element.tag in unwrap_tags:
+            unwrap(element, merged)
+
+        elif is_empty(element, re_not_empty):
+            remove(element, merged)
+
+    name = node.tag
+
+    return name in unwrap_tags or not (name in tags_to_rem or name not in keep_tags or is_empty(node, re_not_empty))
+
+
+
+def truncate(root, max_nodes, merged):
+    '''
+    Removes the tags after the first `max_nodes` in document order, see Document.truncate().
+    Returns the number of tags removed.
+    '''
+
+    elements = list(root.iter(etree.Element))[1:]
+
+    if len(elements) <= max_nodes:
+        return 0
+
+    kept = set(elements[:max_nodes])
+    kept.add(root)
+
+    # Only the first removed tag of each kept parent is removed by itself, the rest go along with it
+    for element in elements[max_nodes:]:
+
+        if element.getparent() in kept:
+            remove(element, merged)
+
+    return len(elements) - max_nodes
+
+
+
+def feature_table(root):
+    '''
+    Returns the FeatureTable (see meta_modules/text_index.py) of an lxml tree,
+    built with a single pass the same way as `build_table()`
+    '''
+
+    table = FeatureTable()
+
+    segments = {}
+    link_texts = {}
+
+    # (element, row - None before it is reached, parent row, depth, whether it is in an <a> tag,
+    # whether its strings are in <script>, <style>, etc.)
+    stack = [(root, None, -1, 0, False, in_string_container(root))]
+
+    while stack:
+        element, row, parent, depth, in_link, in_container = stack.pop()
+
+        if row is None:
+            row = table.add(element, element.tag, parent, depth)
+            in_link = in_link or element.tag == LINK_TAG
+
+            stack.append((element, row, parent, depth, in_link, in_container))
+            stack.extend((child, None, row, depth + 1, in_link, in_container or child.tag in STRING_CONTAINER_TAGS)
+                         for child in reversed(element) if isinstance(child.tag, str))
+            continue
+
+        segment = (0, 0, 0)
+        own_text = 0
+        link_text = 0
+        child_row = row + 1
+
+        if element.text and not in_container:
+            segment = _segment(element.text)
+            own_text += len(element.text)
+
+        for child in element:
+
+            if isinstance(child.tag, str):
+                segment = _join(segment, segments.pop(child_row))
+                link_text += link_texts.pop(child_row)
+                child_row = table.end[child_row]
+
+            if child.tail and not in_container:
+                segment = _join(segment, _segment(child.tail))
+                own_text += len(child.tail)
+
+        if in_link:
+            link_text += own_text
+
+        segments[row] = segment
+        link_texts[row] = link_text
+
+        if element.tag in STRING_CONTAINER_TAGS:
+            text_len = len(text(element).strip())
+        else:
+            text_len = _stripped_len(segment)
+
+        table.close(row, own_text, text_len, link_text)
+
+    return table.freeze()
+
+
+
+def node_text(element, skip_tags=()):
+    '''
+    Returns the plain text of `element`, see meta_modules/output.py - node_text()
+    '''
+
+    parts = []
+    # Strings, elements, and None marking the end of a block tag
+    stack = [(element, in_string_container(element))]
+
+    while stack:
+        node, in_container = stack.pop()
+
+        if node is None:
+            parts.append('\n')
+
+        elif isinstance(node, str):
+            parts.append(node)
+
+        elif isinstance(node.tag, str):
+
+            if node.tag in skip_tags:
+                continue
+
+            if node.tag in BLOCK_TAGS:
+                parts.append('\n')
+                stack.append((None, in_container))
+
+            in_container = in_container or node.tag in STRING_CONTAINER_TAGS
+            contents = []
+
+            # Comments, <script> and <style> strings are not text
+            if node.text and not in_container:
+                contents.append((node.text, in_container))
+
+            for child in node:
+                contents.append((child, in_container))
+
+                if child.tail and not in_container:
+                    contents.append((child.tail, in_container))
+
+            stack.extend(reversed(contents))
+
+    lines = (' '.join(line.split()) for line in ''.join(parts).split('\n'))
+
+    return '\n'.join(line for line in lines if line)
+
+
+
+def serialize(node, contents=False):
+    '''
+    Returns the HTML of `node` (an element, or the root of the tree),
+    serialized the same way as str() of a BeautifulSoup tag -
+    or only of what is inside of it if `contents` is True, as Tag.decode_contents()
+    '''
+
+    top = node
+    parts = []
+    # Nodes, and the end tags of the elements that are open
+    stack = [node]
+
+    while stack:
+        node = stack.pop()
+
+        if isinstance(node, str):
+            parts.append(node)
+            continue
+
+        name = node.tag
+
+        if name is etree.Comment:
+            parts.append(f"<!--{node.text or ''}-->")
+
+        elif name is etree.PI:
+
+            if node.target == DOCTYPE_TARGET:
+                parts.append(f"<!DOCTYPE {node.text}>\n")
+            else:
+                parts.append(f"<?{node.target} {node.text or ''}>")
+
+        elif not isinstance(name, str):
+            pass
+
+        elif name in VOID_TAGS and not node.text and not len(node):
+            parts.append(f"<{name}{_attributes(node)}/>")
+
+        else:
+            # The root has only its children serialized, as the BeautifulSoup object
+            if (name != ROOT_TAG or node.getparent() is not None) and not (contents and node is top):
+                parts.append(f"<{name}{_attributes(node)}>")
+                stack.append(f"</{name}>")
+
+            for child in reversed(node):
+                if child.tail:
+                    stack.append(child.tail if name in CDATA_CONTAINING_TAGS else _escape(child.tail))
+                stack.append(child)
+
+            if node.text:
+                parts.append(node.text if name in CDATA_CONTAINING_TAGS else _escape(node.text))
+
+    return ''.join(parts)
+
+
+
+def _escape(string):
+    '''
+    Returns `string` with `&`, `<` and `>` escaped
+    '''
+
+    if '&' in string:
+        string = string.replace('&', '&amp;')
+
+    if '<' in string:
+        string = string.replace('<', '&lt;')
+
+    if '>' in string:
+        string = string.replace('>', '&gt;')
+
+    return string
+
+
+
+def _attributes(element):
+    '''
+    Returns the serialized attributes of `element`, sorted by name as BeautifulSoup does
+    '''
+
+    if not len(element.attrib):
+        return ''
+
+    name = element.tag
+    list_attributes = LIST_ATTRIBUTES.get(name, ())
+    charset = None
+
+    if name == 'meta':
+        charset = _meta_charset_attribute(element)
+
+    attributes = []
+
+    for key, value in element.attrib.items():
+
+        if key.startswith(XML_NAMESPACE):
+            key = 'xml:' + key[len(XML_NAMESPACE):]
+
+        if key in LIST_ATTRIBUTES['*'] or key in list_attributes:
+            value = ' '.join(re_not_whitespace.findall(value))
+
+        elif key == charset:
+            value = 'utf-8' if key == 'charset' else re_content_charset.sub(r"\g<1>utf-8", value)
+
+        value = _escape(value)
+
+        if '"' not in value:
+            value = f'"{value}"'
+        elif "'" in value:
+            value = '"' + value.replace('"', '&quot;') + '"'
+        else:
+            value = f"'{value}'"
+
+        attributes.append((key, value))
+
+    attributes.sort()
+
+    return ''.join(f" {key}={value}" for key, value in attributes)
+
+
+
+def _meta_charset_attribute(meta):
+    '''
+    Returns the attribute of a <meta> tag with the declared encoding, None if there is none
+    '''
+
+    if meta.get('charset') is not None:
+        return 'charset'
+
+    if meta.get('content') is not None and (meta.get('http-equiv') or '').lower() == 'content-type':
+        return 'content'
+
+    return None
@@ -0,0 +1,198 @@
+'''
+Module with the outputs of the article body, other than HTML - its plain text,
+or its position in the original source code
+'''
+
+import re
+
+from bs4 import Tag
+
+from meta_modules.text_index import TEXT_TYPES
+
+
+
+# Outputs of ArticleFinder.find()
+OUTPUTS = ('html', 'text', 'spans')
+
+# Tags whose text is put on lines of its own
+BLOCK_TAGS = frozenset((
+        'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'figcaption', 'figure',
+        'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p',
+        'pre', 'section', 'table', 'tr', 'ul',
+))
+
+# Tags that have no end tag
+VOID_TAGS = frozenset((
+        'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr',
+))
+
+# Tags whose content is text, not tags => the pattern of their end tag
+RAW_TEXT_TAGS = {name: re.compile(rf"</{name}\s*>", re.IGNORECASE) for name in ('script', 'style', 'textarea', 'title')}
+
+
+
+def node_text(tag, skip_tags=()):
+    '''
+    Returns the plain text of `tag` - the text of each block tag (<p>, <li>, <h2>, ...) on a line of its own,
+    with the whitespace collapsed and without empty lines.
+
+    `skip_tags` - Iterable - tags whose text is left out
+    '''
+
+    parts = []
+    # None marks the end of a block tag
+    stack = [tag]
+
+    while stack:
+        node = stack.pop()
+
+        if node is None:
+            parts.append('\n')
+
+        elif isinstance(node, Tag):
+
+            if node.name in skip_tags:
+                continue
+
+            if node.name in BLOCK_TAGS:
+                parts.append('\n')
+                stack.append(None)
+
+            stack.extend(reversed(node.contents))
+
+        # Comments, <script> and <style> strings are not text
+        elif type(node) in TEXT_TYPES:
+            parts.append(node)
+
+    lines = (' '.join(line.split()) for line in ''.join(parts).split('\n'))
+
+    return '\n'.join(line for line in lines if line)
+
+
+
+def tag_ordinals(soup):
+    '''
+    Returns a tuple of two dictionaries:
+    - id(tag) => number of tags with the same name before it, in document order
+    - name => number of tags with that name
+
+    Taken before the tree is cleaned, they tell which start tag of the source code each tag comes from.
+    '''
+
+    ordinals = {}
+    counts = {}
+
+    for tag in soup.find_all(True):
+        ordinals[id(tag)] = counts.get(tag.name, 0)
+        counts[tag.name] = ordinals[id(tag)] + 1
+
+    return ordinals, counts
+
+
+
+class SourceIndex:
+    '''
+    The start and end tags of an HTML source code, with their positions, found with a single scan.
+
+    `html` - String - the HTML source code
+    '''
+
+    # A comment, a doctype or CDATA, an end tag or a start tag (a `>` inside of quoted attributes included)
+    re_token = re.compile(r"<!--.*?(?:-->|\Z)"
+                          r"|<![^>]*>"
+                          r"|</([a-zA-Z][^\s/>]*)[^>]*>"
+                          r"|<([a-zA-Z][^\s/>]*)(?:\"[^\"]*\"|'[^']*'|[^'\">])*>",
+                          re.DOTALL)
+
+
+    def __init__(self, html):
+        self.html = html
+
+        # (name, is end tag, start, end)
+        self.tokens = []
+        # name => indexes of its start tags in `self.tokens`
+        self.start_tags = {}
+
+        self.__scan()
+
+
+    def span(self, tag, ordinal, tag_count):
+        '''
+        Returns (start, end) of `tag` in the source code - from its start tag to the end of its end tag,
+        None if the tag is not in the source code (added by the parser).
+
+        `ordinal`   - Integer - number of tags with the same name before `tag`, see `tag_ordinals()`\n
+        `tag_count` - Integer - number of tags with the same name in the tree, before it was cleaned
+        '''
+
+        start_tags = self.start_tags.get(tag.name, [])
+
+        # The parser added tags of this name, e.g. a missing <tbody>, so the start tags can not be matched
+        if len(start_tags) != tag_count:
+            return None
+
+        index = start_tags[ordinal]
+        _, _, start, end = self.tokens[index]
+
+        if tag.name in VOID_TAGS:
+            return (start, end)
+
+        parent_names = {parent.name for parent in tag.parents}
+
+        # Tags opened inside of `tag`, as the end tags can be left out
+        open_tags = [tag.name]
+
+        for name, is_end, token_start, token_end in self.tokens[index + 1:]:
+
+            if not is_end:
+                if name not in VOID_TAGS:
+                    open_tags.append(name)
+                continue
+
+            if name not in open_tags:
+                # An end tag of a parent of `tag` closes it as well
+                if name in parent_names:
+                    return (start, token_start)
+
+                # An end tag that was never opened is left out, as by the parser
+                continue
+
+            while open_tags.pop() != name:
+                pass
+
+            if not open_tags:
+                return (start, token_end)
+
+        return (start, len(self.html))
+
+
+    def __scan(self):
+        pos = 0
+        html = self.html
+
+        while True:
+            match = self.re_token.search(html, pos)
+
+            if not match:
+                return
+
+            pos = match.end()
+            end_name, start_name = match.group(1), match.group(2)
+
+            if end_name:
+                self.tokens.append((end_name.lower(), True, match.start(), match.end()))
+
+            elif start_name:
+                name = start_name.lower()
+                self.start_tags.setdefault(name, []).append(len(self.tokens))
+                self.tokens.append((name, False, match.start(), match.end()))
+
+                # The content of <script>, <style>, etc. has no tags
+                if name in RAW_TEXT_TAGS:
+                    raw_end = RAW_TEXT_TAGS[name].search(html, pos)
+
+                    if raw_end:
+                        self.tokens.append((name, True, raw_end.start(), raw_end.end()))
+                        pos = raw_end.end()
+                    else:
+                        pos = len(html)
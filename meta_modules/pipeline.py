@@ -0,0 +1,285 @@
+'''
+Module that fetches pages and finds their articles at the same time -
+the network waits of the fetching overlap with the extraction in a pool of processes
+'''
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import threading
+from urllib.parse import urlsplit
+
+import requests
+
+from meta_modules.batch import _cpu_count, _find_one, _init_worker
+
+
+
+# Max number of pages being fetched at the same time
+PIPELINE_CONCURRENCY = 16
+
+# Max number of pages being fetched from the same host at the same time
+PIPELINE_PER_HOST = 4
+
+# Seconds to wait for a response
+PIPELINE_TIMEOUT = 10
+
+
+
+class Pipeline:
+    '''
+    Fetches pages with asyncio and finds their articles in a pool of processes.
+
+    The fetched pages wait in a bounded queue for the extraction. When it is full,
+    no new page is fetched until the extraction catches up (backpressure),
+    and the same goes for the results that are not yet read.
+
+    `finder_cls`    - Class - the Finder to be used for each page, e.g. ArticleFinder\n
+    `concurrency`   - Integer - max number of pages being fetched at the same time\n
+    `per_host`      - Integer - max number of pages being fetched from the same host, and of connections to it in use\n
+    `queue_size`    - Integer - max number of fetched pages waiting for the extraction; default value - 2 per worker\n
+    `workers`       - Integer - number of extraction processes; default value - the number of available CPUs\n
+    `timeout`       - Float - seconds to wait for a response\n
+    `headers`       - Dictionary - headers of the requests, e.g. User-Agent\n
+    `options`       - the keyword arguments of `finder_cls`, e.g. skip_tags, clean_tags, anchor_text, init_clean
+    '''
+
+    def __init__(self, finder_cls, concurrency=PIPELINE_CONCURRENCY, per_host=PIPELINE_PER_HOST, queue_size=None,
+                 workers=None, timeout=PIPELINE_TIMEOUT, headers=None, **options):
+        self.finder_cls = finder_cls
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.workers = workers or _cpu_count()
+        self.queue_size = queue_size or 2 * self.workers
+        self.timeout = timeout
+        self.headers = headers
+        self.options = options
+
+
+    async def find(self, urls):
+        '''
+        Async generator of the results, one per URL of `urls` (an iterable or an async iterable),
+        in the order they are completed.
+
+        Each result is a dictionary with:
+        `index`     - the position of the URL in `urls`
+        `url`       - the URL
+        `article`   - the result of `finder_cls.find()`, None if it failed
+        `error`     - the error of the page (fetching or extraction), None if it succeeded
+
+        An error raised while reading `urls` is raised once the pages of the URLs read before it are done.
+        '''
+
+        fetched = asyncio.Queue(self.queue_size)
+        results = asyncio.Queue(self.queue_size)
+
+        sessions = _ThreadSessions(self.__session)
+        threads = ThreadPoolExecutor(max_workers=self.concurrency)
+        processes = ProcessPoolExecutor(max_workers=self.workers,
+                                        initializer=_init_worker,
+                                        initargs=(self.finder_cls, self.options))
+
+        fetch_task = asyncio.create_task(self.__fetch_all(urls, sessions, threads, fetched, results))
+
+        tasks = [fetch_task]
+        tasks.extend(asyncio.create_task(self.__extract_all(processes, fetched, results))
+                     for _ in range(self.workers))
+
+        try:
+            finished = 0
+
+            # Each extraction task sends None when it is done
+            while finished < self.workers:
+                result = await results.get()
+
+                if result is None:
+                    finished += 1
+                else:
+                    yield result
+
+            # Done by now, raises the error of reading `urls`, if any
+            await fetch_task
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            processes.shutdown(wait=False, cancel_futures=True)
+            threads.shutdown(wait=False, cancel_futures=True)
+            sessions.close()
+
+
+    async def __fetch_all(self, urls, sessions, threads, fetched, results):
+        '''
+        Fetches every URL, at most `self.concurrency` at a time, then tells the extraction tasks to stop -
+        also when reading `urls` fails, whose error is then raised
+        '''
+
+        slots = asyncio.Semaphore(self.concurrency)
+        hosts = {}
+        fetching = set()
+
+        async def fetch(index, url):
+            try:
+                host = urlsplit(url).netloc
+
+                if host not in hosts:
+                    hosts[host] = asyncio.Semaphore(self.per_host)
+
+                async with hosts[host]:
+                    html = await asyncio.get_running_loop().run_in_executor(threads, self.__get, sessions, url)
+
+                # Waits while the extraction is behind
+                await fetched.put((index, url, html))
+
+            except asyncio.CancelledError:
+                raise
+
+            except Exception as e:
+                await results.put({'index': index, 'url': url, 'article': None, 'error': f"{type(e).__name__}: {e}"})
+
+            finally:
+                slots.release()
+
+        index = 0
+        cancelled = False
+
+        try:
+            async for url in self.__iter_urls(urls):
+                await slots.acquire()
+
+                task = asyncio.create_task(fetch(index, url))
+                fetching.add(task)
+                task.add_done_callback(fetching.discard)
+
+                index += 1
+
+        # `find()` is closed, nothing waits for the pages anymore
+        except asyncio.CancelledError:
+            cancelled = True
+
+            for task in list(fetching):
+                task.cancel()
+
+            raise
+
+        finally:
+            if not cancelled:
+                await asyncio.gather(*fetching)
+
+                for _ in range(self.workers):
+                    await fetched.put(None)
+
+
+    async def __extract_all(self, processes, fetched, results):
+        '''
+        Finds the articles of the fetched pages, one at a time in each task
+        '''
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            page = await fetched.get()
+
+            if page is None:
+                await results.put(None)
+                return
+
+            index, url, html = page
+
+            try:
+                result = await loop.run_in_executor(processes, _find_one, index, html, url)
+
+            # The worker process has crashed
+            except Exception as e:
+                result = {'index': index, 'article': None, 'error': f"{type(e).__name__}: {e}"}
+
+            result['url'] = url
+
+            await results.put(result)
+
+
+    def __get(self, sessions, url):
+        '''
+        Returns the HTML of `url`, in a thread of the pool, with the session of that thread
+        '''
+
+        response = sessions.get().get(url, timeout=self.timeout, headers=self.headers)
+        response.raise_for_status()
+
+        return response.text
+
+
+    def __session(self):
+        '''
+        Returns the session of a single fetching thread, keeping a connection to up to `self.concurrency` hosts
+        '''
+
+        session = requests.Session()
+        # A thread makes one request at a time
+        adapter = requests.adapters.HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=1)
+
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        return session
+
+
+    @staticmethod
+    async def __iter_urls(urls):
+        '''
+        Yields the URLs of an iterable or an async iterable
+        '''
+
+        if hasattr(urls, '__aiter__'):
+            async for url in urls:
+                yield url
+        else:
+            for url in urls:
+                yield url
+
+
+
+class _ThreadSessions:
+    '''
+    A requests.Session for each thread that fetches pages - a session is not thread-safe,
+    so the threads of the pool do not share one, but each of them reuses its own connections.
+
+    `make_session` - Callable - returns a new session
+    '''
+
+    def __init__(self, make_session):
+        self.make_session = make_session
+
+        self.__local = threading.local()
+        self.__sessions = []
+        self.__lock = threading.Lock()
+
+
+    def get(self):
+        '''
+        Returns the session of the current thread, made on its first request
+        '''
+
+        session = getattr(self.__local, 'session', None)
+
+        if session is None:
+            session = self.__local.session = self.make_session()
+
+            with self.__lock:
+                self.__sessions.append(session)
+
+        return session
+
+
+    def close(self):
+        '''
+        Closes the sessions of all the threads
+        '''
+
+        with self.__lock:
+            sessions, self.__sessions = self.__sessions, []
+
+        for session in sessions:
+            session.close()
@@ -0,0 +1,864 @@
+'''
+Module with the extraction service - a long-running HTTP server on a local socket, in front of a pool of
+worker processes started once, which keep the modules, the tags to be kept and their caches loaded between requests
+
+Usage:
+    find-article-service [--host 127.0.0.1] [--port 8000] [--workers 4] [--queue-size 32] [--timeout 10]
+                         [--engine lxml] [--body html] [--cache results.sqlite] [--no-cache]
+                         [--max-input-size N] [--max-nodes N] [--max-stage-ms MS] [--max-candidates N]
+                         [--dedup dedup.sqlite]
+
+(or `python -m meta_modules.service`, without installing the package)
+
+Endpoints:
+    POST /extract   - the HTML of a page as the body (with `?url=...` for its URL), or JSON {"html": ..., "url": ...};
+                      `?timeout=...` (or "timeout") for less than the timeout of the service, in seconds
+    GET  /metrics   - the throughput, the queue depth, the busy workers and the latency histograms, as JSON
+    GET  /health    - {"status": ..., "workers": ...}
+
+Every answer is JSON; the ones of /extract are {"article": ..., "error": ...}, with the status:
+- 200 - the article was found
+- 400, 411, 413 - the request has no usable HTML, no Content-Length, or a body over `--max-body-size`
+- 422 - no article was found in the page, or finding it failed
+- 429 - the queue of the waiting requests is full, so the request is dropped at once (with Retry-After),
+instead of waiting behind them
+- 500 - the worker finding it exited, it is replaced
+- 503 - the service is shutting down
+- 504 - the article was not found within the timeout, the worker finding it is replaced
+'''
+
+import argparse
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import CancelledError, Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import queue
+import signal
+import sys
+import threading
+import time
+from urllib.parse import parse_qs
+
+from meta_modules.batch import _cpu_count
+from meta_modules.budget import Budget
+from meta_modules.cache import ResultCache
+from meta_modules.constants import ENGINE, ENGINES
+from meta_modules.document import Document
+from meta_modules.fingerprint import DedupIndex
+from meta_modules.instrumentation import logger
+
+
+
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8000
+
+# Seconds a request can take, from when it is received to its answer
+SERVICE_TIMEOUT = 10.0
+
+# Requests waiting for a worker, for each worker, before the next ones are answered with 429
+QUEUE_PER_WORKER = 8
+
+# Max bytes of the body of a request
+MAX_BODY_SIZE = 32 * 1024 * 1024
+
+# Seconds a new worker has for starting and finding its first page
+WORKER_START_TIMEOUT = 120
+
+# Seconds a client is asked to wait, when its request is dropped
+RETRY_AFTER = 1
+
+# Upper bounds of the buckets of the latency histograms, in milliseconds; the last bucket has no bound
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Seconds of the recent throughput
+THROUGHPUT_WINDOW = 60
+
+# The page a worker finds as soon as it starts, which loads the parser and whatever it imports lazily
+WARM_UP_HTML = ('<html><head><title>Warm up</title></head>'
+                '<body><div><p>The first page of a worker.</p><p>Found before any request.</p></div></body></html>')
+
+# Sent by a worker once it is ready for the requests
+READY = 'ready'
+
+
+
+def _context():
+    '''
+    Returns the multiprocessing context of the workers - on POSIX, a fork server that imports `find_article` once,
+    so every worker, and every one replacing a worker that timed out, is forked from it warm; spawn elsewhere
+    '''
+
+    # Imported only when needed, as the multiprocessing modules are slow to import
+    import multiprocessing
+
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['find_article'])
+
+    return context
+
+
+
+def _serve_worker(connection, options):
+    '''
+    Main function of a worker process - finds the articles of the pages received through `connection`,
+    one at a time, with an Extractor set up once, until the connection is closed or None is received
+    '''
+
+    # Stopped by the service, not by the Ctrl+C sent to the whole process group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from find_article import Extractor
+
+    # The wall time of every stage is sent back, for the histograms of the service
+    extractor = Extractor(**dict(options, timings=True))
+
+    # Without the cache, the templates and the near-duplicates, which would remember the page
+    Extractor(**dict(options, tracer=None, cache=None, templates=None, dedup=None)).extract(WARM_UP_HTML)
+
+    connection.send(READY)
+
+    while True:
+
+        try:
+            job = connection.recv()
+
+        except EOFError:
+            return
+
+        if job is None:
+            return
+
+        html, url = job
+
+        try:
+            result = (extractor.extract(html, url=url), None)
+
+        except Exception as e:
+            result = (None, f"{type(e).__name__}: {e}")
+
+        connection.send(result)
+
+
+
+class _Worker:
+    '''
+    A worker process and the connection to it, see `_serve_worker()`.
+    Call `wait_ready()` once it is started.
+    '''
+
+    def __init__(self, context, options):
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(target=_serve_worker, args=(worker_connection, options), daemon=True)
+        self.process.start()
+
+        worker_connection.close()
+
+
+    def wait_ready(self, timeout=WORKER_START_TIMEOUT):
+        '''
+        Waits until the worker has found its first page, raises RuntimeError if it did not start
+        '''
+
+        try:
+            if self.connection.poll(timeout) and self.connection.recv() == READY:
+                return
+
+        except (EOFError, OSError):
+            pass
+
+        self.stop()
+
+        raise RuntimeError(f"A worker of the service did not start (exit code {self.process.exitcode})")
+
+
+    def find(self, html, url, timeout):
+        '''
+        Returns (article, error) of a page, found by the worker.
+        Raises TimeoutError if it is not found within `timeout` seconds, EOFError or OSError if the worker exited.
+        '''
+
+        self.connection.send((html, url))
+
+        if not self.connection.poll(timeout):
+            raise TimeoutError
+
+        return self.connection.recv()
+
+
+    def stop(self):
+        '''
+        Stops the worker, at once - whatever it is finding is dropped
+        '''
+
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+
+class _Job:
+    '''
+    A request waiting for a worker, or being found by one.
+    The `future` gets (article, error), TimeoutError, or EOFError when the worker exited.
+    '''
+
+    def __init__(self, html, url, received, deadline):
+        self.html = html
+        self.url = url
+        self.received = received
+        self.deadline = deadline
+        self.future = Future()
+
+
+
+class Histogram:
+    '''
+    Histogram of latencies, in milliseconds, with fixed buckets
+
+    `bounds` - Tuple - the upper bounds of the buckets, in order; one more bucket has no bound
+    '''
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+
+
+    def observe(self, value):
+        '''
+        Adds a latency of `value` milliseconds
+        '''
+
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum_ms += value
+
+
+    def report(self):
+        '''
+        Returns a dictionary - {'buckets': {upper bound => latencies up to it}, 'count': ..., 'sum_ms': ...},
+        the buckets being cumulative, the last one ('+Inf') having all the latencies
+        '''
+
+        buckets = {}
+        total = 0
+
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            total += count
+            buckets[str(bound)] = total
+
+        return {'buckets': buckets, 'count': self.count, 'sum_ms': round(self.sum_ms, 3)}
+
+
+
+class ServiceMetrics:
+    '''
+    Counters and latency histograms of an ExtractionService, updated by its threads under a lock:\n
+    `requests`  - the requests received, found (200), failed (422, 500), dropped (429) and timed out (504)\n
+    `restarts`  - the workers replaced, after a timeout or an exit\n
+    `latency`   - histograms of the whole request, of its wait in the queue, and of every stage
+    of ArticleFinder.find() (see `ArticleFinder.stage_timings`)
+    '''
+
+    def __init__(self):
+        self.started = time.monotonic()
+
+        self.received = 0
+        self.found = 0
+        self.failed = 0
+        self.dropped = 0
+        self.timed_out = 0
+        self.restarts = 0
+        self.busy = 0
+
+        self.request_latency = Histogram()
+        self.queue_latency = Histogram()
+        self.stage_latency = {}
+
+        # Times of the requests answered in the last `THROUGHPUT_WINDOW` seconds
+        self.__recent = deque()
+        self.__lock = threading.Lock()
+
+
+    def count(self, counter, amount=1):
+        '''
+        Adds `amount` to the counter named `counter`
+        '''
+
+        with self.__lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+
+    def answered(self, counter, latency_ms):
+        '''
+        Notes a request answered after `latency_ms` milliseconds, counted by `counter`
+        '''
+
+        now = time.monotonic()
+
+        with self.__lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            self.request_latency.observe(latency_ms)
+            self.__recent.append(now)
+            self.__trim(now)
+
+
+    def started_job(self, queue_ms):
+        '''
+        Notes a request taken by a worker, after waiting `queue_ms` milliseconds in the queue
+        '''
+
+        with self.__lock:
+            self.busy += 1
+            self.queue_latency.observe(queue_ms)
+
+
+    def finished_job(self, timings=None):
+        '''
+        Notes a request no longer being found by a worker, with the stage => wall time in milliseconds of its result
+        '''
+
+        with self.__lock:
+            self.busy -= 1
+
+            for stage, wall_ms in (timings or {}).items():
+                self.stage_latency.setdefault(stage, Histogram()).observe(wall_ms)
+
+
+    def report(self, queue_depth, queue_size, workers):
+        '''
+        Returns a dictionary with all the metrics
+        '''
+
+        now = time.monotonic()
+
+        with self.__lock:
+            self.__trim(now)
+            uptime = now - self.started
+            answered = self.found + self.failed + self.timed_out
+
+            return {
+                'uptime_s': round(uptime, 3),
+                'workers': workers,
+                'busy_workers': self.busy,
+                'queue_depth': queue_depth,
+                'queue_size': queue_size,
+                'requests': {
+                    'received': self.received,
+                    'found': self.found,
+                    'failed': self.failed,
+                    'dropped': self.dropped,
+                    'timed_out': self.timed_out,
+                },
+                'restarts': self.restarts,
+                'throughput': {
+                    'per_s': round(answered / uptime, 3) if uptime else 0.0,
+                    'recent_per_s': round(len(self.__recent) / min(uptime, THROUGHPUT_WINDOW), 3) if uptime else 0.0,
+                },
+                'latency_ms': {
+                    'request': self.request_latency.report(),
+                    'queue': self.queue_latency.report(),
+                    'stages': {stage: histogram.report() for stage, histogram in self.stage_latency.items()},
+                },
+            }
+
+
+    def __trim(self, now):
+        '''
+        Drops the times of the requests answered before the window of the recent throughput
+        '''
+
+        while self.__recent and self.__recent[0] < now - THROUGHPUT_WINDOW:
+            self.__recent.popleft()
+
+
+
+class ExtractionService:
+    '''
+    Finds the articles of the pages sent to it over HTTP, by a pool of worker processes started once.
+
+    Each worker keeps an Extractor (see find_article.py) with the modules, the tags to be kept and the caches loaded,
+    and finds one page at a time; the requests wait for a free worker in a bounded queue, and once it is full,
+    a new request is answered with 429 at once. A request not answered within its timeout is answered with 504,
+    and the worker finding it, if any, is replaced - the other workers go on.
+
+    `host`          - String - the address of the server; default value - the local one\n
+    `port`          - Integer - the port of the server, 0 for any free one (see `address`)\n
+    `workers`       - Integer - number of worker processes; default value - the number of available CPUs\n
+    `queue_size`    - Integer - max requests waiting for a worker; default value - `QUEUE_PER_WORKER` per worker\n
+    `timeout`       - Float - seconds a request can take, from when it is received; a request can ask for less\n
+    `max_body_size` - Integer - max bytes of the body of a request\n
+    `options`       - the keyword arguments of Extractor, set once for every worker, e.g. engine, output, cache
+    '''
+
+    def __init__(self, host=SERVICE_HOST, port=SERVICE_PORT, workers=None, queue_size=None, timeout=SERVICE_TIMEOUT,
+                 max_body_size=MAX_BODY_SIZE, **options):
+        # The options are checked here, rather than by every worker
+        from find_article import Extractor
+
+        Extractor(**options)
+
+        self.host = host
+        self.port = port
+        self.workers_count = workers or _cpu_count()
+        self.queue_size = queue_size or QUEUE_PER_WORKER * self.workers_count
+        self.timeout = timeout
+        self.max_body_size = max_body_size
+        self.options = options
+
+        self.metrics = ServiceMetrics()
+
+        self.__queue = queue.Queue(maxsize=self.queue_size)
+        self.__context = None
+        self.__workers = []
+        self.__threads = []
+        self.__server = None
+        self.__closing = False
+
+
+    @property
+    def address(self):
+        '''
+        (host, port) of the started server
+        '''
+
+        return self.__server.server_address[:2]
+
+
+    def start(self):
+        '''
+        Starts the workers, waits until all of them are ready, then starts the server in a thread. Returns the service.
+        '''
+
+        self.__context = _context()
+        self.__workers = [_Worker(self.__context, self.options) for _ in range(self.workers_count)]
+
+        try:
+            for worker in self.__workers:
+                worker.wait_ready()
+
+        except RuntimeError:
+            self.__stop_workers()
+            raise
+
+        self.__threads = [threading.Thread(target=self.__run_worker, args=(index,), daemon=True)
+                          for index in range(self.workers_count)]
+
+        self.__server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self.__server.daemon_threads = True
+        self.__server.service = self
+
+        self.__threads.append(threading.Thread(target=self.__server.serve_forever, daemon=True))
+
+        for thread in self.__threads:
+            thread.start()
+
+        logger.info("Extraction service on http://%s:%s with %s workers", *self.address, self.workers_count)
+
+        return self
+
+
+    def serve_forever(self):
+        '''
+        Serves until Ctrl+C or SIGTERM, starting the service first if it is not started yet.
+        Called from the main thread, the only one getting the signals.
+        '''
+
+        stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+
+        if self.__server is None:
+            self.start()
+
+        try:
+            while not stopping.wait(1):
+                pass
+
+        except KeyboardInterrupt:
+            pass
+
+        finally:
+            self.close()
+
+
+    def close(self):
+        '''
+        Stops the server and the workers; the requests still waiting are answered with 503
+        '''
+
+        if self.__closing:
+            return
+
+        self.__closing = True
+
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+
+        while True:
+
+            try:
+                job = self.__queue.get_nowait()
+
+            except queue.Empty:
+                break
+
+            job.future.cancel()
+
+        # Every thread of a worker stops at its None, once the service was started
+        for _ in range(self.workers_count if self.__threads else 0):
+            self.__queue.put(None)
+
+        for thread in self.__threads:
+            thread.join()
+
+        self.__stop_workers()
+
+
+    def extract(self, html, url=None, timeout=None):
+        '''
+        Returns (HTTP status, answer) of a page - the answer being {'article': ..., 'error': ...}.
+        Called by the server for every request; it waits for a worker in the queue, at most until the timeout.
+
+        `html`      - String or bytes-like - the HTML source code\n
+        `url`       - String - the URL of the page\n
+        `timeout`   - Float - seconds, less than the timeout of the service; default value - the one of the service
+        '''
+
+        received = time.monotonic()
+        timeout = min(timeout, self.timeout) if timeout is not None else self.timeout
+        job = _Job(html, url, received, received + timeout)
+
+        self.metrics.count('received')
+
+        if self.__closing:
+            return 503, {'article': None, 'error': "The service is shutting down"}
+
+        try:
+            self.__queue.put_nowait(job)
+
+        except queue.Full:
+            self.metrics.count('dropped')
+            return 429, {'article': None, 'error': f"Too many requests, {self.queue_size} are already waiting"}
+
+        try:
+            article, error = job.future.result(timeout=max(job.deadline - time.monotonic(), 0))
+
+        # TimeoutError is set by the thread of the worker, FutureTimeoutError when it never got to the request
+        except (FutureTimeoutError, TimeoutError):
+            job.future.cancel()
+            self.metrics.answered('timed_out', (time.monotonic() - received) * 1000)
+            return 504, {'article': None, 'error': f"The article was not found within {timeout:g} s"}
+
+        except EOFError as e:
+            self.metrics.answered('failed', (time.monotonic() - received) * 1000)
+            return 500, {'article': None, 'error': str(e)}
+
+        except CancelledError:
+            return 503, {'article': None, 'error': "The service is shutting down"}
+
+        latency_ms = (time.monotonic() - received) * 1000
+
+        # ArticleFinder.find() returns a message instead of a dictionary when it fails
+        if article is not None and not isinstance(article, dict):
+            error = error or article
+            article = None
+
+        if error is not None:
+            self.metrics.answered('failed', latency_ms)
+            return 422, {'article': None, 'error': error}
+
+        self.metrics.answered('found', latency_ms)
+
+        return 200, {'article': article, 'error': None}
+
+
+    def report(self):
+        '''
+        Returns the metrics of the service, see ServiceMetrics
+        '''
+
+        return self.metrics.report(self.__queue.qsize(), self.queue_size, self.workers_count)
+
+
+    def __run_worker(self, index):
+        '''
+        Main function of the thread of the worker `index` - sends it the requests from the queue, one at a time,
+        and replaces it when it times out or exits
+        '''
+
+        while True:
+            job = self.__queue.get()
+
+            if job is None:
+                return
+
+            # Timed out while waiting, or cancelled by `close()`
+            if not job.future.set_running_or_notify_cancel():
+                continue
+
+            # Timed out right before it was taken, the worker is not replaced for it
+            if job.deadline <= time.monotonic():
+                job.future.set_exception(TimeoutError())
+                continue
+
+            self.metrics.started_job((time.monotonic() - job.received) * 1000)
+            timings = None
+
+            try:
+                article, error = self.__workers[index].find(job.html, job.url, job.deadline - time.monotonic())
+
+            # Answered first, the new worker is started afterwards
+            except TimeoutError as e:
+                job.future.set_exception(e)
+                self.__replace_worker(index)
+
+            except (EOFError, OSError):
+                job.future.set_exception(EOFError("The worker finding the article exited"))
+                self.__replace_worker(index)
+
+            else:
+                if isinstance(article, dict):
+                    timings = article.get('timings') if self.options.get('timings') else article.pop('timings', None)
+
+                job.future.set_result((article, error))
+
+            finally:
+                self.metrics.finished_job(timings)
+
+
+    def __replace_worker(self, index):
+        '''
+        Stops the worker `index` and starts a new one in its place.
+        If the new one does not start, the stopped one is kept, and replaced again at its next request.
+        '''
+
+        self.__workers[index].stop()
+        self.metrics.count('restarts')
+
+        if self.__closing:
+            return
+
+        worker = _Worker(self.__context, self.options)
+
+        try:
+            worker.wait_ready()
+
+        except RuntimeError as e:
+            logger.error("%s", e)
+            return
+
+        self.__workers[index] = worker
+
+
+    def __stop_workers(self):
+        '''
+        Stops every worker
+        '''
+
+        for worker in self.__workers:
+            worker.stop()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+
+class _Handler(BaseHTTPRequestHandler):
+    '''
+    The HTTP requests of an ExtractionService, which is `self.server.service`
+    '''
+
+    protocol_version = 'HTTP/1.1'
+
+
+    def do_GET(self):
+        service = self.server.service
+        path = self.path.split('?')[0]
+
+        if path == '/metrics':
+            self.__answer(200, service.report())
+
+        elif path == '/health':
+            self.__answer(200, {'status': 'ok', 'workers': service.workers_count})
+
+        else:
+            self.__answer(404, {'error': f"Unknown path: {path}"})
+
+
+    def do_POST(self):
+        service = self.server.service
+        path, _, query = self.path.partition('?')
+
+        if path != '/extract':
+            self.__answer(404, {'article': None, 'error': f"Unknown path: {path}"}, close=True)
+            return
+
+        length = self.headers.get('Content-Length')
+
+        if length is None or not length.isdigit():
+            self.__answer(411, {'article': None, 'error': "Content-Length is needed"}, close=True)
+            return
+
+        if int(length) > service.max_body_size:
+            self.__answer(413, {'article': None, 'error': f"The body is over {service.max_body_size} bytes"},
+                          close=True)
+            return
+
+        body = self.rfile.read(int(length))
+
+        try:
+            html, url, timeout = self.__read_request(body, parse_qs(query))
+
+        except ValueError as e:
+            self.__answer(400, {'article': None, 'error': str(e)})
+            return
+
+        status, answer = service.extract(html, url=url, timeout=timeout)
+        headers = {'Retry-After': str(RETRY_AFTER)} if status in (429, 503) else {}
+
+        self.__answer(status, answer, headers)
+
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+    def __read_request(self, body, params):
+        '''
+        Returns (html, url, timeout) of a request, raises ValueError if it has no usable HTML
+        '''
+
+        content_type = self.headers.get_content_type()
+
+        url = params.get('url', [None])[0]
+        timeout = params.get('timeout', [None])[0]
+
+        if content_type == 'application/json':
+
+            try:
+                data = json.loads(body)
+
+            except ValueError:
+                raise ValueError("The body is not valid JSON")
+
+            if not isinstance(data, dict) or not isinstance(data.get('html'), str):
+                raise ValueError('The JSON body needs "html", a string')
+
+            html = data['html']
+            url = data.get('url', url)
+            timeout = data.get('timeout', timeout)
+
+        else:
+            # The charset of the header goes before the one declared in the HTML
+            html = Document.decode(body, self.headers.get_content_charset())
+
+        try:
+            timeout = float(timeout) if timeout is not None else None
+
+        except (TypeError, ValueError):
+            raise ValueError(f"The timeout is not a number: {timeout!r}")
+
+        if timeout is not None and not timeout > 0:
+            raise ValueError("The timeout must be over 0")
+
+        return html, url, timeout
+
+
+    def __answer(self, status, answer, headers=None, close=False):
+        '''
+        Sends `answer` as JSON; `close` for closing the connection, when the body of the request was not read
+        '''
+
+        body = json.dumps(answer, ensure_ascii=False).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+
+        if close:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+
+        self.end_headers()
+        self.wfile.write(body)
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='find-article-service',
+                                     description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=SERVICE_HOST, help='the address of the server')
+    parser.add_argument('--port', type=int, default=SERVICE_PORT, help='the port of the server, 0 for any free one')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes; default - the number of CPUs')
+    parser.add_argument('--queue-size', type=int, default=None,
+                        help=f"requests waiting for a worker, before the next ones get 429; default - {QUEUE_PER_WORKER} per worker")
+    parser.add_argument('--timeout', type=float, default=SERVICE_TIMEOUT, help='seconds a request can take')
+    parser.add_argument('--max-body-size', type=int, default=MAX_BODY_SIZE, help='bytes of the body of a request')
+    parser.add_argument('--body', choices=('html', 'text', 'spans'), default='html',
+                        help='the body as HTML, plain text or [start, end] in the page')
+    parser.add_argument('--no-anchor-text', action='store_true', help='keep the <a> tags in the body')
+    parser.add_argument('--no-init-clean', action='store_true', help='do not clean the page before finding the body')
+    parser.add_argument('--engine', choices=ENGINES, default=ENGINE, help='the parser that builds the tree of the pages')
+    parser.add_argument('--timings', action='store_true', help='add the wall time of every stage to the articles')
+    parser.add_argument('--no-cache', action='store_true', help='find the same page again, instead of caching its result')
+    parser.add_argument('--cache', help='SQLite tier of the cache of the results, shared by the workers and kept between runs')
+    parser.add_argument('--max-input-size', type=int, help='symbols of a page, a longer one is cut before parsing')
+    parser.add_argument('--max-nodes', type=int, help='tags of a page, the ones after them are removed')
+    parser.add_argument('--max-stage-ms', type=float, help='wall time of every stage of a page, in milliseconds')
+    parser.add_argument('--max-candidates', type=int, help='parents scored for the body of a page')
+    parser.add_argument('--dedup', help='SQLite index of the near-duplicates, shared by the workers and kept between runs; '
+                                        'the result of a near-duplicate of an earlier page is reused')
+    args = parser.parse_args(argv)
+
+    if args.engine == 'lxml' and args.body == 'spans':
+        parser.error("--body spans needs --engine bs4")
+
+    if args.no_cache and args.cache:
+        parser.error("--cache needs the cache, without --no-cache")
+
+    limits = (args.max_input_size, args.max_nodes, args.max_stage_ms, args.max_candidates)
+
+    service = ExtractionService(host=args.host,
+                                port=args.port,
+                                workers=args.workers,
+                                queue_size=args.queue_size,
+                                timeout=args.timeout,
+                                max_body_size=args.max_body_size,
+                                anchor_text=not args.no_anchor_text,
+                                init_clean=not args.no_init_clean,
+                                output=args.body,
+                                engine=args.engine,
+                                timings=args.timings,
+                                cache=ResultCache(path=args.cache) if not args.no_cache else None,
+                                budget=Budget(*limits) if any(limit is not None for limit in limits) else None,
+                                dedup=DedupIndex(path=args.dedup) if args.dedup else None)
+
+    service.start()
+
+    host, port = service.address
+    print(f"Serving on http://{host}:{port} with {service.workers_count} workers, Ctrl+C to stop", file=sys.stderr)
+
+    service.serve_forever()
+
+    return 0
+
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -3,24 +3,27 @@
 Module that finds all tags, each tag with its symbols counter
 '''
 
-import requests as req
-import re
+from bs4.element import PreformattedString, Tag
 
-from bs4 import BeautifulSoup
-import pandas as pd
-
-from meta_modules.constants import FORMATTING_TAGS
+from meta_modules.constants import ENGINE, FORMATTING_TAGS
+from meta_modules.document import Document
+from meta_modules import lxml_engine
 
 
 
 class Finder:
     '''
     Base class, from which all Finder SubClasses inherit
-    having an `html` attribute and a `find()` method
+    having an `html` attribute and a `find()` method.
+
+    `html` can be either the HTML source code, or an already parsed Document,
+    which is then shared, instead of parsing the source code again.
+    `engine` - 'bs4' or 'lxml' - builds the tree of the source code (see Document).
     '''
 
-    def __init__(self, html):
-        self.html = html
+    def __init__(self, html, engine=ENGINE):
+        self.document = Document.of(html, engine)
+        self.html = self.document.html
 
     def find(self):
         pass
@@ -32,39 +35,63 @@ class TagSymbFinder(Finder):
     This class' purpose is to create a Dictionary with Tag: Symbols
     '''
 
-    def __init__(self, html):
-        super().__init__(html)
+    # Tags, whose text is not escaped when serialized
+    cdata_containing_tags = ('script', 'style')
+
+
+    def __init__(self, html, engine=ENGINE):
+        super().__init__(html, engine)
 
 
-    def __single_tag_counter(self, html, tag):
+    def __single_tag_counter(self, tag, formatting_tags_to_rem=()):
         '''
-        Returns a tuple of (tag, characters_inside_tag)
+        Returns the characters inside `tag`, if `tag` holds only text, otherwise - None
 
-        Matches all text using Regex, for the `tag` attribute
+        The tags in `formatting_tags_to_rem` are skipped, along with their text.
+        The characters are counted the same way as in the serialized HTML -
+        with `&`, `<` and `>` escaped, except inside of <script> and <style>.
         '''
-        
-        re_get_tag_text = f"<({tag})(?:[^>]+)?>([^<]+)<\/{tag}>"
 
-        # List of matched tuples(1st group - TAG, 2nd group - SYMBOLS)
-        tag_count = re.findall(re_get_tag_text, html, flags=re.IGNORECASE)
+        strings = []
+
+        for child in tag.contents:
+
+            if isinstance(child, Tag):
+                if child.name in formatting_tags_to_rem:
+                    continue
 
-        tag_counter = 0
+                return None
 
-        for _, curr_count in tag_count:
-            curr_count = curr_count.strip()
-            tag_counter += len(curr_count)
+            # Comments, CDATA, etc. are not text
+            if isinstance(child, PreformattedString):
+                return None
 
-        return (tag, tag_counter) 
+            strings.append(child)
+
+        text = ''.join(strings)
+
+        if not text:
+            return None
+
+        if tag.name in self.cdata_containing_tags:
+            return None if '<' in text else len(text.strip())
+
+        text = text.strip()
+
+        return len(text) + 4 * text.count('&') + 3 * (text.count('<') + text.count('>'))
 
 
     def get_tags_counter(self, formatting_tags_to_skip=None):
         '''
         Returns a Dictionary with key:value - tag:symbols
 
-        Goes over all tags in the HTML, then using `__single_tag_counter()`,
+        Goes over all tags in the HTML once, then using `__single_tag_counter()`,
         counts the Symbols inside each one of them.
         E.g. if the symbols in ALL <a> tags are 21,
         the dictionary will have: a => 21
+
+        Only tags holding nothing but text are counted. The formatting tags (and their text)
+        are skipped while counting, without being removed from the shared tree.
         '''
         
         # `FORMATTING_TAGS` is a list of formatting tags that in some cases need to be removed
@@ -75,31 +102,69 @@ class TagSymbFinder(Finder):
             # Removing specific formatting tags from the list of tags to NOT be aknowledged for symbol counting
             formatting_tags_to_rem = [tag for tag in FORMATTING_TAGS if tag not in formatting_tags_to_skip]
 
-        soup = BeautifulSoup(self.html, 'lxml')
-        new_soup = BeautifulSoup(self.html, 'lxml')
-        
+        formatting_tags_to_rem = frozenset(formatting_tags_to_rem)
+
+        # Parsed before the engine is checked, as a page nested too deep is parsed by BeautifulSoup (see Document)
+        soup = self.document.soup
+
+        if self.document.engine == 'lxml':
+            tags, tag_counter, formatting_tag_counter, self.nodes_count = lxml_engine.count_tags(soup,
+                                                                                                 formatting_tags_to_rem)
+        else:
+            tags, tag_counter, formatting_tag_counter = self.__count_tags(formatting_tags_to_rem)
+
+        # The formatting tags are left out of the counting as soon as any other tag is counted,
+        # in alphabetical order, so only those coming before all other tags have symbols
+        other_tags = tags - formatting_tags_to_rem
+        first_other_tag = min(other_tags) if other_tags else None
+
+        for tag, count in formatting_tag_counter.items():
+            if first_other_tag is None or tag < first_other_tag:
+                tag_counter[tag] = count
+
+        # Keeping the alphabetical order of the tags
+        tag_counter_dict = {tag: tag_counter[tag] for tag in sorted(tag_counter)}
+
+        return tag_counter_dict
+
+
+    def __count_tags(self, formatting_tags_to_rem):
+        '''
+        Returns a tuple of (names of all tags, tag => symbols, formatting tag => symbols),
+        going over the BeautifulSoup tree once
+        '''
+
         tags = set()
+        tag_counter = {}
+        # The formatting tags are counted with every formatting tag still inside of them
+        formatting_tag_counter = {}
+
+        # Number of tags gone over, for the instrumentation
+        self.nodes_count = 0
+
+        # (tag, whether it is inside of a formatting tag)
+        stack = [(self.document.soup, False)]
 
-        for tag in soup.find_all():
-            tags.add(tag.name)
+        while stack:
+            tag, in_formatting = stack.pop()
+            self.nodes_count += 1
 
-        tags = sorted(list(tags))
-        tag_counter_dict = {}
+            is_formatting = tag.name in formatting_tags_to_rem
 
-        for i, tag in enumerate(tags):
-            soup_formatted = new_soup
+            if tag is not self.document.soup:
+                tags.add(tag.name)
 
-            if tag not in formatting_tags_to_rem:
+                if is_formatting:
+                    count = self.__single_tag_counter(tag)
+                    if count:
+                        formatting_tag_counter[tag.name] = formatting_tag_counter.get(tag.name, 0) + count
 
-                for f_tag in formatting_tags_to_rem:
-                    
-                    for curr_subtag in soup_formatted(f_tag):
-                        curr_subtag.decompose()
+                elif not in_formatting:
+                    count = self.__single_tag_counter(tag, formatting_tags_to_rem)
+                    if count:
+                        tag_counter[tag.name] = tag_counter.get(tag.name, 0) + count
 
-            tag_counter = self.__single_tag_counter(str(soup_formatted), tag)
-            
-            # If there are characters inside the tag
-            if tag_counter[1]:
-                tag_counter_dict[tag_counter[0]] = tag_counter[1]
+            in_formatting = in_formatting or is_formatting
+            stack.extend((child, in_formatting) for child in tag.contents if isinstance(child, Tag))
 
-        return tag_counter_dict
\ No newline at end of file
+        return tags, tag_counter, formatting_tag_counter
@@ -0,0 +1,286 @@
+'''
+Module with the templates of the sites - where the article body is in the pages of a domain,
+learned from the previous pages, so the full search can be skipped
+'''
+
+from collections import OrderedDict
+import threading
+import time
+from urllib.parse import urlsplit
+
+from bs4.element import Tag
+
+
+
+# Pages of a domain with the same body tag and container, before the template is used
+TEMPLATE_MIN_SAMPLES = 3
+
+# Failed validations in a row, before the template is dropped (the layout of the site has changed)
+TEMPLATE_MAX_MISSES = 3
+
+# Seconds after which a template is dropped and learned again
+TEMPLATE_MAX_AGE = 7 * 24 * 60 * 60
+
+# Max number of domains in the store
+TEMPLATE_MAX_DOMAINS = 10000
+
+# Min share of the text of the container, that has to be in the body tags
+TEMPLATE_MIN_SHARE = 0.5
+
+
+
+def domain_of(url):
+    '''
+    Returns the domain of `url`, without `www.`
+    '''
+
+    domain = urlsplit(url).hostname or ''
+
+    if domain.startswith('www.'):
+        domain = domain[4:]
+
+    return domain
+
+
+
+def tag_path(tag):
+    '''
+    Returns the path from the root of the tree to `tag` - a list of [name, index],
+    where index is the position of the tag among its siblings with the same name
+    '''
+
+    path = []
+
+    while tag.parent is not None:
+        index = 0
+
+        for sibling in tag.previous_siblings:
+            if isinstance(sibling, Tag) and sibling.name == tag.name:
+                index += 1
+
+        path.append([tag.name, index])
+        tag = tag.parent
+
+    path.reverse()
+
+    return path
+
+
+
+def follow_path(soup, path):
+    '''
+    Returns the tag at the end of `path` (see `tag_path()`), None if there is no such tag
+    '''
+
+    tag = soup
+
+    for name, index in path:
+
+        for child in tag.contents:
+
+            if isinstance(child, Tag) and child.name == name:
+
+                if index == 0:
+                    tag = child
+                    break
+
+                index -= 1
+
+        else:
+            return None
+
+    return tag
+
+
+
+class TemplateStore:
+    '''
+    Learns the body tag and the container of the article body of each domain.
+
+    A template is used once `min_samples` pages of the domain in a row had the same body tag and container.
+    It is dropped after `max_misses` failed validations in a row, or `max_age` seconds after it was learned.
+    Meanwhile, the pages that do not agree with a used template are learned as a candidate, kept apart,
+    which takes the place of the template once it is dropped after its misses.
+    The least recently used domains are dropped when there are more than `max_domains`.
+
+    Use one store for one set of ArticleFinder options, as the container depends on the cleaning.
+    It can be shared by many threads, each domain is looked up and learned under a lock.
+
+    `min_samples`   - Integer - pages of a domain agreeing, before the template is used\n
+    `max_misses`    - Integer - failed validations in a row, before the template is dropped\n
+    `max_age`       - Float - seconds after which a template is learned again\n
+    `max_domains`   - Integer - max number of domains kept
+    '''
+
+    def __init__(self, min_samples=TEMPLATE_MIN_SAMPLES, max_misses=TEMPLATE_MAX_MISSES,
+                 max_age=TEMPLATE_MAX_AGE, max_domains=TEMPLATE_MAX_DOMAINS):
+        self.min_samples = min_samples
+        self.max_misses = max_misses
+        self.max_age = max_age
+        self.max_domains = max_domains
+
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+        self.evicted = 0
+
+        # domain => {'tag', 'path', 'samples', 'misses', 'learned_at', 'candidate'},
+        # the candidate being None or {'tag', 'path', 'samples'}
+        self.__templates = OrderedDict()
+        self.__lock = threading.Lock()
+
+
+    def find(self, domain, soup):
+        '''
+        Returns (body tag, container) of the template of `domain`, if the container passes the validation.
+        Returns None if there is no template or it did not pass.
+        '''
+
+        with self.__lock:
+            template = self.__templates.get(domain)
+
+            if template is None or template['samples'] < self.min_samples:
+                return None
+
+            if time.time() - template['learned_at'] > self.max_age:
+                del self.__templates[domain]
+                self.evicted += 1
+                return None
+
+            self.__templates.move_to_end(domain)
+
+            container = follow_path(soup, template['path'])
+
+            if container is not None and self.__is_valid(container, template['tag']):
+                template['misses'] = 0
+                template['candidate'] = None
+                self.hits += 1
+                return template['tag'], container
+
+            self.misses += 1
+            template['misses'] += 1
+
+            if template['misses'] >= self.max_misses:
+                self.__drop(domain, template)
+
+            return None
+
+
+    def learn(self, domain, tag, container):
+        '''
+        Records the body tag and the container found by the full search on a page of `domain`
+        '''
+
+        path = tag_path(container)
+
+        with self.__lock:
+            template = self.__templates.get(domain)
+
+            if template is not None and template['tag'] == tag and template['path'] == path:
+                template['samples'] += 1
+                template['candidate'] = None
+
+                if template['samples'] == self.min_samples:
+                    template['learned_at'] = time.time()
+                    self.learned += 1
+
+            elif template is not None and template['samples'] >= self.min_samples:
+                # The page does not agree with a used template, which is kept until it is dropped after its misses
+                candidate = template['candidate']
+
+                if candidate is not None and candidate['tag'] == tag and candidate['path'] == path:
+                    candidate['samples'] += 1
+                else:
+                    template['candidate'] = {'tag': tag, 'path': path, 'samples': 1}
+
+            else:
+                # A new domain, or the page does not agree with the previous ones
+                self.__templates[domain] = self.__template(tag, path)
+
+            self.__templates.move_to_end(domain)
+
+            while len(self.__templates) > self.max_domains:
+                self.__templates.popitem(last=False)
+                self.evicted += 1
+
+
+    def stats(self):
+        '''
+        Returns a dictionary with the counters of the store
+        '''
+
+        with self.__lock:
+            tries = self.hits + self.misses
+
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / tries if tries else 0.0,
+                'learned': self.learned,
+                'evicted': self.evicted,
+                'domains': len(self.__templates),
+            }
+
+
+    def __template(self, tag, path, samples=1):
+        '''
+        Returns a new template of a domain, from `samples` pages in a row with `tag` and the container at `path`
+        '''
+
+        return {
+            'tag': tag,
+            'path': path,
+            'samples': samples,
+            'misses': 0,
+            'learned_at': time.time(),
+            'candidate': None,
+        }
+
+
+    def __drop(self, domain, template):
+        '''
+        Drops the template of `domain` after its misses - its candidate takes its place, if there is one
+        '''
+
+        candidate = template['candidate']
+        self.evicted += 1
+
+        if candidate is None:
+            del self.__templates[domain]
+            return
+
+        self.__templates[domain] = self.__template(candidate['tag'], candidate['path'], candidate['samples'])
+
+        if candidate['samples'] >= self.min_samples:
+            self.learned += 1
+
+
+    def __is_valid(self, container, tag):
+        '''
+        Returns True if most of the text of `container` is in `tag` tags - it still holds the article body
+        '''
+
+        container_len = len(container.get_text(strip=True))
+
+        if container_len == 0:
+            return False
+
+        tag_len = sum(len(body_tag.get_text(strip=True)) for body_tag in container.find_all(tag))
+
+        return tag_len >= TEMPLATE_MIN_SHARE * container_len
+
+
+    def __getstate__(self):
+        '''
+        Sent to other processes (e.g. the workers of `ArticleFinder.find_many()`) without the lock
+        '''
+
+        state = self.__dict__.copy()
+        del state['_TemplateStore__lock']
+
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
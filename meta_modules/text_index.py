@@ -0,0 +1,355 @@
+'''
+Module that flattens a tree into a table of features of its tags, in a single pass -
+the rows of the tags in document order, with their text lengths in compact arrays
+'''
+
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, repeat
+from operator import sub
+
+from bs4 import CData, NavigableString, Tag
+
+
+
+# String types that are a part of the text of every parent tag (see Tag.text)
+TEXT_TYPES = frozenset((NavigableString, CData))
+
+# The tag whose text is link text
+LINK_TAG = 'a'
+
+
+
+class FeatureTable:
+    '''
+    Table with a row for each tag of a tree, in document order (pre-order), the tree itself being row 0.
+
+    Each column is an array, with a value for every row:\n
+    `parent`    - the row of the parent tag, -1 for the tree\n
+    `depth`     - the number of parents\n
+    `tag_id`    - the name of the tag, as an index of `names`\n
+    `end`       - the row after the last tag inside of it, so its subtree is the rows in (row, end)\n
+    `own_text`  - symbols of the strings right inside of it\n
+    `text`      - the length of its stripped text, `len(tag.text.strip())`\n
+    `link_text` - symbols of the strings inside of it that are in an <a> tag
+
+    The symbols of the tags with the same name below a tag are the sum of a range of their `text`,
+    found with two binary searches - no dictionary is built for each tag, and the candidates
+    for the body are scored together, one name at a time, from the same arrays.
+
+    Built by `build_table()` for a BeautifulSoup tree, or `lxml_engine.feature_table()` for an lxml one.
+    '''
+
+    def __init__(self):
+        self.names = []
+        self.name_ids = {}
+        # Row => the tag (a bs4 Tag or an lxml element)
+        self.nodes = []
+
+        self.parent = []
+        self.depth = []
+        self.tag_id = []
+        self.end = []
+        self.own_text = []
+        self.text = []
+        self.link_text = []
+
+        # id() of a tag => its row
+        self.__rows = {}
+
+        # tag_id => rows of the tags with that name, and the running sums of their `text` - lists,
+        # which the binary searches read faster than arrays
+        self.__positions = None
+        self.__prefixes = None
+
+
+    def __len__(self):
+        '''
+        Returns the number of rows
+        '''
+
+        return len(self.tag_id)
+
+
+    def add(self, node, name, parent, depth):
+        '''
+        Adds the row of a tag when it is first reached (in pre-order), returns the row
+        '''
+
+        tag_id = self.name_ids.get(name)
+
+        if tag_id is None:
+            tag_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+
+        row = len(self.tag_id)
+        self.__rows[id(node)] = row
+        self.nodes.append(node)
+
+        self.parent.append(parent)
+        self.depth.append(depth)
+        self.tag_id.append(tag_id)
+        self.end.append(0)
+        self.own_text.append(0)
+        self.text.append(0)
+        self.link_text.append(0)
+
+        return row
+
+
+    def close(self, row, own_text, text, link_text):
+        '''
+        Sets the text lengths of a row, once every tag inside of it has been added (in post-order)
+        '''
+
+        self.end[row] = len(self.tag_id)
+        self.own_text[row] = own_text
+        self.text[row] = text
+        self.link_text[row] = link_text
+
+
+    def freeze(self):
+        '''
+        Turns the columns into compact arrays, once all rows are added. Returns the table.
+        '''
+
+        for column in ('parent', 'depth', 'tag_id', 'end', 'own_text', 'text', 'link_text'):
+            setattr(self, column, array('q', getattr(self, column)))
+
+        return self
+
+
+    def row(self, node):
+        '''
+        Returns the row of a node, None if it is not a tag of the table (a string, a comment)
+        '''
+
+        return self.__rows.get(id(node))
+
+
+    def rows_of(self, name):
+        '''
+        Returns the rows of the tags named `name`, in document order
+        '''
+
+        tag_id = self.name_ids.get(name)
+
+        if tag_id is None:
+            return []
+
+        return self.__index()[0][tag_id]
+
+
+    def symbs(self, rows, tag_id):
+        '''
+        Returns a list of (number of tags, their symbols) of the `tag_id` tags below each row of `rows`
+        '''
+
+        return list(zip(*self.__symbs(rows, [self.end[row] for row in rows], tag_id)))
+
+
+    def max_symbs(self, rows):
+        '''
+        Returns a list of the most symbols of the tags of a single name below each row of `rows`.
+
+        The names are scored for all the rows at once, the ones with the most symbols between the first row
+        and the end of the last subtree first, until a name has no more symbols there than the least of the rows
+        already have - below any of the rows, it has no more than that.
+        '''
+
+        if not rows:
+            return []
+
+        positions, prefixes = self.__index()
+        ends = [self.end[row] for row in rows]
+        first, end = min(rows), max(ends)
+        most = [0] * len(rows)
+
+        bounds = {tag_id: prefix[bisect_left(name_rows, end)] - prefix[bisect_right(name_rows, first)]
+                  for tag_id, (name_rows, prefix) in enumerate(zip(positions, prefixes))}
+
+        for tag_id in sorted(bounds, key=bounds.get, reverse=True):
+
+            if bounds[tag_id] <= min(most):
+                break
+
+            _, symbols = self.__symbs(rows, ends, tag_id)
+            most = list(map(max, most, symbols))
+
+        return most
+
+
+    def child_symbs(self, row):
+        '''
+        Returns a dictionary - name of a tag below `row` => symbols of all of them
+        (the text of nested tags is counted once for each of them)
+        '''
+
+        symbs = {}
+
+        for tag_id, name in enumerate(self.names):
+            (count, symbols), = self.symbs((row,), tag_id)
+
+            if count:
+                symbs[name] = symbols
+
+        return symbs
+
+
+    def link_density(self, row):
+        '''
+        Returns the share of the text of `row` that is link text, between 0 and 1
+        '''
+
+        if not self.text[row]:
+            return 0.0
+
+        return min(self.link_text[row] / self.text[row], 1.0)
+
+
+    def __symbs(self, rows, ends, tag_id):
+        '''
+        Returns (a list of the number of tags, a list of their symbols) of the `tag_id` tags below each row of `rows`,
+        whose subtrees end at `ends` - two binary searches and a difference of running sums for each row
+        '''
+
+        positions, prefixes = self.__index()
+        name_rows = positions[tag_id]
+        prefix = prefixes[tag_id]
+
+        first = list(map(bisect_right, repeat(name_rows), rows))
+        last = list(map(bisect_left, repeat(name_rows), ends))
+
+        counts = list(map(sub, last, first))
+        symbols = list(map(sub, map(prefix.__getitem__, last), map(prefix.__getitem__, first)))
+
+        return counts, symbols
+
+
+    def __index(self):
+        '''
+        Returns the positions and the running sums of every name, built on first use with a single pass
+        '''
+
+        if self.__positions is None:
+            positions = [[] for _ in self.names]
+
+            for row, tag_id in enumerate(self.tag_id):
+                positions[tag_id].append(row)
+
+            text = self.text
+            self.__prefixes = [list(accumulate(map(text.__getitem__, rows), initial=0)) for rows in positions]
+            self.__positions = positions
+
+        return self.__positions, self.__prefixes
+
+
+
+def build_table(soup):
+    '''
+    Returns the FeatureTable of a BeautifulSoup tree.
+
+    Goes over the tree once, adding the rows in pre-order and closing them in post-order, when the text
+    segments of the children are ready. A text segment is a tuple of (length, leading whitespace,
+    trailing whitespace), which is enough to get the stripped length of the joined text of the children.
+    '''
+
+    table = FeatureTable()
+
+    # Row => text segment, and row => link text, of the closed rows whose parent is not closed yet
+    segments = {}
+    link_texts = {}
+
+    # (tag, row - None before it is reached, parent row, depth, whether it is in an <a> tag)
+    stack = [(soup, None, -1, 0, False)]
+
+    while stack:
+        tag, row, parent, depth, in_link = stack.pop()
+
+        if row is None:
+            row = table.add(tag, tag.name, parent, depth)
+            in_link = in_link or tag.name == LINK_TAG
+
+            stack.append((tag, row, parent, depth, in_link))
+            stack.extend((child, None, row, depth + 1, in_link)
+                         for child in reversed(tag.contents) if isinstance(child, Tag))
+            continue
+
+        segment = (0, 0, 0)
+        own_text = 0
+        link_text = 0
+        child_row = row + 1
+
+        for child in tag.contents:
+
+            if isinstance(child, Tag):
+                segment = _join(segment, segments.pop(child_row))
+                link_text += link_texts.pop(child_row)
+                child_row = table.end[child_row]
+
+            elif type(child) in TEXT_TYPES:
+                segment = _join(segment, _segment(child))
+                own_text += len(child)
+
+        if in_link:
+            link_text += own_text
+
+        segments[row] = segment
+        link_texts[row] = link_text
+
+        # <script>, <style>, etc. only have their own type of strings as text
+        string_types = getattr(tag, 'interesting_string_types', TEXT_TYPES)
+
+        if string_types == TEXT_TYPES:
+            text = _stripped_len(segment)
+        else:
+            text = len(tag.text.strip())
+
+        table.close(row, own_text, text, link_text)
+
+    return table.freeze()
+
+
+
+def _segment(string):
+    '''
+    Returns the text segment of a single string
+    '''
+
+    length = len(string)
+    leading = length - len(string.lstrip())
+
+    if leading == length:
+        return (length, length, length)
+
+    return (length, leading, length - len(string.rstrip()))
+
+
+
+def _join(left, right):
+    '''
+    Returns the text segment of two joined text segments
+    '''
+
+    left_len, left_lead, left_trail = left
+    right_len, right_lead, right_trail = right
+
+    # A segment having only whitespace is both its leading and trailing whitespace
+    leading = left_len + right_lead if left_lead == left_len else left_lead
+    trailing = right_len + left_trail if right_trail == right_len else right_trail
+
+    return (left_len + right_len, leading, trailing)
+
+
+
+def _stripped_len(segment):
+    '''
+    Returns the length of the text of a segment, without the surrounding whitespace
+    '''
+
+    length, leading, trailing = segment
+
+    if leading == length:
+        return 0
+
+    return length - leading - trailing
@@ -0,0 +1,24 @@
+from setuptools import setup
+
+
+
+with open('requirements.txt') as requirements:
+    install_requires = [line.strip() for line in requirements if line.strip()]
+
+
+setup(
+    name='find-article',
+    version='0.1.0',
+    description="Package that finds article's TITLE and BODY, automatically",
+    py_modules=['find_article'],
+    packages=['meta_modules'],
+    package_data={'meta_modules': ['data/*.csv']},
+    python_requires='>=3.7',
+    install_requires=install_requires,
+    entry_points={
+        'console_scripts': [
+            'find-article = meta_modules.cli:main',
+            'find-article-service = meta_modules.service:main',
+        ],
+    },
+)